@@ -4,10 +4,26 @@ from phi.model.google import Gemini
 from phi.tools.duckduckgo import DuckDuckGo
 import replicate
 import os
-from PIL import Image
 import requests
-from io import BytesIO
-import base64
+import time
+import uuid
+from prompt_cache import PromptCache
+from batch_generation import build_jobs, make_image_worker, run_batch
+from gallery_store import GalleryStore
+from video_store import VideoStore, iter_output_chunks, output_url
+from video_jobs import SUCCEEDED, JobCanceled, VideoJobQueue
+
+PROMPT_MODEL_ID = "gemini-2.0-flash-exp"
+PROMPT_INSTRUCTIONS = [
+    "Please according to the search results, give back only one prompt for AI image generation;",
+    "Just give me the prompt, no other words",
+    "Make the prompt detailed and optimized for image generation"
+]
+IMAGE_MODEL_ID = "black-forest-labs/flux-1.1-pro-ultra"
+VIDEO_MODEL_ID = "minimax/video-01"
+GALLERY_PAGE_SIZE = 6
+VIDEO_POLL_INTERVAL = 3  # seconds between Replicate prediction status checks
+VIDEO_JOB_REFRESH_SECONDS = 3
 
 # page config
 st.set_page_config(
@@ -29,6 +45,30 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_prompt_cache():
+    """share one on-disk prompt cache across sessions"""
+    return PromptCache()
+
+def make_prompt_model(model_id, api_key):
+    """
+    build a fresh Gemini model for one agent (never share it between threads).
+
+    phi models and toolkits keep per-run state, so every prompt agent (batch
+    workers and video jobs included) builds its own.
+    """
+    return Gemini(id=model_id, api_key=api_key)
+
+@st.cache_resource
+def get_video_store():
+    """share one managed media directory for generated videos across sessions"""
+    return VideoStore()
+
+@st.cache_resource
+def get_video_job_queue():
+    """share one background video job queue across sessions"""
+    return VideoJobQueue(max_workers=8)
+
 # sidebar api config
 with st.sidebar:
     st.title("🔑 API Configuration")
@@ -40,19 +80,29 @@ with st.sidebar:
         os.environ["REPLICATE_API_TOKEN"] = replicate_key
         st.success("API keys configured successfully!")
 
+    # prompt cache config
+    st.markdown("---")
+    st.subheader("⚡ Prompt Cache")
+    bypass_prompt_cache = st.toggle("Bypass prompt cache", value=False)
+    prompt_cache_stats_placeholder = st.empty()
+    if st.button("Clear prompt cache"):
+        get_prompt_cache().clear()
+
 # main interface
 st.title("🎨 AI Image & Video Generator")
 st.markdown("Generate unique images and videos from your text descriptions")
 
 # init session_state
-if 'generated_images' not in st.session_state:
-    st.session_state.generated_images = []  # store all generated images
-if 'image_data_list' not in st.session_state:
-    st.session_state.image_data_list = []   # store all image data
-if 'prompts' not in st.session_state:
-    st.session_state.prompts = []           # store all generated prompts
+if 'gallery' not in st.session_state:
+    st.session_state.gallery = GalleryStore()  # store all generated images and prompts
 if 'generated_videos' not in st.session_state:
-    st.session_state.generated_videos = []   # store all generated videos
+    st.session_state.generated_videos = []   # store references to generated video files
+if 'job_owner' not in st.session_state:
+    # keep the owner id in the url so video jobs are found again after a page reload
+    st.session_state.job_owner = st.query_params.get("session") or uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.job_owner
+if 'collected_video_jobs' not in st.session_state:
+    st.session_state.collected_video_jobs = set()  # finished jobs already added to generated_videos
 
 # user input
 user_input = st.text_area("Enter your description:", height=100)
@@ -68,6 +118,21 @@ with col1:
 with col2:
     generate_video_button = st.button("🎬 Generate Video", type="primary")
 
+# batch mode: several descriptions, or several variants of one description
+with st.expander("🧩 Batch mode"):
+    batch_descriptions = st.text_area(
+        "Descriptions (one per line, leave empty to use the description above):",
+        height=100
+    )
+    batch_col1, batch_col2, batch_col3 = st.columns(3)
+    with batch_col1:
+        batch_variants = st.number_input("Variants per description", min_value=1, max_value=8, value=2)
+    with batch_col2:
+        batch_workers = st.slider("Parallel workers", min_value=1, max_value=8, value=4)
+    with batch_col3:
+        batch_timeout = st.number_input("Timeout per image (s)", min_value=30, max_value=600, value=180)
+    generate_batch_button = st.button("🧩 Generate Batch", type="primary")
+
 def extract_model_content(response):
     if hasattr(response, 'messages'):
         for message in response.messages:
@@ -80,63 +145,97 @@ def extract_content(response):
         return response.content.strip()
     return None
 
+def expand_prompt(user_input, cache, api_key, use_cache=True):
+    """expand a description into an image prompt, raising on failure (safe to call from worker threads)"""
+    cache_key = cache.make_key(user_input, PROMPT_MODEL_ID, PROMPT_INSTRUCTIONS)
+    if use_cache:
+        cached_prompt = cache.get(cache_key)
+        if cached_prompt:
+            return cached_prompt
+
+    # the agent, its model and the search tool are cheap and built per run
+    agent = Agent(
+        model=make_prompt_model(PROMPT_MODEL_ID, api_key),
+        tools=[DuckDuckGo(search=True)],
+        instructions=PROMPT_INSTRUCTIONS,
+        show_tool_calls=True,
+        markdown=True,
+    )
+    
+    response = agent.run(user_input)
+    prompt = extract_model_content(response) or extract_content(response)
+    if prompt:
+        cache.set(cache_key, prompt)
+    return prompt
+
 def generate_prompt(user_input):
-    """generate optimized prompt using Gemini and DuckDuckGo"""
+    """generate optimized prompt using Gemini and DuckDuckGo, reusing cached prompts"""
     try:
-        agent = Agent(
-            model=Gemini(id="gemini-2.0-flash-exp"),
-            tools=[DuckDuckGo(search=True)],
-            instructions=[
-                "Please according to the search results, give back only one prompt for AI image generation;",
-                "Just give me the prompt, no other words",
-                "Make the prompt detailed and optimized for image generation"
-            ],
-            show_tool_calls=True,
-            markdown=True,
-        )
-        
-        response = agent.run(user_input)
-        return extract_model_content(response) or extract_content(response)
+        return expand_prompt(user_input, get_prompt_cache(), gemini_key,
+                             use_cache=not bypass_prompt_cache)
     except Exception as e:
         st.error(f"Error generating prompt: {str(e)}")
         return None
 
+def run_image_model(prompt):
+    """call the image model on Replicate, raising on failure"""
+    return replicate.run(
+        IMAGE_MODEL_ID,
+        input={
+            "prompt": prompt,
+            "aspect_ratio": "3:2"
+        }
+    )
+
+def download_image(image_url):
+    """download the generated image bytes"""
+    response = requests.get(str(image_url), timeout=30)
+    response.raise_for_status()
+    return response.content
+
+def add_image_to_history(image_bytes, prompt):
+    """add the original downloaded image bytes and prompt to the session gallery"""
+    return st.session_state.gallery.add(image_bytes, prompt)
+
 def generate_image(prompt):
     """generate image using Replicate API"""
     try:
-        output = replicate.run(
-            "black-forest-labs/flux-1.1-pro-ultra",
-            input={
-                "prompt": prompt,
-                "aspect_ratio": "3:2"
-            }
-        )
-        return output
+        return run_image_model(prompt)
     except Exception as e:
         st.error(f"Error generating image: {str(e)}")
         return None
 
-def generate_video(prompt):
-    """generate video using Replicate API"""
-    try:
-        output = replicate.run(
-            "minimax/video-01",
-            input={"prompt": prompt}
-        )
-        return output
-    except Exception as e:
-        st.error(f"Error generating video: {str(e)}")
-        return None
-
-def get_video_html(video_data):
-    """generate video html tag"""
-    b64 = base64.b64encode(video_data).decode()
-    return f"""
-        <video width="100%" controls>
-            <source src="data:video/mp4;base64,{b64}" type="video/mp4">
-            Your browser does not support the video tag.
-        </video>
-    """
+def make_video_job_runner(prompt_cache, api_key, video_store, use_cache):
+    """build a background job: expand the prompt, run minimax on Replicate and save the video"""
+    def run(job, queue):
+        queue.update(job, stage="Step 1/3: Generating optimized prompt using Gemini...", progress=0.05)
+        prompt = expand_prompt(job.description, prompt_cache, api_key, use_cache=use_cache)
+        if not prompt:
+            raise RuntimeError("Failed to generate prompt")
+        queue.check_canceled(job)
+        
+        queue.update(job, prompt=prompt, stage="Step 2/3: Generating video...", progress=0.2)
+        prediction = replicate.models.predictions.create(model=VIDEO_MODEL_ID, input={"prompt": prompt})
+        queue.update(job, prediction_id=prediction.id)
+        
+        while prediction.status not in ("succeeded", "failed", "canceled"):
+            if queue.is_canceled(job):
+                prediction.cancel()
+                raise JobCanceled()
+            time.sleep(VIDEO_POLL_INTERVAL)
+            prediction.reload()
+            logs = (prediction.logs or "").strip().splitlines()
+            if logs:
+                queue.update(job, last_log=logs[-1])
+        
+        if prediction.status != "succeeded":
+            raise RuntimeError(prediction.error or f"Prediction {prediction.status}")
+        
+        queue.update(job, stage="Step 3/3: Saving video...", progress=0.9)
+        return video_store.save_stream(iter_output_chunks(prediction.output),
+                                       source_url=output_url(prediction.output))
+    
+    return run
 
 # generate image logic
 if generate_image_button:
@@ -163,18 +262,7 @@ if generate_image_button:
                     if image_url:
                         try:
                             # 获取图像
-                            response = requests.get(image_url, timeout=30)
-                            img = Image.open(BytesIO(response.content))
-                            
-                            # prepare image data
-                            buf = BytesIO()
-                            img.save(buf, format="JPEG")
-                            img_data = buf.getvalue()
-                            
-                            # add new image and prompt to the list
-                            st.session_state.generated_images.insert(0, img)
-                            st.session_state.image_data_list.insert(0, img_data)
-                            st.session_state.prompts.insert(0, prompt)  # save prompt
+                            add_image_to_history(download_image(image_url), prompt)
                             
                             st.success("✅ Image generated successfully!")
                             
@@ -186,72 +274,166 @@ if generate_image_button:
             else:
                 st.error("Failed to generate prompt. Please try again.")
 
-# generate video logic
-if generate_video_button:
+# generate batch logic
+if generate_batch_button:
+    descriptions = [line for line in batch_descriptions.splitlines() if line.strip()] or [user_input]
+    jobs = build_jobs(descriptions, int(batch_variants))
+    
     if not (gemini_key and replicate_key):
         st.error("Please configure both API keys in the sidebar first!")
-    elif not user_input:
+    elif not jobs:
         st.warning("Please enter a description first!")
     else:
-        # step 1: generate optimized prompt
-        with st.spinner("Step 1/2: Generating optimized prompt using Gemini..."):
-            prompt = generate_prompt(user_input)
+        # the cache handle is resolved here because workers run outside the script thread
+        prompt_cache = get_prompt_cache()
+        worker = make_image_worker(
+            lambda description: expand_prompt(description, prompt_cache, gemini_key,
+                                              use_cache=not bypass_prompt_cache),
+            run_image_model,
+            download_image,
+        )
+        
+        progress = st.progress(0.0, text=f"Generating {len(jobs)} images...")
+        batch_gallery = st.columns(3)
+        succeeded = 0
+        
+        for done, result in enumerate(run_batch(jobs, worker, batch_workers, batch_timeout), 1):
+            progress.progress(done / len(jobs), text=f"{done}/{len(jobs)} images finished")
+            label = f"{result.job.description} (variant {result.job.variant + 1})"
             
-            if prompt:
-                st.success("✅ Prompt generated successfully!")
-                with st.expander("Show generated prompt", expanded=True):
-                    st.info(f"Generated prompt: {prompt}")
-                
-                # step 2: generate video
-                with st.spinner("Step 2/2: Generating video..."):
-                    video_data = generate_video(prompt)
-                    if video_data:
-                        # save video data and prompt
-                        video_bytes = video_data.read()
-                        st.session_state.generated_videos.insert(0, {
-                            'video_data': video_bytes,
-                            'prompt': prompt
-                        })
-                        st.success("✅ Video generated successfully!")
-                        st.rerun()
-
-# display all generated content
-for idx, (img, img_data, prompt) in enumerate(zip(
-    st.session_state.get('generated_images', []),
-    st.session_state.get('image_data_list', []),
-    st.session_state.get('prompts', [])
-)):
-    with st.expander(f"Generated Image {len(st.session_state.generated_images) - idx}", expanded=(idx == 0)):
-        st.image(img, caption=f"Generated Image {len(st.session_state.generated_images) - idx}", 
-                use_column_width=True)
-        st.info(f"Generated prompt: {prompt}")
+            with batch_gallery[(done - 1) % 3]:
+                if result.ok:
+                    try:
+                        entry = add_image_to_history(result.image_bytes, result.prompt)
+                        st.image(st.session_state.gallery.thumbnail(entry),
+                                 caption=f"{label} · {result.elapsed:.1f}s", use_column_width=True)
+                        succeeded += 1
+                    except Exception as e:
+                        st.error(f"Error decoding image for {label}: {str(e)}")
+                else:
+                    st.error(f"Error generating {label}: {result.error}")
         
-        # download image button
-        st.download_button(
-            label="⬇️ Download Image",
-            data=img_data,
-            file_name=f"generated_image_{len(st.session_state.generated_images) - idx}.jpg",
-            mime="image/jpeg",
-            key=f"download_button_{len(st.session_state.generated_images) - idx}"
+        st.success(f"✅ Batch finished: {succeeded}/{len(jobs)} images generated")
+
+# generate video logic: queue a background job so the page stays usable
+if generate_video_button:
+    if not (gemini_key and replicate_key):
+        st.error("Please configure both API keys in the sidebar first!")
+    elif not user_input:
+        st.warning("Please enter a description first!")
+    else:
+        # stores are resolved here because the job runs outside the script thread
+        runner = make_video_job_runner(
+            get_prompt_cache(),
+            gemini_key,
+            get_video_store(),
+            not bypass_prompt_cache
         )
+        job = get_video_job_queue().submit(st.session_state.job_owner, user_input, runner)
+        st.success(f"✅ Video job {job.id} queued! You can keep generating while it runs.")
+
+# collect finished video jobs and show the job list
+video_job_queue = get_video_job_queue()
+video_jobs = video_job_queue.list_jobs(st.session_state.job_owner)
+for job in reversed(video_jobs):
+    if job.status == SUCCEEDED and job.id not in st.session_state.collected_video_jobs:
+        st.session_state.collected_video_jobs.add(job.id)
+        st.session_state.generated_videos.insert(0, {
+            'video': job.result,
+            'prompt': job.prompt
+        })
+
+auto_refresh_jobs = False
+if video_jobs:
+    st.subheader("🎬 Video Jobs")
+    auto_refresh_jobs = st.checkbox("Auto-refresh while jobs are running", value=True)
+    status_icons = {"queued": "⏳", "running": "🔄", "succeeded": "✅", "failed": "❌", "canceled": "🚫"}
+    
+    for job in video_jobs[:10]:
+        job_col1, job_col2, job_col3 = st.columns([5, 2, 1])
+        with job_col1:
+            st.markdown(f"**{job.description[:80]}**")
+            if job.active:
+                st.progress(job.progress, text=job.last_log or job.stage)
+            elif job.error:
+                st.caption(job.error)
+        with job_col2:
+            st.markdown(f"{status_icons.get(job.status, '')} {job.status} · {job.elapsed:.0f}s")
+        with job_col3:
+            if job.active and st.button("Cancel", key=f"cancel_video_job_{job.id}"):
+                video_job_queue.cancel(job.id)
+                st.rerun()
 
-# display all generated videos
-for idx, video_item in enumerate(st.session_state.get('generated_videos', [])):
-    with st.expander(f"Generated Video {len(st.session_state.generated_videos) - idx}", expanded=(idx == 0)):
+# display all generated content, one page at a time
+gallery = st.session_state.gallery
+if gallery.entries:
+    page_count = gallery.page_count(GALLERY_PAGE_SIZE)
+    page_index = 0
+    if page_count > 1:
+        page_index = st.number_input("Image history page", min_value=1, max_value=page_count, value=1) - 1
+    st.caption(
+        f"{len(gallery.entries)} images · {gallery.memory_bytes() / 1024 / 1024:.1f} MB in memory · "
+        f"{gallery.spilled_bytes() / 1024 / 1024:.1f} MB on disk"
+    )
+
+    for idx, entry in enumerate(gallery.page(page_index, GALLERY_PAGE_SIZE)):
+        latest = page_index == 0 and idx == 0
+        with st.expander(f"Generated Image {entry.id}", expanded=latest):
+            # only the latest image is sent at full size, older ones as thumbnails
+            st.image(gallery.get_bytes(entry) if latest else gallery.thumbnail(entry),
+                     caption=f"Generated Image {entry.id}", use_column_width=latest)
+            st.info(f"Generated prompt: {entry.prompt}")
+            
+            # download image button
+            st.download_button(
+                label="⬇️ Download Image",
+                data=gallery.get_bytes(entry),
+                file_name=f"generated_image_{entry.id}.{entry.extension}",
+                mime=entry.mime,
+                key=f"download_button_{entry.id}"
+            )
+
+# display all generated videos, dropping any evicted from the media directory
+video_store = get_video_store()
+st.session_state.generated_videos = [
+    item for item in st.session_state.get('generated_videos', []) if video_store.exists(item['video'])
+]
+for idx, video_item in enumerate(st.session_state.generated_videos):
+    video_entry = video_item['video']
+    video_number = len(st.session_state.generated_videos) - idx
+    with st.expander(f"Generated Video {video_number}", expanded=(idx == 0)):
         st.info(f"Generated prompt: {video_item['prompt']}")
         
-        # display video
-        st.markdown(get_video_html(video_item['video_data']), unsafe_allow_html=True)
-        
-        # download video button
-        st.download_button(
-            label="⬇️ Download Video",
-            data=video_item['video_data'],
-            file_name=f"generated_video_{len(st.session_state.generated_videos) - idx}.mp4",
-            mime="video/mp4",
-            key=f"download_video_{len(st.session_state.generated_videos) - idx}"
-        )
+        if video_entry.source_url_valid():
+            # the browser loads the video from Replicate; nothing goes through the media store
+            st.video(video_entry.source_url, format="video/mp4")
+            st.link_button("⬇️ Download Video", video_entry.source_url)
+        elif st.toggle("Load video", key=f"load_video_{video_entry.id}"):
+            # the Replicate link has expired, so the stored file is sent, but only on request
+            st.video(video_entry.path, format="video/mp4")
+            with open(video_entry.path, "rb") as video_file:
+                st.download_button(
+                    label="⬇️ Download Video",
+                    data=video_file,
+                    file_name=f"generated_video_{video_number}.mp4",
+                    mime="video/mp4",
+                    key=f"download_video_{video_entry.id}"
+                )
+        else:
+            st.caption(f"{video_entry.size / 1024 / 1024:.1f} MB, stored on the server")
+
+# show prompt cache counters in the sidebar
+cache_stats = get_prompt_cache().stats()
+prompt_cache_stats_placeholder.caption(
+    f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} · "
+    f"Hit rate: {cache_stats['hit_rate']:.0%} · Entries: {cache_stats['entries']}"
+)
 
 # add footer
 st.markdown("---")
-st.markdown("Made with ❤️ using Streamlit")
\ No newline at end of file
+st.markdown("Made with ❤️ using Streamlit")
+
+# poll running video jobs by rerunning the script
+if auto_refresh_jobs and any(job.active for job in video_jobs):
+    time.sleep(VIDEO_JOB_REFRESH_SECONDS)
+    st.rerun()
@@ -0,0 +1,158 @@
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, List, Optional
+
+
+@dataclass
+class BatchJob:
+    """one image to generate in a batch"""
+    index: int
+    description: str
+    variant: int = 0
+
+
+@dataclass
+class BatchResult:
+    """outcome of a batch job, yielded as soon as the job finishes"""
+    job: BatchJob
+    prompt: Optional[str] = None
+    image_bytes: Optional[bytes] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def build_jobs(descriptions: List[str], variants: int = 1) -> List[BatchJob]:
+    """turn a list of descriptions (or one description) into variant jobs"""
+    jobs = []
+    for description in descriptions:
+        description = description.strip()
+        if not description:
+            continue
+        for variant in range(max(1, variants)):
+            jobs.append(BatchJob(index=len(jobs), description=description, variant=variant))
+    return jobs
+
+
+class SharedCalls:
+    """
+    run a function at most once per key while a call is in flight or done.
+
+    Variants of the same description would otherwise expand the same prompt
+    in parallel; callers with the same key wait for the first call instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}
+
+    def do(self, key, fn: Callable[[], Any]):
+        with self._lock:
+            entry = self._results.get(key)
+            owner = entry is None
+            if owner:
+                entry = {"event": threading.Event(), "value": None, "error": None}
+                self._results[key] = entry
+
+        if owner:
+            try:
+                entry["value"] = fn()
+            except Exception as e:
+                entry["error"] = e
+                # let a later caller retry instead of caching the failure
+                with self._lock:
+                    self._results.pop(key, None)
+            finally:
+                entry["event"].set()
+        else:
+            entry["event"].wait()
+
+        if entry["error"] is not None:
+            raise entry["error"]
+        return entry["value"]
+
+
+def make_image_worker(prompt_fn: Callable[[str], str],
+                      run_model: Callable[[str], Any],
+                      fetch_bytes: Callable[[Any], bytes]) -> Callable[[BatchJob], tuple]:
+    """compose prompt generation, the model call and the download into one job"""
+    shared_prompts = SharedCalls()
+
+    def worker(job: BatchJob):
+        prompt = shared_prompts.do(job.description, lambda: prompt_fn(job.description))
+        if not prompt:
+            raise RuntimeError("prompt generation returned no prompt")
+        output = run_model(prompt)
+        if not output:
+            raise RuntimeError("model returned no output")
+        return prompt, fetch_bytes(output)
+
+    return worker
+
+
+def run_batch(jobs: List[BatchJob],
+              worker: Callable[[BatchJob], tuple],
+              max_workers: int = 4,
+              job_timeout: float = 180.0,
+              batch_timeout: Optional[float] = None) -> Iterator[BatchResult]:
+    """
+    run jobs on a bounded thread pool and yield results in completion order.
+
+    The timeout of a job starts when a worker picks it up, so queued jobs are
+    not penalised by a small pool. Threads of timed out jobs cannot be killed;
+    they are abandoned and their late results are dropped, but they keep their
+    pool slot. So the whole batch also has a deadline, by default the time the
+    pool needs when every job takes the full `job_timeout`; jobs still queued
+    or running then are reported as timed out.
+    """
+    workers = max(1, max_workers)
+    if batch_timeout is None:
+        batch_timeout = job_timeout * math.ceil(len(jobs) / workers)
+    deadline = time.monotonic() + batch_timeout
+    started = {}
+
+    def run(job):
+        started[job.index] = time.monotonic()
+        return worker(job)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+    futures = {executor.submit(run, job): job for job in jobs}
+    pending = set(futures)
+
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                job = futures[future]
+                elapsed = time.monotonic() - started.get(job.index, time.monotonic())
+                try:
+                    prompt, image_bytes = future.result()
+                    yield BatchResult(job=job, prompt=prompt, image_bytes=image_bytes, elapsed=elapsed)
+                except Exception as e:
+                    yield BatchResult(job=job, error=str(e), elapsed=elapsed)
+
+            now = time.monotonic()
+            for future in list(pending):
+                job = futures[future]
+                if job.index in started and now - started[job.index] > job_timeout:
+                    pending.discard(future)
+                    future.cancel()
+                    yield BatchResult(job=job, error=f"timed out after {job_timeout:.0f}s",
+                                      elapsed=now - started[job.index])
+                elif now > deadline:
+                    pending.discard(future)
+                    future.cancel()
+                    if job.index in started:
+                        error = f"batch timed out after {batch_timeout:.0f}s"
+                    else:
+                        error = f"batch timed out after {batch_timeout:.0f}s before the job started"
+                    yield BatchResult(job=job, error=error, elapsed=now - started.get(job.index, now))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,85 @@
+"""
+benchmark serial vs pooled batch image generation against the fake Replicate
+endpoint, without any API keys or network access. Predictions go through a
+real `replicate.Client` pointed at the fake server, as the app's would.
+
+    python bench_batch.py --jobs 12 --workers 4 --model-latency 1.0 --prompt-latency 0.5
+"""
+import argparse
+import time
+import urllib.request
+
+import replicate
+
+from batch_generation import build_jobs, make_image_worker, run_batch
+from fake_replicate import start_fake_replicate
+
+
+def make_fake_model(base_url):
+    """run the image model through replicate.Client against the fake endpoint"""
+    client = replicate.Client(api_token="fake-token", base_url=base_url)
+
+    def run_model(prompt):
+        return client.run(
+            "black-forest-labs/flux-1.1-pro-ultra",
+            input={"prompt": prompt, "aspect_ratio": "3:2"}
+        )
+    return run_model
+
+
+def fetch_bytes(output):
+    # a plain url, or a FileOutput on newer clients whose str() is the url
+    with urllib.request.urlopen(str(output), timeout=30) as response:
+        return response.read()
+
+
+def make_fake_prompt(latency):
+    def prompt_fn(description):
+        time.sleep(latency)
+        return f"a detailed photo of {description}"
+    return prompt_fn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch image generation offline")
+    parser.add_argument("--jobs", type=int, default=12, help="Number of images to generate")
+    parser.add_argument("--descriptions", type=int, default=4, help="Distinct descriptions in the batch")
+    parser.add_argument("--workers", type=int, default=4, help="Worker pool size")
+    parser.add_argument("--model-latency", type=float, default=1.0, help="Seconds per fake prediction")
+    parser.add_argument("--prompt-latency", type=float, default=0.5, help="Seconds per fake prompt expansion")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_replicate(latency=args.model_latency)
+    try:
+        descriptions = [f"scene {i}" for i in range(args.descriptions)]
+        variants = max(1, args.jobs // max(1, args.descriptions))
+        jobs = build_jobs(descriptions, variants)
+
+        results = {}
+        for label, workers in (("serial", 1), ("pooled", args.workers)):
+            worker = make_image_worker(
+                make_fake_prompt(args.prompt_latency),
+                make_fake_model(base_url),
+                fetch_bytes,
+            )
+            start = time.perf_counter()
+            first = None
+            errors = 0
+            for result in run_batch(jobs, worker, max_workers=workers):
+                if first is None:
+                    first = time.perf_counter() - start
+                if not result.ok:
+                    errors += 1
+            results[label] = (time.perf_counter() - start, first, errors)
+
+        print(f"{len(jobs)} jobs, model latency {args.model_latency}s, prompt latency {args.prompt_latency}s")
+        for label, (total, first, errors) in results.items():
+            print(f"{label:>7}: total {total:6.2f}s | first image {first:5.2f}s | "
+                  f"{len(jobs) / total:5.2f} images/s | errors {errors}")
+        print(f"speedup: {results['serial'][0] / results['pooled'][0]:.2f}x")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
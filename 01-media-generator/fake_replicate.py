@@ -0,0 +1,115 @@
+"""
+a local stand-in for the Replicate predictions API, used to benchmark batch
+generation offline.
+
+It implements just enough of the HTTP API for `replicate.Client(base_url=...)`:
+creating a prediction sleeps for the configured latency and answers with a
+finished prediction whose output points at a file served by the same server.
+
+    python fake_replicate.py --port 8765 --latency 2.0
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeReplicateHandler(BaseHTTPRequestHandler):
+    latency = 1.0
+    image_bytes = os.urandom(256 * 1024)
+    predictions = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _host(self):
+        return f"http://{self.headers.get('Host', '127.0.0.1')}"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.endswith("/predictions"):
+            self._send_json(404, {"detail": "not found"})
+            return
+
+        # simulate the model run
+        time.sleep(self.latency)
+
+        prediction_id = uuid.uuid4().hex
+        # /v1/models/{owner}/{name}/predictions, as posted by replicate.Client.run
+        parts = self.path.strip("/").split("/")
+        model = "/".join(parts[2:4]) if len(parts) >= 5 and parts[1] == "models" else ""
+        now = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+        prediction = {
+            "id": prediction_id,
+            "model": model,
+            "version": request.get("version", ""),
+            "status": "succeeded",
+            "input": request.get("input", {}),
+            "output": f"{self._host()}/files/{prediction_id}.jpg",
+            "logs": "",
+            "error": None,
+            "metrics": {"predict_time": self.latency},
+            "created_at": now,
+            "started_at": now,
+            "completed_at": now,
+            "urls": {
+                "get": f"{self._host()}/v1/predictions/{prediction_id}",
+                "cancel": f"{self._host()}/v1/predictions/{prediction_id}/cancel",
+            },
+        }
+        self.predictions[prediction_id] = prediction
+        self._send_json(201, prediction)
+
+    def do_GET(self):
+        if self.path.startswith("/files/"):
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(self.image_bytes)))
+            self.end_headers()
+            self.wfile.write(self.image_bytes)
+        elif self.path.startswith("/v1/predictions/"):
+            prediction_id = self.path.rstrip("/").rsplit("/", 1)[-1]
+            prediction = self.predictions.get(prediction_id)
+            if prediction is None:
+                self._send_json(404, {"detail": "not found"})
+            else:
+                self._send_json(200, prediction)
+        else:
+            self._send_json(404, {"detail": "not found"})
+
+
+def start_fake_replicate(port=0, latency=1.0):
+    """start the fake server in a daemon thread and return (server, base_url)"""
+    handler = type("Handler", (FakeReplicateHandler,), {"latency": latency, "predictions": {}})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Replicate endpoint for offline benchmarks")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds each prediction takes")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_replicate(args.port, args.latency)
+    print(f"Fake Replicate listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
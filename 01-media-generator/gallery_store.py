@@ -0,0 +1,139 @@
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional
+
+from PIL import Image
+
+# (magic prefix, mime type, file extension)
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", "png"),
+    (b"GIF8", "image/gif", "gif"),
+]
+
+
+def sniff_image_type(data):
+    """guess mime type and extension from the first bytes of an image"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    for signature, mime, extension in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime, extension
+    return "application/octet-stream", "bin"
+
+
+@dataclass
+class GalleryEntry:
+    """one generated image; the original bytes live either in memory or in a spill file"""
+    id: int
+    prompt: str
+    mime: str
+    extension: str
+    size: int
+    data: Optional[bytes] = None
+    path: Optional[str] = None
+    thumbnail: Optional[bytes] = None
+
+
+class GalleryStore:
+    """
+    compact per-session store for generated images.
+
+    Only the original downloaded bytes are kept (no decoded PIL objects and no
+    re-encoded copies). Once the originals held in memory exceed
+    `memory_limit_bytes`, the oldest ones are spilled to a temp directory and
+    read back on demand. Thumbnails are built once, the first time they are needed.
+    """
+
+    def __init__(self, memory_limit_bytes=64 * 1024 * 1024, thumbnail_size=(384, 384), spill_dir=None):
+        self.memory_limit_bytes = memory_limit_bytes
+        self.thumbnail_size = thumbnail_size
+        self.entries: List[GalleryEntry] = []  # newest first
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._spill_dir = spill_dir
+
+    def add(self, image_bytes, prompt):
+        """store downloaded image bytes and return the new entry"""
+        mime, extension = sniff_image_type(image_bytes)
+        with self._lock:
+            entry = GalleryEntry(
+                id=next(self._ids),
+                prompt=prompt,
+                mime=mime,
+                extension=extension,
+                size=len(image_bytes),
+                data=image_bytes,
+            )
+            self.entries.insert(0, entry)
+            self._spill_if_needed()
+        return entry
+
+    def get_bytes(self, entry):
+        """return the original image bytes, reading spilled entries from disk"""
+        if entry.data is not None:
+            return entry.data
+        with open(entry.path, "rb") as f:
+            return f.read()
+
+    def thumbnail(self, entry):
+        """return JPEG thumbnail bytes, building them on first use"""
+        if entry.thumbnail is None:
+            img = Image.open(BytesIO(self.get_bytes(entry)))
+            img.thumbnail(self.thumbnail_size)
+            if img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            buf = BytesIO()
+            img.save(buf, format="JPEG", quality=85)
+            entry.thumbnail = buf.getvalue()
+        return entry.thumbnail
+
+    def page(self, page_index, page_size):
+        """return the entries shown on one page, newest first"""
+        start = page_index * page_size
+        return self.entries[start:start + page_size]
+
+    def page_count(self, page_size):
+        return max(1, -(-len(self.entries) // page_size))
+
+    def memory_bytes(self):
+        """bytes held in memory by originals and thumbnails"""
+        return sum(len(e.data or b"") + len(e.thumbnail or b"") for e in self.entries)
+
+    def spilled_bytes(self):
+        return sum(e.size for e in self.entries if e.data is None)
+
+    def clear(self):
+        with self._lock:
+            self.entries = []
+            if self._spill_dir and os.path.isdir(self._spill_dir):
+                shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def _ensure_spill_dir(self):
+        if self._spill_dir is None or not os.path.isdir(self._spill_dir):
+            self._spill_dir = tempfile.mkdtemp(prefix="media_generator_gallery_")
+            # remove the spill files when the session's store is garbage collected
+            weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+        return self._spill_dir
+
+    def _spill_if_needed(self):
+        in_memory = sum(e.size for e in self.entries if e.data is not None)
+        # spill the oldest originals first, never the newest one
+        for entry in reversed(self.entries[1:]):
+            if in_memory <= self.memory_limit_bytes:
+                break
+            if entry.data is None:
+                continue
+            path = os.path.join(self._ensure_spill_dir(), f"{entry.id}.{entry.extension}")
+            with open(path, "wb") as f:
+                f.write(entry.data)
+            entry.path = path
+            entry.data = None
+            in_memory -= entry.size
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+
+def normalize_description(text):
+    """normalize a user description so near-identical inputs share a cache entry"""
+    text = text.strip().lower()
+    text = re.sub(r"\s+", " ", text)
+    return text.rstrip(" .!?,;:")
+
+
+class PromptCache:
+    """
+    content-addressed on-disk cache for prompts generated by Gemini.
+
+    Each entry is a small JSON file named after the sha256 of the normalized
+    description, the model id and the instruction set. The file mtime is used
+    as the last access time, so the least recently used entries are evicted
+    first once the cache holds more than `max_entries` prompts.
+    """
+
+    def __init__(self, cache_dir=None, ttl_seconds=7 * 24 * 3600, max_entries=500):
+        if cache_dir is None:
+            cache_dir = os.path.join(tempfile.gettempdir(), "media_generator_prompt_cache")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, user_input, model_id, instructions):
+        """build the content address for a description + model + instruction set"""
+        payload = json.dumps({
+            "input": normalize_description(user_input),
+            "model": model_id,
+            "instructions": list(instructions),
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """return the cached prompt or None, counting the lookup as hit or miss"""
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+
+            if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+                self._remove(path)
+                self.misses += 1
+                return None
+
+            # touch the file so LRU eviction sees this entry as recently used
+            os.utime(path, None)
+            self.hits += 1
+            return entry["prompt"]
+
+    def set(self, key, prompt):
+        """store a prompt and evict the least recently used entries if needed"""
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"prompt": prompt, "created_at": time.time()}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def clear(self):
+        """remove every cached prompt and reset the counters"""
+        with self._lock:
+            for path in self._entry_paths():
+                self._remove(path)
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """return hit/miss counters and the current number of entries"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entry_paths()),
+            }
+
+    def _entry_paths(self):
+        return [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if name.endswith(".json")
+        ]
+
+    def _evict(self):
+        paths = self._entry_paths()
+        if len(paths) <= self.max_entries:
+            return
+        paths.sort(key=lambda p: os.path.getmtime(p))
+        for path in paths[:len(paths) - self.max_entries]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
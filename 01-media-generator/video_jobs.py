@@ -0,0 +1,183 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from video_store import VideoEntry
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELED = "canceled"
+
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class JobCanceled(Exception):
+    """raised inside a job runner when the job has been canceled"""
+
+
+@dataclass
+class VideoJob:
+    """state of one background video generation"""
+    id: str
+    owner: str
+    description: str
+    status: str = QUEUED
+    stage: str = "Waiting for a worker"
+    progress: float = 0.0
+    prompt: Optional[str] = None
+    prediction_id: Optional[str] = None
+    last_log: str = ""
+    error: Optional[str] = None
+    result: Optional[VideoEntry] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATUSES
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class VideoJobQueue:
+    """
+    process-wide queue of video jobs running on a local worker pool.
+
+    A job runner is any callable `run(job, queue)` returning a VideoEntry; it
+    reports progress with `queue.update(job, ...)` and calls
+    `queue.check_canceled(job)` at safe points. Job state is mirrored to a
+    JSON file so finished jobs are still listed after a server restart.
+    """
+
+    def __init__(self, max_workers=4, state_path=None, max_history=200):
+        if state_path is None:
+            state_path = os.path.join(tempfile.gettempdir(), "media_generator_video_jobs.json")
+
+        self.state_path = state_path
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="video-job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, VideoJob] = {}
+        self._futures = {}
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._load()
+
+    def submit(self, owner, description, run: Callable[[VideoJob, "VideoJobQueue"], VideoEntry]):
+        """queue a new job and return it immediately"""
+        job = VideoJob(id=uuid.uuid4().hex[:12], owner=owner, description=description)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._cancel_events[job.id] = threading.Event()
+            self._futures[job.id] = self._executor.submit(self._run, job, run)
+            self._save()
+        return job
+
+    def get(self, job_id) -> Optional[VideoJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, owner=None) -> List[VideoJob]:
+        """return jobs newest first, optionally only those of one owner"""
+        with self._lock:
+            jobs = [j for j in self._jobs.values() if owner is None or j.owner == owner]
+        return sorted(jobs, key=lambda j: j.created_at, reverse=True)
+
+    def cancel(self, job_id):
+        """request cancellation; queued jobs stop at once, running ones at their next check"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.active:
+                return False
+            self._cancel_events[job_id].set()
+            future = self._futures.get(job_id)
+            if future is not None and future.cancel():
+                self._finish(job, CANCELED, stage="Canceled before start")
+        return True
+
+    def update(self, job, **changes):
+        """update progress fields of a running job"""
+        with self._lock:
+            for name, value in changes.items():
+                setattr(job, name, value)
+            self._save()
+
+    def check_canceled(self, job):
+        if self._cancel_events[job.id].is_set():
+            raise JobCanceled()
+
+    def is_canceled(self, job):
+        return self._cancel_events[job.id].is_set()
+
+    def _run(self, job, run):
+        self.update(job, status=RUNNING, stage="Starting", started_at=time.time())
+        try:
+            self.check_canceled(job)
+            result = run(job, self)
+            with self._lock:
+                job.result = result
+                job.progress = 1.0
+                self._finish(job, SUCCEEDED, stage="Done")
+        except JobCanceled:
+            with self._lock:
+                self._finish(job, CANCELED, stage="Canceled")
+        except Exception as e:
+            with self._lock:
+                job.error = str(e)
+                self._finish(job, FAILED, stage="Failed")
+
+    def _finish(self, job, status, stage):
+        job.status = status
+        job.stage = stage
+        job.finished_at = time.time()
+        self._futures.pop(job.id, None)
+        self._prune()
+        self._save()
+
+    def _prune(self):
+        finished = sorted((j for j in self._jobs.values() if not j.active), key=lambda j: j.created_at)
+        for job in finished[:max(0, len(finished) - self.max_history)]:
+            del self._jobs[job.id]
+            del self._cancel_events[job.id]
+
+    def _save(self):
+        jobs = [asdict(job) for job in self._jobs.values()]
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(jobs, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError:
+            pass
+
+    def _load(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                jobs = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        for data in jobs:
+            if data.get("result"):
+                data["result"] = VideoEntry(**data["result"])
+            job = VideoJob(**data)
+            if job.active:
+                # the worker that owned this job died with the previous process
+                job.status = FAILED
+                job.stage = "Failed"
+                job.error = "Interrupted by a server restart"
+                job.finished_at = job.finished_at or time.time()
+            self._jobs[job.id] = job
+            self._cancel_events[job.id] = threading.Event()
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+
+CHUNK_SIZE = 1024 * 1024
+# Replicate deletes the output files of API predictions after an hour
+SOURCE_URL_TTL = 55 * 60
+
+
+@dataclass
+class VideoEntry:
+    """a generated video written once to the media directory"""
+    id: str
+    path: str
+    size: int
+    created_at: float
+    source_url: Optional[str] = None  # where Replicate serves the same file, while it lasts
+
+    def source_url_valid(self):
+        return bool(self.source_url) and time.time() - self.created_at < SOURCE_URL_TTL
+
+
+def output_url(output):
+    """the URL of a Replicate output, for plain URLs and file objects alike"""
+    if isinstance(output, str):
+        return output
+    url = getattr(output, "url", None)
+    return str(url) if url else None
+
+
+def iter_output_chunks(output, chunk_size=CHUNK_SIZE):
+    """
+    yield the bytes of a Replicate output without loading it into memory.
+
+    Newer Replicate clients return a file object that streams when iterated;
+    older ones return a plain URL, which is downloaded in chunks.
+    """
+    if isinstance(output, str) or not hasattr(output, "__iter__"):
+        with requests.get(str(output), stream=True, timeout=60) as response:
+            response.raise_for_status()
+            yield from response.iter_content(chunk_size=chunk_size)
+    else:
+        yield from output
+
+
+class VideoStore:
+    """
+    managed media directory for generated videos, shared by all sessions.
+
+    Videos are streamed to disk once, so nothing is kept in session memory or
+    inlined into the page. The page shows a video by its Replicate URL while
+    that is valid and only reads the file when the user asks for it. When the directory grows
+    beyond `max_total_bytes`, the oldest videos are deleted.
+    """
+
+    def __init__(self, media_dir=None, max_total_bytes=1024 * 1024 * 1024):
+        if media_dir is None:
+            media_dir = os.path.join(tempfile.gettempdir(), "media_generator_videos")
+        os.makedirs(media_dir, exist_ok=True)
+
+        self.media_dir = media_dir
+        self.max_total_bytes = max_total_bytes
+        self._lock = threading.Lock()
+
+    def save_stream(self, chunks, extension="mp4", source_url=None):
+        """write an iterable of byte chunks to a new file and return its entry"""
+        video_id = uuid.uuid4().hex
+        path = os.path.join(self.media_dir, f"{video_id}.{extension}")
+        tmp_path = f"{path}.part"
+
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    if chunk:
+                        f.write(chunk)
+                        size += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._evict(keep=path)
+        return VideoEntry(id=video_id, path=path, size=size, created_at=time.time(), source_url=source_url)
+
+    def exists(self, entry):
+        return os.path.exists(entry.path)
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(size for _, size, _ in self._files())
+
+    def _files(self):
+        files = []
+        for name in os.listdir(self.media_dir):
+            if name.endswith(".part"):
+                continue
+            path = os.path.join(self.media_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _evict(self, keep=None):
+        files = sorted(self._files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_total_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,285 @@
+"""
+Batch image processing with Mistral vision models.
+
+Sends every image in a directory (or matching a glob) to Mistral with a prompt
+template, running requests concurrently under an in-flight limit and a
+token-bucket rate limit. Results are appended to a JSONL file, which doubles as
+the checkpoint: re-running the same command skips images that already succeeded.
+
+Example:
+    python batch_vision.py ./photos --prompt "Describe {filename} in one sentence." \\
+        --output labels.jsonl --concurrency 8 --rate 5
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import time
+
+import httpx
+from mistralai import Mistral
+from data_uri import encode_buffer_to_data_uri, encode_file_to_data_uri
+from image_preprocess import EncodingSettings, fit_to_budget, needs_preprocessing
+from response_cache import DEFAULT_CACHE_PATH, ResponseCache, file_content_hash, usage_dict
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp")
+RETRY_STATUS_CODES = {408, 429}
+
+
+class TokenBucket:
+    """Async token bucket: allows `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def collect_images(inputs):
+    """Expand directories and glob patterns into a sorted list of image paths."""
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for name in files:
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        paths.add(os.path.abspath(os.path.join(root, name)))
+        else:
+            for path in glob.glob(item, recursive=True):
+                if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+
+def load_checkpoint(output_path):
+    """Return the set of image paths that already have a successful result."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut off by a crash
+            if record.get("status") == "ok":
+                done.add(record["path"])
+    return done
+
+
+def repair_checkpoint(output_path):
+    """Drop a last line cut off by a crash, so the next record starts on its own line."""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        # walk back to the end of the last complete line
+        position = size
+        while position > 0:
+            step = min(65536, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b"\n")
+            if newline != -1:
+                position = position - step + newline + 1
+                break
+            position -= step
+        f.truncate(position)
+
+
+def is_retryable(error):
+    """Whether a failed request can succeed on retry: rate limits, 5xx and transport errors."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRY_STATUS_CODES or status_code >= 500
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+
+def render_prompt(template, path):
+    filename = os.path.basename(path)
+    return template.format(filename=filename, stem=os.path.splitext(filename)[0], path=path)
+
+
+def build_messages(path, prompt, settings):
+    """Read, downscale if needed and encode one image into a Mistral chat message."""
+    if needs_preprocessing(path, settings):
+        with open(path, "rb") as image_file:
+            [(image_bytes, mime)], _ = fit_to_budget([image_file.read()], settings)
+        data_uri = encode_buffer_to_data_uri(image_bytes, mime)
+    else:
+        # already small enough: stream the file straight into the data URI
+        data_uri = encode_file_to_data_uri(path, f"image/{settings.format.lower()}")
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": data_uri},
+            ],
+        }
+    ]
+
+
+async def process_image(client, args, settings, bucket, cache, path):
+    record = {"path": path}
+    start = time.perf_counter()
+    messages = None
+
+    try:
+        prompt = render_prompt(args.prompt, path)
+    except (KeyError, IndexError, ValueError) as e:
+        # a bad template fails every image, but each one still gets its error record
+        record.update(status="error", error=f"Invalid prompt template: {e!r}", attempts=0)
+    else:
+        record["prompt"] = prompt
+        try:
+            # image decoding and resizing are CPU work, keep them off the event loop
+            messages = await asyncio.to_thread(build_messages, path, prompt, settings)
+        except Exception as e:
+            record.update(status="error", error=f"Failed to read image: {e}", attempts=0)
+
+    cache_key = None
+    if messages and cache is not None:
+        image_hash = await asyncio.to_thread(file_content_hash, path)
+        cache_key = cache.make_key(args.model, messages, [image_hash])
+    if cache_key:
+        # answered before with the same model, prompt and image: skip the API and the rate limit
+        cached = cache.get(cache_key)
+        if cached is not None:
+            record.update(status="ok", response=cached.content, cached=True)
+            if cached.usage:
+                record["usage"] = cached.usage
+            messages = None
+
+    for attempt in range(1, args.retries + 2) if messages else ():
+        try:
+            await bucket.acquire()
+            response = await client.chat.complete_async(model=args.model, messages=messages)
+            content = response.choices[0].message.content
+            usage = usage_dict(response)
+            record.update(status="ok", response=content)
+            record.pop("error", None)
+            if usage is not None:
+                record["usage"] = usage
+            if cache_key:
+                cache.set(cache_key, args.model, content, usage)
+            break
+        except Exception as e:
+            record.update(status="error", error=str(e), attempts=attempt)
+            # a bad request, bad key or rejected payload fails the same way every time
+            if not is_retryable(e):
+                break
+            if attempt <= args.retries:
+                await asyncio.sleep(2 ** attempt)
+
+    record["latency"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+async def run_batch(args, paths):
+    client = Mistral(api_key=args.api_key)
+    settings = EncodingSettings(format=args.format, quality=args.quality, max_edge=args.max_edge)
+    bucket = TokenBucket(rate=args.rate, capacity=max(1.0, args.burst))
+    cache = None if args.no_cache else ResponseCache(args.cache_path, ttl_seconds=args.cache_ttl_hours * 3600)
+    queue = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+
+    counts = {"ok": 0, "error": 0}
+    start = time.perf_counter()
+
+    with open(args.output, "a", encoding="utf-8") as output:
+        async def worker():
+            while True:
+                try:
+                    path = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                record = await process_image(client, args, settings, bucket, cache, path)
+                # one line per image, flushed at once so a crash loses nothing that finished
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                counts[record["status"]] += 1
+
+                finished = counts["ok"] + counts["error"]
+                if finished % args.progress_every == 0 or finished == len(paths):
+                    elapsed = time.perf_counter() - start
+                    print(f"[{finished}/{len(paths)}] ok={counts['ok']} errors={counts['error']} "
+                          f"{finished / elapsed:.2f} images/s")
+
+        # the worker count is the in-flight limit
+        await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+
+    return counts
+
+
+def positive_float(value):
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {value}")
+    return number
+
+
+def positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {value}")
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch image analysis with Mistral vision models")
+    parser.add_argument("inputs", nargs="+", help="Image directories and/or glob patterns")
+    parser.add_argument("--prompt", default="Describe this image.",
+                        help="Prompt template; may use {filename}, {stem} and {path}")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL output and checkpoint file")
+    parser.add_argument("--model", default="mistral-small-latest", help="Mistral model to use")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum requests in flight")
+    parser.add_argument("--rate", type=positive_float, default=5.0, help="Maximum requests per second")
+    parser.add_argument("--burst", type=float, default=5.0, help="Token bucket capacity")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per image on error")
+    parser.add_argument("--format", default="JPEG", choices=["JPEG", "WEBP"], help="Upload format")
+    parser.add_argument("--quality", type=int, default=75, help="Upload quality")
+    parser.add_argument("--max-edge", type=int, default=1536, help="Downscale images to this max edge")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH, help="SQLite response cache file")
+    parser.add_argument("--cache-ttl-hours", type=float, default=168, help="Reuse cached answers up to this age")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the API and do not store answers")
+    parser.add_argument("--progress-every", type=positive_int, default=10, help="Print progress every N images")
+    parser.add_argument("--api-key", default=os.environ.get("MISTRAL_API_KEY"), help="Mistral API key")
+    args = parser.parse_args()
+
+    if not args.api_key:
+        parser.error("No API key provided. Either pass --api-key or set MISTRAL_API_KEY environment variable.")
+
+    paths = collect_images(args.inputs)
+    repair_checkpoint(args.output)
+    done = load_checkpoint(args.output)
+    pending = [path for path in paths if path not in done]
+    print(f"Found {len(paths)} images, {len(done & set(paths))} already done, {len(pending)} to process")
+    if not pending:
+        return
+
+    counts = asyncio.run(run_batch(args, pending))
+    print(f"Finished: {counts['ok']} ok, {counts['error']} errors. Results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
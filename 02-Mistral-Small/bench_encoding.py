@@ -0,0 +1,133 @@
+"""
+Micro-benchmark: streaming data-URI encoder vs. the original one-shot encoders.
+
+Each variant runs in a fresh process so its peak RSS can be measured on its own.
+
+    python bench_encoding.py --size-mb 20 --repeat 5
+"""
+import argparse
+import base64
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from data_uri import encode_buffer_to_data_uri, encode_file_to_data_uri
+
+
+def original_file_encoder(path):
+    """What test_mistral_small.py did: read the file, encode it, then build the URI."""
+    with open(path, "rb") as image_file:
+        base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+    return f"data:image/jpeg;base64,{base64_image}"
+
+
+def original_bytes_encoder(path):
+    """What the chatbot did with in-memory bytes."""
+    with open(path, "rb") as image_file:
+        image_bytes = image_file.read()
+    return f"data:image/jpeg;base64,{base64.b64encode(image_bytes).decode('utf-8')}"
+
+
+def streaming_file_encoder(path):
+    return encode_file_to_data_uri(path, "image/jpeg")
+
+
+def streaming_bytes_encoder(path):
+    with open(path, "rb") as image_file:
+        image_bytes = image_file.read()
+    return encode_buffer_to_data_uri(image_bytes, "image/jpeg")
+
+
+VARIANTS = {
+    "original (file)": original_file_encoder,
+    "streaming mmap (file)": streaming_file_encoder,
+    "original (bytes)": original_bytes_encoder,
+    "streaming (bytes)": streaming_bytes_encoder,
+}
+
+
+def max_rss_bytes():
+    # on Linux VmHWM belongs to this process image, while ru_maxrss survives exec from the parent
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def run_variant(name, path, repeat, results):
+    encoder = VARIANTS[name]
+    # peak RSS of the first call in this fresh process: what one batch worker pays per image
+    baseline = max_rss_bytes()
+    data_uri = encoder(path)
+    rss_growth = max_rss_bytes() - baseline
+    del data_uri
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data_uri = encoder(path)
+        timings.append(time.perf_counter() - start)
+        del data_uri
+
+    # Python heap peak of a single call; mmap pages are not heap allocations
+    tracemalloc.start()
+    data_uri = encoder(path)
+    heap_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del data_uri
+
+    results[name] = (min(timings), sum(timings) / len(timings), rss_growth, heap_peak)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark data-URI encoders")
+    parser.add_argument("--size-mb", type=float, default=20, help="Size of the generated test file")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant")
+    parser.add_argument("--file", help="Benchmark an existing file instead of a generated one")
+    args = parser.parse_args()
+
+    path = args.file
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".jpg")
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(int(args.size_mb * 1024 * 1024)))
+
+    try:
+        # sanity check: every variant must produce the same data URI
+        expected = original_file_encoder(path)
+        for name, encoder in VARIANTS.items():
+            assert encoder(path) == expected, f"{name} produced a different data URI"
+        del expected
+
+        size = os.path.getsize(path)
+        print(f"File: {size / 1024 / 1024:.1f} MB, {args.repeat} runs per variant\n")
+        print(f"{'variant':<24}{'best':>10}{'mean':>10}{'peak RSS growth':>26}{'heap peak':>22}")
+
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Manager() as manager:
+            results = manager.dict()
+            for name in VARIANTS:
+                process = ctx.Process(target=run_variant, args=(name, path, args.repeat, results))
+                process.start()
+                process.join()
+                best, mean, rss_growth, heap_peak = results[name]
+                print(f"{name:<24}{best * 1000:>8.1f}ms{mean * 1000:>8.1f}ms"
+                      f"{rss_growth / 1024 / 1024:>12.1f} MB ({rss_growth / size:.1f}x file)"
+                      f"{heap_peak / 1024 / 1024:>11.1f} MB ({heap_peak / size:.1f}x file)")
+    finally:
+        if args.file is None:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+
+@dataclass
+class StreamStats:
+    """Latency figures for one streamed response."""
+    time_to_first_token: Optional[float] = None
+    total_time: float = 0.0
+    completion_tokens: int = 0
+
+    @property
+    def tokens_per_second(self):
+        # generation speed after the first token arrived
+        generation_time = self.total_time - (self.time_to_first_token or 0.0)
+        return self.completion_tokens / generation_time if generation_time > 0 else 0.0
+
+    def summary(self):
+        ttft = f"{self.time_to_first_token:.2f}s" if self.time_to_first_token is not None else "n/a"
+        return (
+            f"First token {ttft} · {self.completion_tokens} tokens in {self.total_time:.1f}s "
+            f"· {self.tokens_per_second:.1f} tokens/s"
+        )
+
+
+def delta_text(content):
+    """Return the text of a streamed delta, which is either a string or a list of content chunks."""
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return content
+    return "".join(getattr(chunk, "text", "") or "" for chunk in content)
+
+
+def stream_chat(client, model: str, messages: list,
+                on_text: Optional[Callable[[str], None]] = None) -> Tuple[str, StreamStats]:
+    """
+    Stream a chat completion from Mistral.
+
+    Args:
+        client: Mistral client.
+        model: Model name.
+        messages: Chat messages in Mistral format.
+        on_text: Called with the full text received so far after every chunk.
+
+    Returns:
+        The complete response text and its latency stats.
+    """
+    stats = StreamStats()
+    response_text = ""
+    chunks = 0
+    start = time.perf_counter()
+
+    for event in client.chat.stream(model=model, messages=messages):
+        chunk = event.data
+        if chunk.choices:
+            text = delta_text(chunk.choices[0].delta.content)
+            if text:
+                if stats.time_to_first_token is None:
+                    stats.time_to_first_token = time.perf_counter() - start
+                response_text += text
+                chunks += 1
+                if on_text is not None:
+                    on_text(response_text)
+        if getattr(chunk, "usage", None) is not None:
+            stats.completion_tokens = chunk.usage.completion_tokens
+
+    stats.total_time = time.perf_counter() - start
+    # fall back to the chunk count when the API did not report usage
+    if not stats.completion_tokens:
+        stats.completion_tokens = chunks
+    return response_text, stats
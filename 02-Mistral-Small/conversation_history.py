@@ -0,0 +1,170 @@
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+# CJK characters are roughly one token each; other words about four characters per token
+TOKEN_PATTERN = re.compile(
+    r"[぀-ヿ㐀-䶿一-鿿가-힯]"
+    r"|[^\W぀-ヿ㐀-䶿一-鿿가-힯]+"
+    r"|[^\w\s]"
+)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text locally, without calling a tokenizer API."""
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in TOKEN_PATTERN.findall(text or ""))
+
+
+def compact_text(text: str, max_chars: int) -> str:
+    """Shorten a message to its first sentence, capped at `max_chars`."""
+    text = " ".join((text or "").split())
+    sentence = re.split(r"(?<=[.!?。！？])\s", text, maxsplit=1)[0]
+    if len(sentence) > max_chars:
+        sentence = sentence[:max_chars - 1].rstrip() + "…"
+    return sentence
+
+
+@dataclass
+class HistoryInfo:
+    """What was sent for one turn."""
+    verbatim_messages: int = 0
+    summarized_messages: int = 0
+    verbatim_tokens: int = 0
+    summary_tokens: int = 0
+
+    def summary(self):
+        return (
+            f"History: {self.verbatim_messages} recent messages verbatim ({self.verbatim_tokens} tokens), "
+            f"{self.summarized_messages} older ones summarized ({self.summary_tokens} tokens)"
+        )
+
+
+class ConversationHistory:
+    """
+    Token-budgeted view of the chat history sent to Mistral on each turn.
+
+    The most recent messages are replayed verbatim while they fit in the
+    budget. Older messages are compacted, once each, into a rolling summary
+    that also records which images were discussed in which turn. When the
+    summary itself grows past its share of the budget, its oldest lines are
+    dropped.
+    """
+
+    def __init__(self, token_budget: int = 4000, summary_share: float = 0.25):
+        self.token_budget = token_budget
+        self.summary_share = summary_share
+        self._summary_lines: List[str] = []
+        self._image_turns: Dict[str, List[int]] = {}
+        self._summarized_upto = 0
+        self._turn = 0
+
+    def reset(self):
+        self._summary_lines = []
+        self._image_turns = {}
+        self._summarized_upto = 0
+        self._turn = 0
+
+    def build(self, messages: List[dict]) -> Tuple[List[dict], HistoryInfo]:
+        """
+        Build the Mistral messages for the history (all but the current message).
+
+        Args:
+            messages: Chat history as stored in session state (role, content, image_names).
+
+        Returns:
+            Mistral messages (an optional summary system message followed by
+            verbatim turns) and a HistoryInfo describing the window.
+        """
+        if len(messages) < self._summarized_upto:
+            # the conversation was cleared
+            self.reset()
+
+        summary_budget = int(self.token_budget * self.summary_share)
+        verbatim_budget = self.token_budget - summary_budget
+
+        # walk back from the newest message while the verbatim window fits
+        start = len(messages)
+        used = 0
+        while start > self._summarized_upto:
+            cost = estimate_tokens(messages[start - 1]["content"]) + MESSAGE_OVERHEAD_TOKENS
+            if used + cost > verbatim_budget:
+                break
+            used += cost
+            start -= 1
+
+        # the verbatim window must open with a user message
+        while start < len(messages) and messages[start]["role"] != "user":
+            used -= estimate_tokens(messages[start]["content"]) + MESSAGE_OVERHEAD_TOKENS
+            start += 1
+
+        # compact everything that left the window, each message only once
+        for index in range(self._summarized_upto, start):
+            self._summarize(messages[index])
+        self._summarized_upto = max(self._summarized_upto, start)
+
+        summary_text = self._summary_text(summary_budget)
+        mistral_messages = []
+        if summary_text:
+            mistral_messages.append({"role": "system", "content": summary_text})
+        for msg in messages[start:]:
+            mistral_messages.append({
+                "role": "user" if msg["role"] == "user" else "assistant",
+                "content": msg["content"]
+            })
+
+        info = HistoryInfo(
+            verbatim_messages=len(messages) - start,
+            summarized_messages=start,
+            verbatim_tokens=used,
+            summary_tokens=estimate_tokens(summary_text),
+        )
+        return mistral_messages, info
+
+    def _summarize(self, message):
+        if message["role"] == "user":
+            self._turn += 1
+            turn = self._turn
+            images = message.get("image_names") or []
+            for name in images:
+                turns = self._image_turns.setdefault(name, [])
+                if turn not in turns:
+                    turns.append(turn)
+            image_note = f" (images: {', '.join(images)})" if images else ""
+            self._summary_lines.append(f"Turn {turn} user{image_note}: {compact_text(message['content'], 160)}")
+        else:
+            turn = max(1, self._turn)
+            self._summary_lines.append(f"Turn {turn} assistant: {compact_text(message['content'], 200)}")
+
+    def _summary_text(self, budget):
+        if not self._summary_lines:
+            return ""
+
+        header = "Summary of the earlier conversation (older turns are compacted):"
+        image_line = ""
+        if self._image_turns:
+            image_line = "Images discussed: " + "; ".join(
+                f"{name} (turns {', '.join(map(str, turns))})" for name, turns in self._image_turns.items()
+            )
+
+        # drop the oldest summary lines until the summary fits its budget
+        fixed = estimate_tokens(header) + estimate_tokens(image_line)
+        kept = []
+        used = fixed
+        for line in reversed(self._summary_lines):
+            cost = estimate_tokens(line)
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        kept.reverse()
+
+        parts = [header]
+        if image_line:
+            parts.append(image_line)
+        dropped = len(self._summary_lines) - len(kept)
+        if dropped:
+            parts.append(f"({dropped} earlier messages omitted)")
+        parts.extend(kept)
+        return "\n".join(parts)
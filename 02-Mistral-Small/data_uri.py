@@ -0,0 +1,51 @@
+import binascii
+import mimetypes
+import mmap
+import os
+
+# a multiple of 3, so every chunk encodes to whole base64 quanta with no padding in between
+CHUNK_SIZE = 3 * 64 * 1024
+
+
+def encode_buffer_to_data_uri(buffer, mime: str, release=None) -> str:
+    """
+    Base64-encode a bytes-like object into a data URI.
+
+    The URI string is grown chunk by chunk. CPython extends a string in place
+    when nothing else references it, so the full base64 text is never held
+    twice (as bytes and as str) the way `b64encode(...).decode()` does.
+
+    `release(start, length)` is called after each input chunk is encoded, so
+    the caller can drop those source bytes before the rest is encoded.
+    """
+    data_uri = f"data:{mime};base64,"
+    with memoryview(buffer) as view:
+        for start in range(0, len(view), CHUNK_SIZE):
+            with view[start:start + CHUNK_SIZE] as chunk:
+                data_uri += binascii.b2a_base64(chunk, newline=False).decode("ascii")
+                length = len(chunk)
+            if release is not None:
+                release(start, length)
+    return data_uri
+
+
+def encode_file_to_data_uri(path: str, mime: str = None) -> str:
+    """
+    Encode an image file into a data URI without reading it into memory.
+
+    The file is memory-mapped and each encoded chunk's pages are dropped
+    again, so at most one chunk of the file is resident next to the URI.
+    """
+    if mime is None:
+        mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return f"data:{mime};base64,"
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            release = None
+            if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_DONTNEED"):
+                # a read-only file mapping is paged back in from the file if touched again
+                def release(start, length):
+                    mapped.madvise(mmap.MADV_DONTNEED, start, length)
+            return encode_buffer_to_data_uri(mapped, mime, release)
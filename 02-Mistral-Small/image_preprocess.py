@@ -0,0 +1,159 @@
+import os
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Callable, List, Optional, Tuple
+
+from PIL import Image
+
+MIN_QUALITY = 40
+QUALITY_STEP = 10
+MIN_EDGE = 512
+EDGE_STEP = 0.75
+
+
+@dataclass(frozen=True)
+class EncodingSettings:
+    """How attachments are downscaled and compressed before being sent to Mistral."""
+    format: str = "JPEG"
+    quality: int = 75
+    max_edge: int = 1536
+    request_budget_bytes: int = 8 * 1024 * 1024
+
+
+@dataclass
+class PayloadReport:
+    """Bytes saved by preprocessing for one request."""
+    original_bytes: int = 0
+    sent_bytes: int = 0
+    images: int = 0
+    resized: int = 0
+    over_budget: bool = False
+
+    @property
+    def saved_bytes(self):
+        return max(0, self.original_bytes - self.sent_bytes)
+
+    def summary(self):
+        saved_pct = self.saved_bytes / self.original_bytes if self.original_bytes else 0.0
+        text = (
+            f"Sent {format_bytes(self.sent_bytes)} for {self.images} images "
+            f"(saved {format_bytes(self.saved_bytes)}, {saved_pct:.0%}; {self.resized} downscaled)"
+        )
+        if self.over_budget:
+            text += " - still over the request budget"
+        return text
+
+
+def format_bytes(size):
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+def base64_size(size):
+    """Length of the base64 text for `size` raw bytes."""
+    return 4 * ((size + 2) // 3)
+
+
+def needs_preprocessing(path: str, settings: EncodingSettings) -> bool:
+    """
+    Check whether an image file must be re-encoded before sending.
+
+    Only the image header is read. Files already in the target format, within
+    the max edge and within the request budget can be sent as they are.
+    """
+    with Image.open(path) as image:
+        fits = image.format == settings.format and max(image.size) <= settings.max_edge
+    return not fits or base64_size(os.path.getsize(path)) > settings.request_budget_bytes
+
+
+def preprocess_image(data: bytes,
+                     max_edge: int,
+                     format: str = "JPEG",
+                     quality: int = 75,
+                     allow_passthrough: bool = True) -> Tuple[bytes, str, bool]:
+    """
+    Downscale an image to `max_edge` and recompress it.
+
+    Images that are already in the target format and small enough are returned
+    unchanged when `allow_passthrough` is set, which avoids a lossy re-encode.
+
+    Returns:
+        (bytes, mime type, whether the image was downscaled)
+    """
+    image = Image.open(BytesIO(data))
+    mime = f"image/{format.lower()}"
+    needs_resize = max(image.size) > max_edge
+
+    if allow_passthrough and not needs_resize and image.format == format:
+        return data, mime, False
+
+    if needs_resize:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    # JPEG doesn't support alpha channel or palettes
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    buffer = BytesIO()
+    image.save(buffer, format=format, quality=quality)
+    return buffer.getvalue(), mime, needs_resize
+
+
+def fit_to_budget(images: List[bytes],
+                  settings: EncodingSettings,
+                  encode: Optional[Callable[[int, int, int], Tuple[bytes, str, bool]]] = None
+                  ) -> Tuple[List[Tuple[bytes, str]], PayloadReport]:
+    """
+    Preprocess a set of images so that their base64 payload fits the request budget.
+
+    Every image is first encoded with the configured settings. While the total
+    is over budget, the largest image is shrunk further: first by lowering its
+    quality down to MIN_QUALITY, then by reducing its max edge down to MIN_EDGE.
+
+    Args:
+        images: Original image bytes.
+        settings: Target format, quality, max edge and request budget.
+        encode: Optional `encode(index, quality, max_edge)` to reuse cached encodings.
+
+    Returns:
+        The (bytes, mime) pairs to send and a report of the bytes saved.
+    """
+    if encode is None:
+        def encode(index, quality, max_edge):
+            passthrough = quality == settings.quality and max_edge == settings.max_edge
+            return preprocess_image(images[index], max_edge, settings.format, quality, passthrough)
+
+    levels = [(settings.quality, settings.max_edge) for _ in images]
+    results = [encode(i, *levels[i]) for i in range(len(images))]
+
+    def total():
+        return sum(base64_size(len(data)) for data, _, _ in results)
+
+    while total() > settings.request_budget_bytes:
+        shrinkable = [
+            i for i, (quality, max_edge) in enumerate(levels)
+            if quality > MIN_QUALITY or max_edge > MIN_EDGE
+        ]
+        if not shrinkable:
+            break
+
+        i = max(shrinkable, key=lambda idx: len(results[idx][0]))
+        quality, max_edge = levels[i]
+        if quality > MIN_QUALITY:
+            quality = max(MIN_QUALITY, quality - QUALITY_STEP)
+        else:
+            max_edge = max(MIN_EDGE, int(max_edge * EDGE_STEP))
+        levels[i] = (quality, max_edge)
+        results[i] = encode(i, quality, max_edge)
+
+    report = PayloadReport(
+        original_bytes=sum(base64_size(len(data)) for data in images),
+        sent_bytes=total(),
+        images=len(images),
+        resized=sum(1 for _, _, resized in results if resized),
+        over_budget=total() > settings.request_budget_bytes,
+    )
+    return [(data, mime) for data, mime, _ in results], report
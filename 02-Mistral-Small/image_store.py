@@ -0,0 +1,97 @@
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from data_uri import encode_buffer_to_data_uri
+from image_preprocess import EncodingSettings, PayloadReport, fit_to_budget, preprocess_image
+
+
+@dataclass
+class ImageAttachment:
+    """An uploaded image, with its ready-to-send data URI once encoded."""
+    name: str
+    content_hash: str
+    data: bytes
+    data_uri: Optional[str] = None
+    sent: Optional[bytes] = None  # the encoded bytes behind data_uri
+    # encoded variants keyed by (format, quality, max_edge, passthrough)
+    variants: Dict[tuple, Tuple[bytes, str, bool]] = field(default_factory=dict)
+
+    def encode(self, format, quality, max_edge, allow_passthrough):
+        key = (format, quality, max_edge, allow_passthrough)
+        if key not in self.variants:
+            self.variants[key] = preprocess_image(self.data, max_edge, format, quality, allow_passthrough)
+        return self.variants[key]
+
+
+class ImageAttachmentStore:
+    """
+    Keeps uploaded images keyed by content hash and encodes each one only once.
+
+    Images are downscaled and recompressed to fit the request budget; the
+    resulting data URIs are cached and reused on every chat turn, and are
+    rebuilt only when the encoding settings or the set of images change.
+    """
+
+    def __init__(self):
+        self._attachments: Dict[str, ImageAttachment] = {}
+        self._encoded_key = None
+        self._report = PayloadReport()
+
+    @property
+    def attachments(self) -> List[ImageAttachment]:
+        return list(self._attachments.values())
+
+    @property
+    def names(self) -> List[str]:
+        return [a.name for a in self._attachments.values()]
+
+    def __len__(self):
+        return len(self._attachments)
+
+    def sync(self, files):
+        """
+        Make the store match the current uploader contents.
+
+        `files` is a list of (name, bytes). Images that are already stored keep
+        their encoded data URI; removed images are dropped.
+        """
+        current = {}
+        for name, data in files:
+            content_hash = hashlib.sha256(data).hexdigest()
+            attachment = self._attachments.get(content_hash)
+            if attachment is None:
+                attachment = ImageAttachment(name=name, content_hash=content_hash, data=data)
+            current[content_hash] = attachment
+        self._attachments = current
+
+    def clear(self):
+        self._attachments = {}
+        self._encoded_key = None
+
+    def data_uris(self, settings: EncodingSettings) -> Tuple[List[str], PayloadReport]:
+        """
+        Return the data URI of every attachment and the payload report.
+
+        Encoding only runs for new images or when the settings change.
+        """
+        key = (settings, tuple(self._attachments))
+        attachments = self.attachments
+
+        if key != self._encoded_key:
+            def encode(index, quality, max_edge):
+                passthrough = quality == settings.quality and max_edge == settings.max_edge
+                return attachments[index].encode(settings.format, quality, max_edge, passthrough)
+
+            encoded, self._report = fit_to_budget([a.data for a in attachments], settings, encode)
+            for attachment, (data, mime) in zip(attachments, encoded):
+                if attachment.sent is not data:
+                    attachment.data_uri = encode_buffer_to_data_uri(data, mime)
+                    attachment.sent = data
+                # keep only the variant that is actually sent
+                attachment.variants = {
+                    k: v for k, v in attachment.variants.items() if v[0] is data
+                }
+            self._encoded_key = key
+
+        return [a.data_uri for a in attachments], self._report
@@ -1,9 +1,11 @@
 import streamlit as st
-import base64
 import os
 from mistralai import Mistral
-from io import BytesIO
-from PIL import Image
+from image_preprocess import EncodingSettings
+from image_store import ImageAttachmentStore
+from chat_stream import stream_chat
+from conversation_history import ConversationHistory
+from response_cache import ResponseCache, usage_dict
 
 # Page config
 st.set_page_config(
@@ -26,9 +28,18 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_response_cache():
+    """Response cache shared by all sessions, persisted in SQLite."""
+    return ResponseCache()
+
 st.title("🤖 Mistral Image Chatbot")
 st.markdown("Upload an image and chat with Mistral AI about it")
 
+# The image store is used by the sidebar, so it is initialized first
+if "image_store" not in st.session_state:
+    st.session_state.image_store = ImageAttachmentStore()  # Uploaded images, encoded once
+
 # Sidebar for configuration and image upload
 with st.sidebar:
     st.title("🔑 API Configuration")
@@ -39,57 +50,79 @@ with st.sidebar:
         index=0
     )
     
+    stream_responses = st.toggle("Stream responses", value=True)
+    history_token_budget = st.number_input(
+        "History token budget",
+        min_value=500,
+        max_value=32000,
+        value=4000,
+        step=500,
+        help="Older turns beyond this budget are compacted into a summary"
+    )
+    use_response_cache = st.toggle(
+        "Reuse cached answers",
+        value=True,
+        help="Identical questions about the same images are answered from the local cache"
+    )
+    
     if api_key:
         os.environ["MISTRAL_API_KEY"] = api_key
         st.success("API key configured!")
     
     st.markdown("---")
     
+    # Image encoding settings (changing them re-encodes the attachments once)
+    st.subheader("🗜️ Image Encoding")
+    image_format = st.selectbox("Format", ["JPEG", "WEBP"], index=0)
+    image_quality = st.slider("Quality", min_value=40, max_value=95, value=75, step=5)
+    max_edge = st.select_slider("Max edge (px)", options=[512, 768, 1024, 1536, 2048], value=1536)
+    request_budget_mb = st.number_input("Request image budget (MB)", min_value=0.5, max_value=50.0, value=8.0, step=0.5)
+    encoding_settings = EncodingSettings(
+        format=image_format,
+        quality=image_quality,
+        max_edge=max_edge,
+        request_budget_bytes=int(request_budget_mb * 1024 * 1024)
+    )
+    
+    st.markdown("---")
+    
     # Image uploader (moved to sidebar)
     st.subheader("📷 Upload Images")
     uploaded_files = st.file_uploader("Upload images to analyze", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
     
     # Clear images button
     if st.button("Clear All Images"):
-        st.session_state.uploaded_images = []
-        st.session_state.image_names = []
+        st.session_state.image_store.clear()
         st.rerun()
     
     # Process uploaded files
     if uploaded_files:
-        # Clear previous images if new ones are uploaded
-        if len(uploaded_files) != len(st.session_state.uploaded_images):
-            st.session_state.uploaded_images = []
-            st.session_state.image_names = []
-            
-            for uploaded_file in uploaded_files:
-                # Display the uploaded image
-                image = Image.open(uploaded_file)
-                
-                # Convert the image to bytes for base64 encoding
-                img_byte_arr = BytesIO()
-                
-                # Convert RGBA to RGB if needed (JPEG doesn't support alpha channel)
-                if image.mode == 'RGBA':
-                    image = image.convert('RGB')
-                    
-                image.save(img_byte_arr, format=image.format if image.format else "JPEG")
-                img_bytes = img_byte_arr.getvalue()
-                
-                # Add to session state
-                st.session_state.uploaded_images.append(image)
-                st.session_state.image_names.append(uploaded_file.name)
+        # Keep already encoded images, add new ones and drop removed ones (matched by content hash)
+        st.session_state.image_store.sync([(f.name, f.getvalue()) for f in uploaded_files])
+        
+        # Encode new uploads now so chat turns only reuse the cached data URIs
+        st.session_state.image_store.data_uris(encoding_settings)
         
         # Display number of uploaded images
-        st.success(f"{len(st.session_state.uploaded_images)} images uploaded")
+        st.success(f"{len(st.session_state.image_store)} images uploaded")
         
         # Display thumbnails of uploaded images
-        if st.session_state.uploaded_images:
-            for i, img in enumerate(st.session_state.uploaded_images):
-                st.image(img, caption=st.session_state.image_names[i], width=150)
+        for attachment in st.session_state.image_store.attachments:
+            st.image(attachment.data, caption=attachment.name, width=150)
     
     st.markdown("---")
     
+    # Response cache stats
+    with st.expander("💾 Response Cache"):
+        cache_stats = get_response_cache().stats()
+        st.caption(
+            f"{cache_stats['entries']} answers stored ({cache_stats['bytes'] / 1024:.1f} KB) · "
+            f"{cache_stats['hits']} hits / {cache_stats['misses']} misses"
+        )
+        if st.button("Clear Response Cache"):
+            get_response_cache().clear()
+            st.rerun()
+    
     # About this app (moved to sidebar)
     with st.expander("ℹ️ About this app"):
         st.markdown("""
@@ -108,20 +141,8 @@ with st.sidebar:
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-if "uploaded_images" not in st.session_state:
-    st.session_state.uploaded_images = []  # List to store multiple images
-
-if "image_names" not in st.session_state:
-    st.session_state.image_names = []  # List to store image names
-
-# Function to encode image to base64
-def encode_image(image_bytes):
-    """Encode the image bytes to base64."""
-    try:
-        return base64.b64encode(image_bytes).decode('utf-8')
-    except Exception as e:
-        st.error(f"Error encoding image: {e}")
-        return None
+if "history" not in st.session_state:
+    st.session_state.history = ConversationHistory()  # Token-budgeted history window
 
 # Display chat messages
 for message in st.session_state.messages:
@@ -130,9 +151,13 @@ for message in st.session_state.messages:
             # Display text and image filenames for user messages with images
             image_list = ", ".join(message['image_names'])
             st.markdown(f"{message['content']} [Images: {image_list}]")
+            if "payload_report" in message:
+                st.caption(message["payload_report"])
         else:
             # Display text only for other messages
             st.markdown(message["content"])
+            if "metrics" in message:
+                st.caption(message["metrics"])
 
 # Main chat area
 
@@ -142,53 +167,38 @@ if prompt := st.chat_input("Ask something about the image..."):
     if not api_key:
         st.error("Please enter your Mistral API key in the sidebar first!")
     # Check if images are uploaded
-    elif not st.session_state.uploaded_images:
+    elif not len(st.session_state.image_store):
         st.error("Please upload at least one image first!")
     else:
-        # Encode all uploaded images
-        base64_images = []
-        for img in st.session_state.uploaded_images:
-            img_byte_arr = BytesIO()
-            
-            # Convert RGBA to RGB if needed (JPEG doesn't support alpha channel)
-            img_to_save = img
-            if img_to_save.mode == 'RGBA':
-                img_to_save = img_to_save.convert('RGB')
-                
-            img_to_save.save(img_byte_arr, format="JPEG")
-            img_bytes = img_byte_arr.getvalue()
-            base64_images.append(encode_image(img_bytes))
+        # Reuse the cached data URIs (only re-encoded if the settings changed)
+        image_data_uris, payload_report = st.session_state.image_store.data_uris(encoding_settings)
+        image_names = st.session_state.image_store.names
         
         # Add user message to chat history
         st.session_state.messages.append({
             "role": "user", 
             "content": prompt,
-            "image_names": st.session_state.image_names  # Store image filenames
+            "image_names": image_names,  # Store image filenames
+            "payload_report": payload_report.summary()
         })
         
         # Display user message
         with st.chat_message("user"):
-            image_list = ", ".join(st.session_state.image_names)
+            image_list = ", ".join(image_names)
             st.markdown(f"{prompt} [Images: {image_list}]")
+            st.caption(payload_report.summary())
         
         # Initialize Mistral client
         client = Mistral(api_key=api_key)
         
         # Prepare the message for Mistral API
-        mistral_messages = []
-        
-        # Add previous conversation context (text only)
-        for msg in st.session_state.messages[:-1]:  # Exclude the last message which we'll handle specially
-            if msg["role"] == "user":
-                mistral_messages.append({
-                    "role": "user",
-                    "content": msg["content"]
-                })
-            else:
-                mistral_messages.append({
-                    "role": "assistant",
-                    "content": msg["content"]
-                })
+        # Add previous conversation context (text only): recent turns verbatim, older ones summarized
+        st.session_state.history.token_budget = history_token_budget
+        mistral_messages, history_info = st.session_state.history.build(
+            st.session_state.messages[:-1]  # Exclude the last message which we'll handle specially
+        )
+        if history_info.summarized_messages:
+            st.caption(history_info.summary())
         
         # Add the current message with multiple images
         content_list = [
@@ -199,10 +209,10 @@ if prompt := st.chat_input("Ask something about the image..."):
         ]
         
         # Add all images to the content list
-        for base64_img in base64_images:
+        for data_uri in image_data_uris:
             content_list.append({
                 "type": "image_url",
-                "image_url": f"data:image/jpeg;base64,{base64_img}"
+                "image_url": data_uri
             })
         
         mistral_messages.append({
@@ -210,31 +220,64 @@ if prompt := st.chat_input("Ask something about the image..."):
             "content": content_list
         })
         
-        # Display a spinner while waiting for the response
+        response_cache = get_response_cache()
+        image_hashes = [attachment.content_hash for attachment in st.session_state.image_store.attachments]
+        cache_key = response_cache.make_key(model_option, mistral_messages, image_hashes) if use_response_cache else None
+        cached = response_cache.get(cache_key) if cache_key else None
+        
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    # Get response from Mistral
-                    chat_response = client.chat.complete(
-                        model=model_option,
-                        messages=mistral_messages
+            try:
+                if cached is not None:
+                    # Same model, question, history and images as before: no API call
+                    response_content = cached.content
+                    response_metrics = f"Cached answer from {cached.age / 60:.0f} min ago"
+                    st.markdown(response_content)
+                    st.caption(response_metrics)
+                elif stream_responses:
+                    # Render tokens into the bubble as they arrive
+                    response_placeholder = st.empty()
+                    response_content, stream_stats = stream_chat(
+                        client,
+                        model_option,
+                        mistral_messages,
+                        on_text=lambda text: response_placeholder.markdown(text + "▌")
                     )
+                    response_placeholder.markdown(response_content)
+                    response_metrics = stream_stats.summary()
+                    st.caption(response_metrics)
+                    if use_response_cache:
+                        response_cache.set(cache_key, model_option, response_content)
+                else:
+                    # Display a spinner while waiting for the response
+                    with st.spinner("Thinking..."):
+                        # Get response from Mistral
+                        chat_response = client.chat.complete(
+                            model=model_option,
+                            messages=mistral_messages
+                        )
                     
                     # Extract the response content
                     response_content = chat_response.choices[0].message.content
+                    response_metrics = None
+                    if use_response_cache:
+                        response_cache.set(cache_key, model_option, response_content, usage_dict(chat_response))
                     
                     # Display the response
                     st.markdown(response_content)
-                    
-                    # Add assistant response to chat history
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": response_content
-                    })
-                except Exception as e:
-                    st.error(f"Error getting response from Mistral: {str(e)}")
+                
+                # Add assistant response to chat history
+                assistant_message = {
+                    "role": "assistant",
+                    "content": response_content
+                }
+                if response_metrics:
+                    assistant_message["metrics"] = response_metrics
+                st.session_state.messages.append(assistant_message)
+            except Exception as e:
+                st.error(f"Error getting response from Mistral: {str(e)}")
 
 # Add a button to clear the conversation
 if st.button("Clear Conversation"):
     st.session_state.messages = []
+    st.session_state.history.reset()
     st.rerun()
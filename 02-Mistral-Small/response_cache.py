@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "mistral_response_cache.sqlite3")
+
+
+def file_content_hash(path: str) -> str:
+    """SHA-256 of an image file, the same hash ImageAttachmentStore gives an upload of it."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_messages(messages: List[dict]) -> list:
+    """
+    Reduce a Mistral message list to the parts that decide the answer.
+
+    Text is whitespace-collapsed and images are reduced to a placeholder; the
+    key identifies them by their content hashes instead, so it neither carries
+    nor re-hashes megabytes of base64.
+    """
+    normalized = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            parts = [{"type": "text", "text": " ".join(content.split())}]
+        else:
+            parts = []
+            for part in content or []:
+                if part.get("type") == "image_url":
+                    parts.append({"type": "image"})
+                else:
+                    parts.append({"type": part.get("type"), "text": " ".join((part.get("text") or "").split())})
+        normalized.append({"role": message.get("role"), "content": parts})
+    return normalized
+
+
+@dataclass
+class CachedResponse:
+    """A stored completion."""
+    content: str
+    usage: Optional[dict] = None
+    created_at: float = 0.0
+
+    @property
+    def age(self):
+        return time.time() - self.created_at
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of Mistral chat completions.
+
+    Entries are keyed by the model and the normalized messages (including the
+    content hashes of the attached images). They expire after `ttl_seconds`, and
+    the least recently used ones are evicted once the cache holds more than
+    `max_entries` responses or `max_bytes` of response text.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: float = 7 * 24 * 3600,
+                 max_entries: int = 1000, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # shared between Streamlit script threads and batch worker threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " model TEXT NOT NULL,"
+                " content TEXT NOT NULL,"
+                " usage TEXT,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    @staticmethod
+    def make_key(model: str, messages: List[dict], image_hashes: Sequence[str]) -> str:
+        """
+        Key of a request.
+
+        `image_hashes` are the content hashes of the original images, in the
+        order their image parts appear in `messages`.
+        """
+        normalized = normalize_messages(messages)
+        image_parts = sum(1 for m in normalized for part in m["content"] if part["type"] == "image")
+        if image_parts != len(image_hashes):
+            raise ValueError(f"{image_parts} images in the messages but {len(image_hashes)} image hashes")
+        payload = json.dumps({"model": model, "messages": normalized, "images": list(image_hashes)},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, usage, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[2] > self.ttl_seconds:
+                if row is not None:
+                    with self._conn:
+                        self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return CachedResponse(content=row[0], usage=json.loads(row[1]) if row[1] else None, created_at=row[2])
+
+    def set(self, key: str, model: str, content: str, usage: Optional[dict] = None):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, usage, size, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, content, json.dumps(usage) if usage else None,
+                 len(content.encode("utf-8")), now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        # drop least recently used entries until both limits hold
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+        self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": count, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self._conn.close()
+
+
+def usage_dict(response) -> Optional[dict]:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+
+
+def cached_complete(client, model: str, messages: List[dict], image_hashes: Sequence[str],
+                    cache: Optional[ResponseCache] = None,
+                    use_cache: bool = True) -> Tuple[str, Optional[dict], bool]:
+    """
+    Call `client.chat.complete` through the response cache.
+
+    Args:
+        client: Mistral client.
+        model: Model name.
+        messages: Chat messages in Mistral format.
+        image_hashes: Content hashes of the attached images, in message order.
+        cache: Response cache; None disables caching.
+        use_cache: Per-request opt-out. When False the API is always called and
+            the cache is neither read nor written.
+
+    Returns:
+        The response text, its token usage (if known) and whether it came from the cache.
+    """
+    if cache is None or not use_cache:
+        response = client.chat.complete(model=model, messages=messages)
+        return response.choices[0].message.content, usage_dict(response), False
+
+    key = cache.make_key(model, messages, image_hashes)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached.content, cached.usage, True
+
+    response = client.chat.complete(model=model, messages=messages)
+    content = response.choices[0].message.content
+    usage = usage_dict(response)
+    cache.set(key, model, content, usage)
+    return content, usage, False
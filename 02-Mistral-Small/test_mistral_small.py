@@ -1,13 +1,23 @@
-import base64
 import requests
 import os
 from mistralai import Mistral
+from data_uri import encode_buffer_to_data_uri, encode_file_to_data_uri
+from image_preprocess import EncodingSettings, fit_to_budget, needs_preprocessing
+from response_cache import ResponseCache, cached_complete, file_content_hash
+
+# Downscale/compress settings applied before sending the image
+encoding_settings = EncodingSettings(format="JPEG", quality=75, max_edge=1536)
 
 def encode_image(image_path):
-    """Encode the image to base64."""
+    """Encode the image to a base64 data URI, downscaling it first only if it exceeds the limits."""
     try:
+        if not needs_preprocessing(image_path, encoding_settings):
+            # Stream the file into the data URI without loading it into memory
+            return encode_file_to_data_uri(image_path, f"image/{encoding_settings.format.lower()}")
         with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+            [(image_bytes, mime)], report = fit_to_budget([image_file.read()], encoding_settings)
+        print(report.summary())
+        return encode_buffer_to_data_uri(image_bytes, mime)
     except FileNotFoundError:
         print(f"Error: The file {image_path} was not found.")
         return None
@@ -18,8 +28,8 @@ def encode_image(image_path):
 # Path to your image
 image_path = "test01.jpg"
 
-# Getting the base64 string
-base64_image = encode_image(image_path)
+# Getting the base64 data URI
+image_data_uri = encode_image(image_path)
 
 # Retrieve the API key from environment variables
 api_key = os.environ["MISTRAL_API_KEY"]
@@ -41,17 +51,27 @@ messages = [
             },
             {
                 "type": "image_url",
-                "image_url": f"data:image/jpeg;base64,{base64_image}" 
+                "image_url": image_data_uri
             }
         ]
     }
 ]
 
+# Reruns of the same image and question are answered from the local cache;
+# set MISTRAL_NO_CACHE=1 to always call the API
+use_cache = not os.environ.get("MISTRAL_NO_CACHE")
+
 # Get the chat response
-chat_response = client.chat.complete(
-    model=model,
-    messages=messages
+response_content, usage, from_cache = cached_complete(
+    client,
+    model,
+    messages,
+    [file_content_hash(image_path)],
+    cache=ResponseCache(),
+    use_cache=use_cache
 )
 
 # Print the content of the response
-print(chat_response.choices[0].message.content)
\ No newline at end of file
+print(response_content)
+if from_cache:
+    print("(cached response)")
\ No newline at end of file
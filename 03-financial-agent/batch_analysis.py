@@ -0,0 +1,145 @@
+"""
+Helpers for analyzing a whole watchlist in one process.
+
+Screening many coins mostly repeats the same work: the market-wide context
+is identical for every coin, and watchlists often name the same asset twice
+(e.g. "BTC" and "bitcoin"). These helpers dedupe the assets, split the
+questions into market-wide and per-coin ones, and collect the per-asset
+decisions into one JSON and Markdown report.
+"""
+
+import json
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+from text_normalize import TICKER_ALIASES
+
+MARKET_QUESTIONS = [
+    "What is the overall cryptocurrency market sentiment and trend right now?",
+    "What macroeconomic and regulatory developments are currently affecting the cryptocurrency market?",
+]
+
+# per-coin questions; the market-wide ones above are asked once for the whole watchlist
+ASSET_QUESTIONS = [
+    "What is the latest news and market sentiment specific to {crypto}?",
+    "What are the current price trend, trading volume and key technical levels of {crypto}?",
+]
+
+DECISION_PATTERN = re.compile(r"decision\W{0,5}(buy|sell|hold)", re.IGNORECASE)
+
+
+def canonical_asset(name: str) -> str:
+    """
+    Normalize a coin name so aliases of the same asset compare equal.
+
+    Args:
+        name (str): Coin name or ticker as typed by the user.
+
+    Returns:
+        str: Lowercase canonical name.
+    """
+    key = " ".join(name.lower().split())
+    return TICKER_ALIASES.get(key, key)
+
+
+def dedupe_assets(names: List[str]) -> List[str]:
+    """
+    Drop repeated assets, keeping the first spelling of each.
+
+    Args:
+        names (List[str]): Coin names or tickers.
+
+    Returns:
+        List[str]: One entry per distinct asset, in input order.
+    """
+    seen = set()
+    assets = []
+    for name in names:
+        name = name.strip()
+        if name and canonical_asset(name) not in seen:
+            seen.add(canonical_asset(name))
+            assets.append(name)
+    return assets
+
+
+def load_watchlist(path: str) -> List[str]:
+    """
+    Read a watchlist file: one coin per line (or comma separated), `#` starts a comment.
+
+    Args:
+        path (str): Path to the watchlist file.
+
+    Returns:
+        List[str]: The coin names in file order.
+    """
+    names = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0]
+            names.extend(part.strip() for part in line.split(","))
+    return [name for name in names if name]
+
+
+def parse_decision(text: str) -> str:
+    """
+    Pull the BUY/SELL/HOLD call out of the analyst's answer.
+
+    Args:
+        text (str): The analyst response.
+
+    Returns:
+        str: "BUY", "SELL", "HOLD" or "UNKNOWN".
+    """
+    match = DECISION_PATTERN.search(text or "")
+    return match.group(1).upper() if match else "UNKNOWN"
+
+
+@dataclass
+class AssetReport:
+    """The outcome of one asset's analysis."""
+    crypto: str
+    decision: str = "UNKNOWN"
+    analysis: str = ""
+    error: Optional[str] = None
+    seconds: float = 0.0
+    stages: Dict[str, float] = field(default_factory=dict)
+
+
+def write_reports(reports: List[AssetReport], market_context: str, path_prefix: str, stats: dict) -> List[str]:
+    """
+    Write the consolidated watchlist report as JSON and Markdown.
+
+    Args:
+        reports (List[AssetReport]): One report per asset, in watchlist order.
+        market_context (str): The shared market-wide research.
+        path_prefix (str): Output path without extension.
+        stats (dict): Run statistics (wall time, tool calls, cache hits, ...).
+
+    Returns:
+        List[str]: The written file paths.
+    """
+    json_path = f"{path_prefix}.json"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "stats": stats,
+            "market_context": market_context,
+            "assets": [asdict(report) for report in reports],
+        }, f, ensure_ascii=False, indent=2)
+
+    lines = ["# Watchlist Report\n", "| Asset | Decision | Seconds |", "| --- | --- | ---: |"]
+    for report in reports:
+        decision = "ERROR" if report.error else report.decision
+        lines.append(f"| {report.crypto} | {decision} | {report.seconds:.1f} |")
+    lines.append("")
+    lines.append(", ".join(f"{key}: {value}" for key, value in stats.items()))
+    lines.append("\n## Market Context\n")
+    lines.append(market_context)
+    for report in reports:
+        lines.append(f"\n## {report.crypto}\n")
+        lines.append(f"Error: {report.error}" if report.error else report.analysis)
+
+    md_path = f"{path_prefix}.md"
+    with open(md_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return [json_path, md_path]
@@ -0,0 +1,167 @@
+"""
+Load test: plain OpenAI calls vs. PerplexityClient against a local mock API.
+
+A threaded HTTP server on localhost plays the Perplexity chat completions
+endpoint. It answers after a fixed delay, with citations, and fails a share
+of requests with 429 (with Retry-After) or 503. Worker threads then fire
+queries drawn from a small pool, so identical queries overlap the way team
+members' lookups do. No Perplexity credits are used.
+
+    python bench_perplexity.py --requests 200 --workers 16 --distinct 20 --error-rate 0.2
+"""
+
+import argparse
+import json
+import logging
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from openai import OpenAI
+
+from perplexity_client import PerplexityClient, RetryPolicy
+
+MODEL = "sonar-pro"
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, delay, error_rate, seed):
+        super().__init__(address, MockHandler)
+        self.delay = delay
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.active = 0
+        self.peak = 0
+
+    def reset(self):
+        with self.lock:
+            self.requests = self.errors = self.peak = 0
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        with server.lock:
+            server.requests += 1
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            roll = server.random.random()
+        try:
+            time.sleep(server.delay)
+            if roll < server.error_rate:
+                with server.lock:
+                    server.errors += 1
+                if roll < server.error_rate / 2:
+                    self.reply(429, {"error": {"message": "rate limited"}}, {"Retry-After": "0.05"})
+                else:
+                    self.reply(503, {"error": {"message": "overloaded"}})
+                return
+            question = body["messages"][-1]["content"]
+            self.reply(200, {
+                "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": f"Answer to: {question}"}}],
+                "usage": {"prompt_tokens": 20, "completion_tokens": 10, "total_tokens": 30},
+                "citations": [f"https://example.com/{abs(hash(question)) % 1000}"],
+            })
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def reply(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_load(call, queries, workers):
+    """Send every query from `workers` threads; return wall time, latencies and failures."""
+    latencies = []
+    failures = 0
+    lock = threading.Lock()
+
+    def one(query):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            call([{"role": "user", "content": query}])
+            ok = True
+        except Exception:
+            ok = False
+        with lock:
+            latencies.append(time.perf_counter() - start)
+            failures += 0 if ok else 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, queries))
+    return time.perf_counter() - start, latencies, failures
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Perplexity client against a local mock API")
+    parser.add_argument("--requests", type=int, default=200, help="Queries to send per variant")
+    parser.add_argument("--workers", type=int, default=16, help="Concurrent callers")
+    parser.add_argument("--distinct", type=int, default=20, help="Distinct queries in the pool")
+    parser.add_argument("--delay", type=float, default=0.2, help="Mock response time in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="Share of requests answered with 429/503")
+    parser.add_argument("--seed", type=int, default=7, help="Seed for the query mix and injected errors")
+    args = parser.parse_args()
+    logging.getLogger("agno").setLevel(logging.WARNING)  # one retry log line per injected error otherwise
+
+    server = MockServer(("127.0.0.1", 0), args.delay, args.error_rate, args.seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    rng = random.Random(args.seed)
+    queries = [f"What moved the price of coin {rng.randrange(args.distinct)} today?" for _ in range(args.requests)]
+    print(f"{args.requests} queries ({args.distinct} distinct) from {args.workers} workers, "
+          f"{args.delay * 1000:.0f} ms per response, {args.error_rate:.0%} injected 429/503\n")
+
+    # what the toolkit used to do: one call per query with the SDK's default retries
+    plain = OpenAI(api_key="mock", base_url=base_url, http_client=httpx.Client())
+    plain_result = run_load(lambda m: plain.chat.completions.create(model=MODEL, messages=m), queries, args.workers)
+    plain_upstream = server.requests
+
+    server.reset()
+    client = PerplexityClient(api_key="mock", base_url=base_url, timeout=10.0,
+                              retry=RetryPolicy(base_delay=0.05, max_delay=1.0))
+    pooled_result = run_load(lambda m: client.create(model=MODEL, messages=m), queries, args.workers)
+
+    print(f"{'variant':<20}{'wall':>9}{'upstream':>10}{'failed':>8}{'p50':>9}{'p95':>9}")
+    for name, (wall, latencies, failures), upstream in (
+        ("plain OpenAI", plain_result, plain_upstream),
+        ("PerplexityClient", pooled_result, server.requests),
+    ):
+        print(f"{name:<20}{wall:>8.2f}s{upstream:>10}{failures:>8}"
+              f"{percentile(latencies, 50):>8.2f}s{percentile(latencies, 95):>8.2f}s")
+    print(f"\nPerplexityClient stats: {client.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Benchmark: the whole analysis pipeline, replayed offline from recorded fixtures.
+
+Record the fixtures once against the live APIs (this costs API credits):
+
+    python bench_pipeline.py --record --google-api-key <KEY> --firecrawl-api-key <KEY> --perplexity-api-key <KEY>
+
+Then replay as often as needed, with no network access and no API spend:
+
+    python bench_pipeline.py --repeat 3 --latency-scale 1.0
+    python bench_pipeline.py --latency-scale 0      # pure local overhead
+    python bench_pipeline.py --latency firecrawl=5  # what if deep research took 5 s?
+
+A call that no recording matches fails with `ReplayMissError` and is counted
+under "misses"; re-record the fixtures after changing prompts or tools.
+
+Each scenario (one asset in coordinate mode, one asset in parallel mode, a
+multi-asset watchlist) runs in a fresh process with empty caches. The report
+shows the wall time, the time per stage and per tool, and the peak memory.
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from replay import RECORD, REPLAY, Cassette
+
+SCENARIOS = ["single-coordinate", "single-parallel", "watchlist"]
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def max_rss_bytes():
+    # on Linux VmHWM belongs to this process image, while ru_maxrss survives exec from the parent
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def fixture_path(fixtures, scenario):
+    return os.path.join(fixtures, f"{scenario}.json")
+
+
+def run_scenario(scenario, options, results):
+    """Run one scenario in this (fresh) process and store its measurements in `results`."""
+    import client_registry
+    from crypto_financial_agent import analyze_cryptocurrency, analyze_watchlist
+    from research_cache import ResearchCache
+    from semantic_cache import SemanticCache
+    from site_index import SiteIndex
+
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    cassette = Cassette(fixture_path(options["fixtures"], scenario), options["mode"],
+                        latency_scale=options["latency_scale"], latency=options["latency"],
+                        order_fallback=options["order_fallback"])
+    client_registry.use_cassette(cassette)
+    # cold, private caches, so replay makes the same calls the recording did
+    client_registry.get_or_create(("research-cache",),
+                                  lambda: ResearchCache(cache_dir=os.path.join(workdir, "research")))
+    client_registry.get_or_create(("semantic-cache",),
+                                  lambda: SemanticCache(path=os.path.join(workdir, "semantic.sqlite3")))
+    client_registry.get_or_create(("site-index",),
+                                  lambda: SiteIndex(path=os.path.join(workdir, "site_index.sqlite3")))
+    keys = options["keys"]
+
+    if options["trace_memory"]:
+        tracemalloc.start()
+    output = io.StringIO()
+    error = None
+    stages = {}
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if options["verbose"] else output):
+            if scenario == "watchlist":
+                reports = analyze_watchlist(options["cryptos"], *keys, concurrency=options["concurrency"],
+                                            report_prefix=os.path.join(workdir, "report"))
+                # mean per asset, since the assets overlap in time
+                for report in reports:
+                    for name, seconds in report.stages.items():
+                        stages[name] = stages.get(name, 0.0) + seconds / len(reports)
+                error = "; ".join(r.error for r in reports if r.error) or None
+            else:
+                mode = scenario.split("-", 1)[1]
+                timer = analyze_cryptocurrency(options["crypto"], *keys, mode=mode)
+                stages = dict(timer.stages)
+    except Exception as e:
+        error = f"{e.__class__.__name__}: {e}"
+    wall = time.perf_counter() - start
+    heap_peak = None
+    if options["trace_memory"]:
+        heap_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    tools = {}
+    for call in client_registry.get_tool_metrics().calls:
+        tools[call.name] = tools.get(call.name, 0.0) + call.duration
+    cassette.save()
+    shutil.rmtree(workdir, ignore_errors=True)
+    results[scenario] = {
+        "wall": wall,
+        "stages": stages,
+        "tools": tools,
+        "rss": max_rss_bytes(),
+        "heap_peak": heap_peak,
+        "replay_misses": cassette.misses,
+        "calls": len(cassette.interactions),
+        "error": error,
+    }
+
+
+def parse_latency(values):
+    latency = {}
+    for value in values or []:
+        service, _, seconds = value.partition("=")
+        latency[service] = float(seconds)
+    return latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline against recorded fixtures")
+    parser.add_argument("--record", action="store_true", help="Call the live APIs and (re)write the fixtures")
+    parser.add_argument("--google-api-key", default="replay", help="Google Gemini API Key (record only)")
+    parser.add_argument("--firecrawl-api-key", default="replay", help="FireCrawl API Key (record only)")
+    parser.add_argument("--perplexity-api-key", default="replay", help="Perplexity API Key (record only)")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="Directory of the fixture files")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS, help="Scenarios to run")
+    parser.add_argument("--crypto", default="bitcoin", help="Asset of the single-asset scenarios")
+    parser.add_argument("--cryptos", nargs="+", default=["bitcoin", "ethereum", "solana"],
+                        help="Assets of the watchlist scenario")
+    parser.add_argument("--concurrency", type=int, default=3, help="Assets analyzed at the same time in the watchlist")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Replay delay as a multiple of the recorded latency (0 = instant)")
+    parser.add_argument("--latency", action="append", metavar="SERVICE=SECONDS",
+                        help="Fixed replay delay for gemini, firecrawl or perplexity; repeatable")
+    parser.add_argument("--order-fallback", action="store_true",
+                        help="Answer calls missing from the fixtures with the next recording of the same method "
+                             "(not deterministic; timings are not comparable)")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay runs per scenario")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also measure the Python heap peak with tracemalloc (slows the run down)")
+    parser.add_argument("--verbose", action="store_true", help="Show the agents' output")
+    args = parser.parse_args()
+
+    if args.record and "replay" in (args.google_api_key, args.firecrawl_api_key, args.perplexity_api_key):
+        parser.error("--record needs --google-api-key, --firecrawl-api-key and --perplexity-api-key")
+    options = {
+        "mode": RECORD if args.record else REPLAY,
+        "fixtures": args.fixtures,
+        "keys": (args.google_api_key, args.firecrawl_api_key, args.perplexity_api_key),
+        "crypto": args.crypto,
+        "cryptos": args.cryptos,
+        "concurrency": args.concurrency,
+        "latency_scale": args.latency_scale,
+        "latency": parse_latency(args.latency),
+        "order_fallback": args.order_fallback,
+        "trace_memory": args.trace_memory,
+        "verbose": args.verbose,
+    }
+    repeat = 1 if args.record else max(1, args.repeat)
+    if not args.record:
+        missing = [s for s in args.scenarios if not os.path.exists(fixture_path(args.fixtures, s))]
+        if missing:
+            parser.error(f"no fixtures for {', '.join(missing)} in {args.fixtures}; record them with --record")
+
+    print(f"{'Recording' if args.record else 'Replaying'} {', '.join(args.scenarios)}"
+          f"{'' if args.record else f' (latency x{args.latency_scale}, {repeat} runs each)'}\n")
+
+    ctx = multiprocessing.get_context("spawn")
+    runs = {}
+    with ctx.Manager() as manager:
+        for scenario in args.scenarios:
+            runs[scenario] = []
+            for _ in range(repeat):
+                results = manager.dict()
+                process = ctx.Process(target=run_scenario, args=(scenario, options, results))
+                process.start()
+                process.join()
+                if scenario not in results:
+                    print(f"{scenario}: the benchmark process exited with code {process.exitcode}")
+                    break
+                runs[scenario].append(dict(results[scenario]))
+
+    print(f"{'scenario':<20}{'best':>9}{'mean':>9}{'peak RSS':>11}{'heap peak':>11}{'calls':>7}{'misses':>8}")
+    for scenario, measurements in runs.items():
+        if not measurements:
+            continue
+        walls = [m["wall"] for m in measurements]
+        last = measurements[-1]
+        heap = f"{last['heap_peak'] / 1024 / 1024:.1f} MB" if last["heap_peak"] is not None else "-"
+        print(f"{scenario:<20}{min(walls):>8.2f}s{sum(walls) / len(walls):>8.2f}s"
+              f"{last['rss'] / 1024 / 1024:>8.1f} MB{heap:>11}{last['calls']:>7}{last['replay_misses']:>8}")
+
+    for scenario, measurements in runs.items():
+        if not measurements:
+            continue
+        last = measurements[-1]
+        print(f"\n{scenario}" + (f"  (error: {last['error']})" if last["error"] else ""))
+        for name, seconds in last["stages"].items():
+            print(f"  stage {name:<40}{seconds:>8.2f}s")
+        for name, seconds in sorted(last["tools"].items(), key=lambda item: -item[1]):
+            print(f"  tool  {name:<40}{seconds:>8.2f}s")
+
+    if any(m["replay_misses"] for measurements in runs.values() for m in measurements):
+        print("\nSome calls had no recording; these timings do not reflect the recorded run. "
+              "Record the fixtures again with --record.")
+    if args.record:
+        print(f"\nFixtures written to {args.fixtures}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: serial scrape_webpage calls vs. scrape_many against a local stand-in.
+
+A threaded HTTP server on localhost plays the websites. It answers every page
+after a fixed delay and records the peak number of concurrent requests per
+host, so the per-domain cap can be checked. Three loopback hostnames stand in
+for three domains. No FireCrawl credits are used.
+
+    python bench_scrape.py --pages 30 --delay 0.2 --concurrency 8 --per-domain 2
+"""
+
+import argparse
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from firecrawl_tool import FirecrawlTools
+
+HOSTS = ["127.0.0.1", "localhost", "127.0.0.2"]
+
+
+class PageServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, delay):
+        super().__init__(address, PageHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = {}
+        self.peak = {}
+        self.requests = 0
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        host = self.headers.get("Host", "").split(":")[0]
+        with server.lock:
+            server.requests += 1
+            server.active[host] = server.active.get(host, 0) + 1
+            server.peak[host] = max(server.peak.get(host, 0), server.active[host])
+        try:
+            time.sleep(server.delay)
+            body = (f"<html><head><title>Page {self.path}</title></head>"
+                    f"<body><h1>{self.path}</h1><p>{'Lorem ipsum dolor sit amet. ' * 40}</p></body></html>")
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with server.lock:
+                server.active[host] -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalScrapeClient:
+    """Stands in for FirecrawlApp.scrape by fetching the page directly."""
+
+    def __init__(self):
+        self.http = httpx.Client(timeout=30.0, limits=httpx.Limits(max_connections=64))
+
+    def scrape(self, url, formats=None, onlyMainContent=True, mobile=False):
+        html = self.http.get(url).raise_for_status().text
+        title = re.search(r"<title>(.*?)</title>", html, re.S)
+        text = re.sub(r"<[^>]+>", " ", html)
+        return {"title": title.group(1) if title else url, "markdown": " ".join(text.split())}
+
+
+def build_urls(port, pages):
+    """Pages spread over the hosts, plus duplicate spellings of some of them."""
+    urls = []
+    for i in range(pages):
+        host = HOSTS[i % len(HOSTS)]
+        urls.append(f"http://{host}:{port}/page/{i}")
+    # the same pages again with tracking parameters, fragments and trailing slashes
+    for i in range(0, pages, 3):
+        host = HOSTS[i % len(HOSTS)]
+        urls.append(f"http://{host.upper()}:{port}/page/{i}/?utm_source=newsletter#top")
+    return urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial vs. concurrent scraping")
+    parser.add_argument("--pages", type=int, default=30, help="Distinct pages to scrape")
+    parser.add_argument("--delay", type=float, default=0.2, help="Server response time per page in seconds")
+    parser.add_argument("--concurrency", type=int, default=8, help="Global concurrency for scrape_many")
+    parser.add_argument("--per-domain", type=int, default=2, help="Per-domain concurrency for scrape_many")
+    args = parser.parse_args()
+
+    server = PageServer(("0.0.0.0", 0), args.delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    tools = FirecrawlTools(api_key="local", client=LocalScrapeClient())
+    urls = build_urls(port, args.pages)
+    print(f"{len(urls)} URLs ({args.pages} distinct pages) on {len(HOSTS)} hosts, {args.delay * 1000:.0f} ms per page\n")
+
+    start = time.perf_counter()
+    for url in urls:
+        tools.scrape_webpage(url)
+    serial_time = time.perf_counter() - start
+    serial_requests = server.requests
+
+    server.requests = 0
+    server.peak = {}
+    start = time.perf_counter()
+    first_result = None
+    count = 0
+    for url, result, error in tools.iter_scrape(urls, args.concurrency, args.per_domain):
+        if first_result is None:
+            first_result = time.perf_counter() - start
+        count += 1
+    concurrent_time = time.perf_counter() - start
+
+    print(f"{'variant':<28}{'wall':>10}{'requests':>10}")
+    print(f"{'serial scrape_webpage':<28}{serial_time:>9.2f}s{serial_requests:>10}")
+    print(f"{'scrape_many':<28}{concurrent_time:>9.2f}s{server.requests:>10}")
+    print(f"\nSpeedup: {serial_time / concurrent_time:.1f}x, first result after {first_result:.2f}s")
+    print(f"Peak concurrent requests per host: {server.peak} (cap {args.per_domain})")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
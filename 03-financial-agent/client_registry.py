@@ -0,0 +1,242 @@
+"""
+Process-wide registry of model clients and toolkits.
+
+Building a Gemini client or a toolkit opens new HTTP connections (and pays a
+TLS handshake) every time, so the agents share them instead. Entries are keyed
+by model id, tool configuration and API key; the Agent and Team objects that
+hold per-run state are still created per analysis. `use_cassette` routes the
+clients through a record/replay cassette for offline benchmarks.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import httpx
+from firecrawl import FirecrawlApp
+from google import genai
+from agno.models.google import Gemini
+
+from perplexity_client import PerplexityClient
+from perplexity_tool import PerplexityTools
+from replay import Cassette
+from firecrawl_tool import FirecrawlTools
+from instrumentation import ToolMetrics, instrument_toolkit
+from research_cache import ResearchCache
+from semantic_cache import SemanticCache
+from site_index import SiteIndex
+
+_registry: Dict[Hashable, Any] = {}
+_lock = threading.RLock()  # factories may fetch other shared entries
+_cassette: Optional[Cassette] = None
+
+
+def get_or_create(key: Hashable, factory: Callable[[], Any]) -> Any:
+    """
+    Return the shared object for `key`, creating it with `factory` on first use.
+
+    Args:
+        key (Hashable): Registry key, e.g. ("gemini-client", api_key).
+        factory (Callable): Builds the object when it is not registered yet.
+
+    Returns:
+        Any: The shared object.
+    """
+    with _lock:
+        if key not in _registry:
+            _registry[key] = factory()
+        return _registry[key]
+
+
+def use_cassette(cassette: Optional[Cassette]) -> None:
+    """
+    Route the Gemini, FireCrawl and Perplexity clients through a record/replay cassette.
+
+    The registry is cleared, so clients created from now on use the cassette;
+    pass None to go back to the live APIs.
+
+    Args:
+        cassette (Cassette, optional): The cassette, in record or replay mode.
+    """
+    global _cassette
+    with _lock:
+        _registry.clear()
+        _cassette = cassette
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Get the shared keep-alive HTTP connection pool used by the OpenAI-compatible clients.
+
+    Returns:
+        httpx.Client: A pooled client reused across toolkit instances.
+    """
+    return get_or_create(
+        ("http-client",),
+        lambda: httpx.Client(
+            timeout=httpx.Timeout(120.0, connect=10.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120),
+        ),
+    )
+
+
+def get_genai_client(api_key: str) -> genai.Client:
+    """
+    Get the shared Google GenAI client for an API key.
+
+    Args:
+        api_key (str): Google Gemini API key.
+
+    Returns:
+        genai.Client: The shared client.
+    """
+    def build():
+        client = genai.Client(api_key=api_key)
+        return _cassette.genai_client(client) if _cassette is not None else client
+
+    return get_or_create(("genai-client", api_key), build)
+
+
+def get_gemini(model_id: str, api_key: str) -> Gemini:
+    """
+    Create a Gemini model backed by the shared client for this API key.
+
+    The model object is cheap and keeps per-agent tool state, so each agent
+    gets its own; only the underlying client and its connections are shared.
+
+    Args:
+        model_id (str): Gemini model id, e.g. "gemini-2.0-flash".
+        api_key (str): Google Gemini API key.
+
+    Returns:
+        Gemini: A model instance using the shared client.
+    """
+    return Gemini(id=model_id, api_key=api_key, client=get_genai_client(api_key))
+
+
+def get_research_cache() -> ResearchCache:
+    """
+    Get the shared deep research cache.
+
+    Returns:
+        ResearchCache: The persistent cache used by every FirecrawlTools instance.
+    """
+    return get_or_create(("research-cache",), ResearchCache)
+
+
+def get_site_index() -> SiteIndex:
+    """
+    Get the shared site index used for incremental maps and scrapes.
+
+    Returns:
+        SiteIndex: The persistent URL index.
+    """
+    return get_or_create(("site-index",), SiteIndex)
+
+
+def get_semantic_cache() -> SemanticCache:
+    """
+    Get the shared near-duplicate query cache of the Perplexity and FireCrawl toolkits.
+
+    Returns:
+        SemanticCache: The persistent semantic cache.
+    """
+    return get_or_create(("semantic-cache",), SemanticCache)
+
+
+def get_tool_metrics() -> ToolMetrics:
+    """
+    Get the process-wide collector of tool call measurements.
+
+    Returns:
+        ToolMetrics: Receives every call of the shared toolkits.
+    """
+    return get_or_create(("tool-metrics",), ToolMetrics)
+
+
+def get_firecrawl_tools(api_key: str,
+                        output_format: str = "markdown",
+                        token_budget: Optional[int] = None) -> FirecrawlTools:
+    """
+    Get the shared, instrumented FirecrawlTools toolkit for an API key, with the research caches and site index.
+
+    Args:
+        api_key (str): FireCrawl API key.
+        output_format (str, optional): "markdown" or "records".
+        token_budget (int, optional): Cap tool outputs to their most relevant chunks.
+
+    Returns:
+        FirecrawlTools: The shared toolkit.
+    """
+    return get_or_create(
+        ("firecrawl-tools", api_key, output_format, token_budget),
+        lambda: instrument_toolkit(
+            FirecrawlTools(api_key=api_key, client=_firecrawl_client(api_key), research_cache=get_research_cache(),
+                           output_format=output_format, token_budget=token_budget,
+                           site_index=get_site_index(), http_client=get_http_client(),
+                           semantic_cache=get_semantic_cache()),
+            get_tool_metrics(),
+        ),
+    )
+
+
+def _firecrawl_client(api_key: str):
+    # None lets FirecrawlTools create its own FirecrawlApp
+    if _cassette is None:
+        return None
+    return _cassette.firecrawl_client(FirecrawlApp(api_key=api_key) if _cassette.recording else None)
+
+
+def get_perplexity_client(api_key: str) -> PerplexityClient:
+    """
+    Get the shared retrying Perplexity client for an API key.
+
+    Sharing it lets identical queries from different toolkits be coalesced.
+
+    Args:
+        api_key (str): Perplexity API key.
+
+    Returns:
+        PerplexityClient: The shared client, on the pooled HTTP client.
+    """
+    def build():
+        client = PerplexityClient(api_key=api_key, http_client=get_http_client())
+        if _cassette is not None:
+            client.client = _cassette.openai_client(client.client if _cassette.recording else None)
+        return client
+
+    return get_or_create(("perplexity-client", api_key), build)
+
+
+def get_perplexity_tools(api_key: str, model: str = "sonar-pro") -> PerplexityTools:
+    """
+    Get the shared, instrumented PerplexityTools toolkit for an API key and model, using the shared client.
+
+    Args:
+        api_key (str): Perplexity API key.
+        model (str, optional): Perplexity model to use.
+
+    Returns:
+        PerplexityTools: The shared toolkit.
+    """
+    return get_or_create(
+        ("perplexity-tools", api_key, model),
+        lambda: instrument_toolkit(
+            PerplexityTools(api_key=api_key, model=model, client=get_perplexity_client(api_key),
+                            semantic_cache=get_semantic_cache()),
+            get_tool_metrics(),
+        ),
+    )
+
+
+def clear(key: Optional[Hashable] = None) -> None:
+    """
+    Drop one registry entry, or all of them when no key is given.
+
+    Args:
+        key (Hashable, optional): The key to drop.
+    """
+    with _lock:
+        if key is None:
+            _registry.clear()
+        else:
+            _registry.pop(key, None)
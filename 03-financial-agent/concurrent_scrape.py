@@ -0,0 +1,133 @@
+"""
+URL helpers and a polite concurrent scheduler for batch scraping.
+
+`canonical_url` collapses the many spellings of one page (tracking
+parameters, fragments, default ports, trailing slashes) so each page is
+scraped once. `iter_polite` runs the scrapes on a thread pool under a
+global cap and a per-domain cap, and yields each result as soon as it is
+done. A URL is only handed to a worker when its domain has a free slot, so
+a long list of pages from one site never blocks the workers that could be
+fetching other sites.
+"""
+
+import re
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+URL_PATTERN = re.compile(r"https?://[^\s<>\"'\])]+")
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|gclid|fbclid|mc_cid|mc_eid|ref|ref_src)$", re.IGNORECASE)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalize a URL so different spellings of the same page compare equal.
+
+    Args:
+        url (str): The URL to normalize.
+
+    Returns:
+        str: Lowercase scheme and host, no default port, fragment or tracking
+        parameters, sorted query and no trailing slash on non-root paths.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING_PARAMS.match(key)
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def extract_urls(urls: Union[str, Iterable[str]]) -> List[str]:
+    """
+    Accept a list of URLs or free text (such as `map_website` output) and return the URLs in it.
+
+    Args:
+        urls (str or Iterable[str]): URLs, or text containing them.
+
+    Returns:
+        List[str]: The URLs in order of appearance.
+    """
+    if isinstance(urls, str):
+        return URL_PATTERN.findall(urls)
+    return [url for item in urls for url in URL_PATTERN.findall(item)]
+
+
+def dedupe_urls(urls: Iterable[str]) -> List[str]:
+    """
+    Drop URLs whose canonical form was already seen, keeping the first spelling.
+
+    Args:
+        urls (Iterable[str]): URLs to deduplicate.
+
+    Returns:
+        List[str]: One URL per canonical page, in input order.
+    """
+    seen = set()
+    unique = []
+    for url in urls:
+        key = canonical_url(url)
+        if key not in seen:
+            seen.add(key)
+            unique.append(url)
+    return unique
+
+
+def domain_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def iter_polite(urls: List[str],
+                fn: Callable[[str], Any],
+                max_concurrency: int = 8,
+                per_domain_limit: int = 2) -> Iterator[Tuple[str, Any, Exception]]:
+    """
+    Call `fn(url)` for every URL concurrently and yield results as they complete.
+
+    Args:
+        urls (List[str]): URLs to process.
+        fn (Callable): Work for one URL, run on a worker thread.
+        max_concurrency (int, optional): Maximum calls in flight overall.
+        per_domain_limit (int, optional): Maximum calls in flight per domain.
+
+    Yields:
+        tuple: (url, result, error); exactly one of result and error is set.
+    """
+    pending = deque(urls)
+    running: Dict[str, int] = {}
+    futures = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="scrape") as pool:
+        def fill():
+            # hand out URLs whose domain still has a free slot, keeping the rest in order
+            skipped = deque()
+            while pending and len(futures) < max(1, max_concurrency):
+                url = pending.popleft()
+                domain = domain_of(url)
+                if running.get(domain, 0) >= max(1, per_domain_limit):
+                    skipped.append(url)
+                    continue
+                running[domain] = running.get(domain, 0) + 1
+                futures[pool.submit(fn, url)] = url
+            skipped.extend(pending)
+            pending.clear()
+            pending.extend(skipped)
+
+        fill()
+        while futures:
+            done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+            for future in done:
+                url = futures.pop(future)
+                running[domain_of(url)] -= 1
+                error = future.exception()
+                yield url, None if error else future.result(), error
+            fill()
@@ -2,65 +2,89 @@ from textwrap import dedent
 from agno.agent import Agent, RunResponse 
 import os
 import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from agno.models.google import Gemini   
 from agno.team.team import Team 
-from perplexity_tool import PerplexityTools     
-from firecrawl_tool import FirecrawlTools
+import client_registry
+from parallel_research import StageTimer, run_parallel_research
+from research_events import COMPLETED, FAILED, STOPPED_EARLY, PhaseBreakdown
+from batch_analysis import (ASSET_QUESTIONS, MARKET_QUESTIONS, AssetReport, dedupe_assets,
+                            load_watchlist, parse_decision, write_reports)
 
-def analyze_cryptocurrency(crypto_name, google_api_key, firecrawl_api_key, perplexity_api_key):
+MODEL_ID = "gemini-2.0-flash"
+
+ANALYST_INSTRUCTIONS = """
+        You are a famous financial cryptocurrency analyst.
+        When given a research report, and user's requirements: 
+        - You can always analyze the research report and make a financial decision to tell the user whether and when to buy or sell the cryptocurrency they ask and give your reason.  
+        - You should also tell the user the risk level of the cryptocurrency and the potential return.  
+        - You can also use `PerplexityTools` to search the web for more possible additional information to help you analyze and make a better decision.  
+        - When you have several follow-up questions, ask them together with `query_many` instead of one `query_perplexity` call each.  
+        - Including proper citations  
+        """
+
+
+def build_analyst(google_api_key, perplexity_api_key):
     """
-    Analyze a cryptocurrency using AI agents.
+    Build the analyst agent that makes the buy/sell decision.
     
     Args:
-        crypto_name (str): Name of cryptocurrency to analyze
         google_api_key (str): Google Gemini API key
-        firecrawl_api_key (str): FireCrawl API key
         perplexity_api_key (str): Perplexity API key
+        
+    Returns:
+        Agent: The analyst agent, with Perplexity for follow-up lookups.
     """
-    print(f"\n===== AI Finance Assistant =====")
-    print(f"Analyzing cryptocurrency: {crypto_name}\n")
+    return Agent(
+        name="Financial Cryptocurrency Analyst", 
+        role="Making Financial Decisions based on the research report to buy or sell the cryptocurrency", 
+        model=client_registry.get_gemini(MODEL_ID, google_api_key),
+        instructions=ANALYST_INSTRUCTIONS, 
+        tools=[client_registry.get_perplexity_tools(perplexity_api_key)],
+        show_tool_calls=True,
+        markdown=True, 
+    )
+
+
+def build_team(google_api_key, firecrawl_api_key, perplexity_api_key):
+    """
+    Build the researcher/analyst team on top of the shared clients and toolkits.
     
-    # Set API keys as environment variables
-    os.environ["GOOGLE_API_KEY"] = google_api_key
-    os.environ["FIRECRAWL_API_KEY"] = firecrawl_api_key
-    os.environ["PERPLEXITY_API_KEY"] = perplexity_api_key
+    The Agent and Team objects are rebuilt per analysis because they keep run
+    state, but the Gemini client and the toolkits come from `client_registry`,
+    so repeated analyses in one process reuse their HTTP connections.
     
+    Args:
+        google_api_key (str): Google Gemini API key
+        firecrawl_api_key (str): FireCrawl API key
+        perplexity_api_key (str): Perplexity API key
+        
+    Returns:
+        Team: The coordinating financial team.
+    """
     # Create researcher agent
     researcher = Agent(
         name="Financial Cryptocurrency Researcher",  
         role="Search for financial Cryptocurrency detailed information", 
-        model=Gemini(id="gemini-2.0-flash", api_key=google_api_key),
+        model=client_registry.get_gemini(MODEL_ID, google_api_key),
         instructions=[
             'You are a financial cryptocurrency research assistant that can perform cryptocurrency research using firecrawl tool. The tool will search the web, analyze multiple resources, and provide a detailed research report about the coin.', 
             'When given a cryptocurrency name, you should perform a thorough research on the coin using firecrawl tool and provide a detailed research report about the coin.',  
             'You should also include the source of the information in your response.'
         ],
-        tools=[FirecrawlTools(api_key=firecrawl_api_key)],
+        tools=[client_registry.get_firecrawl_tools(firecrawl_api_key)],
         show_tool_calls=True,
         markdown=True,
     )
     
     # Create analyst agent
-    analyst = Agent(
-        name="Financial Cryptocurrency Analyst", 
-        role="Making Financial Decisions based on the research report to buy or sell the cryptocurrency", 
-        model=Gemini(id="gemini-2.0-flash", api_key=google_api_key),
-        instructions="""
-        You are a famous financial cryptocurrency analyst.
-        When given a research report, and user's requirements: 
-        - You can always analyze the research report and make a financial decision to tell the user whether and when to buy or sell the cryptocurrency they ask and give your reason.  
-        - You should also tell the user the risk level of the cryptocurrency and the potential return.  
-        - You can also use `PerplexityTools` to search the web for more possible additional information to help you analyze and make a better decision.  
-        - Including proper citations  
-        """, 
-        tools=[PerplexityTools(api_key=perplexity_api_key)],
-        show_tool_calls=True,
-        markdown=True, 
-    )
+    analyst = build_analyst(google_api_key, perplexity_api_key)
 
     team = Team(
         name = "Financial Cryptocurrecy Team" , 
-        model = Gemini(id="gemini-2.0-flash", api_key=google_api_key),   
+        model = client_registry.get_gemini(MODEL_ID, google_api_key),   
         mode = "coordinate", 
         members = [researcher, analyst],  
         markdown = True,   
@@ -77,33 +101,294 @@ def analyze_cryptocurrency(crypto_name, google_api_key, firecrawl_api_key, perpl
         enable_agentic_context = True, 
         share_member_interactions = True 
     ) 
-    team.print_response(f"Is it a good time to sell {crypto_name}?")
-    # print(response.content)
+    return team
+
+
+def analyst_prompt(crypto_name, research, extra=""):
+    """
+    Build the analyst's request around research that was collected up front.
+    
+    Args:
+        crypto_name (str): Name of cryptocurrency to analyze
+        research (str): Merged research in Markdown
+        extra (str): Additional instructions appended to the request
+        
+    Returns:
+        str: The prompt for the analyst agent.
+    """
+    return dedent(f"""\
+        Is it a good time to sell {crypto_name}?
+        
+        The research below was already collected for you. Base your decision on it,
+        and only use `PerplexityTools` if something important is missing.
+        {extra}
+    """) + "\n" + research
+
+
+_progress_lock = threading.Lock()
+
+
+def print_research_progress(event):
+    """
+    Print a deep research progress event as it arrives, and the phase breakdown at the end.
+    
+    Args:
+        event (ResearchEvent): Event emitted by `FirecrawlTools`
+    """
+    with _progress_lock:
+        print(f"  [research] {event.format()}", flush=True)
+        if event.kind in (COMPLETED, STOPPED_EARLY, FAILED) and event.data.get("phases"):
+            breakdown = PhaseBreakdown()
+            breakdown.seconds = event.data["phases"]
+            print(breakdown.summary(), flush=True)
 
 
+def analyze_in_parallel(crypto_name, google_api_key, firecrawl_api_key, perplexity_api_key, timer,
+                        min_sources=None):
+    """
+    Research the coin with concurrent tool calls, then let the analyst decide.
+    
+    The Firecrawl deep research and the Perplexity sub-questions are independent,
+    so they run at the same time instead of one after another through the team
+    leader; the analyst only starts once the merged findings are in.
+    
+    Args:
+        crypto_name (str): Name of cryptocurrency to analyze
+        google_api_key (str): Google Gemini API key
+        firecrawl_api_key (str): FireCrawl API key
+        perplexity_api_key (str): Perplexity API key
+        timer (StageTimer): Receives the timing of every stage
+        min_sources (int, optional): Stop the deep research once this many sources were found
+    """
+    with timer.stage("Research fan-out (wall)"):
+        bundle = run_parallel_research(
+            crypto_name,
+            client_registry.get_firecrawl_tools(firecrawl_api_key),
+            client_registry.get_perplexity_tools(perplexity_api_key),
+            timer=timer,
+            deep_research_kwargs={"min_sources": min_sources} if min_sources else None,
+        )
+    
+    analyst = build_analyst(google_api_key, perplexity_api_key)
+    with timer.stage("Analyst decision"):
+        analyst.print_response(analyst_prompt(crypto_name, bundle.to_markdown()))
+
+
+def analyze_cryptocurrency(crypto_name, google_api_key, firecrawl_api_key, perplexity_api_key, mode="coordinate",
+                           progress=False, min_sources=None):
+    """
+    Analyze a cryptocurrency using AI agents.
+    
+    Args:
+        crypto_name (str): Name of cryptocurrency to analyze
+        google_api_key (str): Google Gemini API key
+        firecrawl_api_key (str): FireCrawl API key
+        perplexity_api_key (str): Perplexity API key
+        mode (str): "coordinate" lets the team leader delegate step by step;
+            "parallel" runs the research tool calls concurrently first
+        progress (bool): Print deep research progress events live
+        min_sources (int, optional): In parallel mode, stop the deep research
+            once this many sources were found
+        
+    Returns:
+        StageTimer: The stage timings of this run.
+    """
+    print(f"\n===== AI Finance Assistant =====")
+    print(f"Analyzing cryptocurrency: {crypto_name}\n")
+    
+    # Set API keys as environment variables
+    os.environ["GOOGLE_API_KEY"] = google_api_key
+    os.environ["FIRECRAWL_API_KEY"] = firecrawl_api_key
+    os.environ["PERPLEXITY_API_KEY"] = perplexity_api_key
+    
+    firecrawl_tools = client_registry.get_firecrawl_tools(firecrawl_api_key)
+    if progress:
+        firecrawl_tools.add_listener(print_research_progress)
+    
+    metrics = client_registry.get_tool_metrics()
+    first_call = metrics.mark()
+    timer = StageTimer()
+    run_start = time.perf_counter()
+    try:
+        if mode == "parallel":
+            analyze_in_parallel(crypto_name, google_api_key, firecrawl_api_key, perplexity_api_key, timer,
+                                min_sources=min_sources)
+        else:
+            team = build_team(google_api_key, firecrawl_api_key, perplexity_api_key)
+            with timer.stage("Team run (coordinate)"):
+                team.print_response(f"Is it a good time to sell {crypto_name}?")
+            # print(response.content)
+    finally:
+        firecrawl_tools.remove_listener(print_research_progress)
+    
+    print("\n===== Stage Timings =====")
+    print(timer.summary())
+    print("\n===== Where The Time Went =====")
+    print(metrics.flame_summary(since=first_call, wall=time.perf_counter() - run_start))
+    return timer
+
+
+
+def analyze_watchlist(cryptos, google_api_key, firecrawl_api_key, perplexity_api_key,
+                      concurrency=4, report_prefix="watchlist_report", progress=False, min_sources=None):
+    """
+    Analyze many cryptocurrencies in one process and write a consolidated report.
+    
+    All assets share one set of clients and toolkits from `client_registry`.
+    The market-wide research is done once for the whole watchlist; repeated
+    follow-up questions from the analysts are answered by the toolkits' own
+    request coalescing and semantic cache. Every asset gets a fresh analyst
+    agent, so no run state carries over from one report to the next.
+    
+    Args:
+        cryptos (List[str]): Names or tickers of the cryptocurrencies to analyze
+        google_api_key (str): Google Gemini API key
+        firecrawl_api_key (str): FireCrawl API key
+        perplexity_api_key (str): Perplexity API key
+        concurrency (int): Maximum number of assets analyzed at the same time
+        report_prefix (str): Report path without extension; `.json` and `.md` are written
+        progress (bool): Print deep research progress events live
+        min_sources (int, optional): Stop each deep research once this many sources were found
+        
+    Returns:
+        List[AssetReport]: One report per distinct asset, in watchlist order.
+    """
+    os.environ["GOOGLE_API_KEY"] = google_api_key
+    os.environ["FIRECRAWL_API_KEY"] = firecrawl_api_key
+    os.environ["PERPLEXITY_API_KEY"] = perplexity_api_key
+    
+    assets = dedupe_assets(cryptos)
+    print(f"\n===== AI Finance Assistant =====")
+    print(f"Analyzing {len(assets)} cryptocurrencies with concurrency {concurrency}\n")
+    
+    metrics = client_registry.get_tool_metrics()
+    first_call = metrics.mark()
+    start = time.perf_counter()
+    firecrawl = client_registry.get_firecrawl_tools(firecrawl_api_key)
+    perplexity = client_registry.get_perplexity_tools(perplexity_api_key)
+    if progress:
+        firecrawl.add_listener(print_research_progress)
+    
+    # Market-wide context is the same for every coin, so it is researched once
+    with ThreadPoolExecutor(max_workers=len(MARKET_QUESTIONS)) as pool:
+        answers = list(pool.map(perplexity.query_perplexity, MARKET_QUESTIONS))
+    market_context = "\n\n".join(f"### {q}\n\n{a}" for q, a in zip(MARKET_QUESTIONS, answers))
+    
+    def analyze(crypto):
+        report = AssetReport(crypto=crypto)
+        timer = StageTimer()
+        asset_start = time.perf_counter()
+        try:
+            bundle = run_parallel_research(
+                crypto, firecrawl, perplexity, sub_questions=ASSET_QUESTIONS, timer=timer,
+                deep_research_kwargs={"min_sources": min_sources} if min_sources else None,
+            )
+            analyst = build_analyst(google_api_key, perplexity_api_key)
+            research = "## Market Context\n\n" + market_context + "\n\n" + bundle.to_markdown()
+            with timer.stage("Analyst decision"):
+                response = analyst.run(analyst_prompt(
+                    crypto, research,
+                    extra="Start your answer with `Decision: BUY`, `Decision: SELL` or `Decision: HOLD`."
+                ))
+            report.analysis = response.content
+            report.decision = parse_decision(report.analysis)
+        except Exception as e:
+            report.error = str(e)
+        report.seconds = round(time.perf_counter() - asset_start, 2)
+        report.stages = {name: round(seconds, 2) for name, seconds in timer.stages.items()}
+        print(f"[{crypto}] {'ERROR' if report.error else report.decision} in {report.seconds:.1f}s")
+        return report
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="asset") as pool:
+            reports = list(pool.map(analyze, assets))
+    finally:
+        firecrawl.remove_listener(print_research_progress)
+    
+    calls = metrics.calls[first_call:]
+    stats = {
+        "assets": len(assets),
+        "wall_seconds": round(time.perf_counter() - start, 1),
+        "tool_calls": len(calls),
+        "cache_hits": sum(sum(call.cache_hits.values()) for call in calls),
+    }
+    paths = write_reports(reports, market_context, report_prefix, stats)
+    print(f"\nReport written to {', '.join(paths)}")
+    print("\n===== Where The Time Went =====")
+    print(metrics.flame_summary(since=first_call, wall=time.perf_counter() - start))
+    return reports
+
 
 def main():
     parser = argparse.ArgumentParser(description="AI Finance Assistant - Cryptocurrency Analyzer")
-    parser.add_argument("--crypto", required=True, help="Name of cryptocurrency to analyze")
+    targets = parser.add_mutually_exclusive_group(required=True)
+    targets.add_argument("--crypto", help="Name of cryptocurrency to analyze")
+    targets.add_argument("--cryptos", nargs="+", help="Several cryptocurrencies to analyze, space or comma separated")
+    targets.add_argument("--watchlist-file", help="File with one cryptocurrency per line")
     parser.add_argument("--google-api-key", required=True, help="Google Gemini API Key")
     parser.add_argument("--firecrawl-api-key", required=True, help="FireCrawl API Key")
     parser.add_argument("--perplexity-api-key", required=True, help="Perplexity API Key")
+    parser.add_argument("--mode", choices=["coordinate", "parallel"],
+                        help="coordinate (default): team leader delegates step by step; parallel: research tool calls "
+                             "run concurrently. Watchlist mode always runs in parallel")
+    parser.add_argument("--progress", action="store_true", help="Print deep research progress events as they arrive")
+    parser.add_argument("--min-sources", type=int,
+                        help="Parallel and watchlist mode: stop the deep research early once this many sources were found")
+    parser.add_argument("--metrics-jsonl", help="Append one JSON line per tool call to this file")
+    parser.add_argument("--metrics-prom", help="Write tool call metrics in Prometheus text format to this file at the end")
+    parser.add_argument("--metrics-port", type=int, help="Serve tool call metrics for Prometheus at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--concurrency", type=int, default=4, help="Assets analyzed at the same time in watchlist mode")
+    parser.add_argument("--report-prefix", default="watchlist_report",
+                        help="Watchlist report path without extension (.json and .md are written)")
     
     args = parser.parse_args()
+    if (args.cryptos or args.watchlist_file) and args.mode == "coordinate":
+        parser.error("watchlist mode always runs the research in parallel; --mode coordinate needs --crypto")
+    
+    metrics = client_registry.get_tool_metrics()
+    metrics.jsonl_path = args.metrics_jsonl
+    if args.metrics_port:
+        metrics.serve_prometheus(args.metrics_port)
     
     try:
+        if args.cryptos or args.watchlist_file:
+            if args.watchlist_file:
+                cryptos = load_watchlist(args.watchlist_file)
+            else:
+                cryptos = [name for value in args.cryptos for name in value.split(",")]
+            analyze_watchlist(
+                cryptos,
+                args.google_api_key,
+                args.firecrawl_api_key,
+                args.perplexity_api_key,
+                concurrency=args.concurrency,
+                report_prefix=args.report_prefix,
+                progress=args.progress,
+                min_sources=args.min_sources
+            )
+            return
         analyze_cryptocurrency(
             args.crypto,
             args.google_api_key,
             args.firecrawl_api_key,
-            args.perplexity_api_key
+            args.perplexity_api_key,
+            mode=args.mode or "coordinate",
+            progress=args.progress,
+            min_sources=args.min_sources
         )
     except Exception as e:
         print(f"\nError: {str(e)}")
         print("Please check your API keys and try again.")
+    finally:
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
 
 if __name__ == "__main__":
     main() 
 
 # execution command: 
-#  python 03-financial-agent/crypto_financial_agent.py --crypto bitcoin --google-api-key <YOUR_API_KEY>  --firecrawl-api-key <YOUR_API_KEY> --perplexity-api-key <YOUR_API_KEY>
\ No newline at end of file
+#  python 03-financial-agent/crypto_financial_agent.py --crypto bitcoin --google-api-key <YOUR_API_KEY>  --firecrawl-api-key <YOUR_API_KEY> --perplexity-api-key <YOUR_API_KEY>
+#  add --mode parallel to run the research tool calls concurrently
+#  add --metrics-jsonl calls.jsonl / --metrics-prom metrics.prom / --metrics-port 9108 to export tool call metrics
+#  add --progress to watch the deep research live, and --min-sources 10 (parallel mode) to stop it early
+#  watchlist: replace --crypto with --cryptos bitcoin eth solana  or  --watchlist-file watchlist.txt
\ No newline at end of file
@@ -1,12 +1,24 @@
 from firecrawl import FirecrawlApp
 import os
 import json
-from typing import Optional, Dict, Any, Callable, List
+import threading
+import time
+import httpx
+from typing import Optional, Dict, Any, Callable, Iterator, List, Tuple, Union
 
 from agno.agent import Agent
 from agno.tools import Toolkit
 from agno.utils.log import logger
 
+from research_cache import ResearchCache, ResearchEntry, STALE
+from concurrent_scrape import dedupe_urls, extract_urls, iter_polite
+from instrumentation import note_cache_hit
+from semantic_cache import SemanticCache
+from research_events import (COMPLETED, STARTED, DeepResearchStream, PhaseBreakdown, ResearchEvent,
+                             activity_to_event)
+from site_index import MapDiff, SiteIndex, check_changed, fetch_validators, map_key, site_of
+from tool_output import MARKDOWN, OUTPUT_FORMATS, RECORDS, Chunk, rank_documents, render_chunks, stream_chunks
+
 
 class FirecrawlTools(Toolkit):
     """
@@ -15,12 +27,29 @@ class FirecrawlTools(Toolkit):
     This toolkit provides methods to perform deep research on topics using web crawling.
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, 
+                 api_key: Optional[str] = None, 
+                 research_cache: Optional[ResearchCache] = None, 
+                 client: Optional[Any] = None, 
+                 output_format: str = MARKDOWN, 
+                 token_budget: Optional[int] = None, 
+                 site_index: Optional[SiteIndex] = None, 
+                 http_client: Optional[httpx.Client] = None, 
+                 semantic_cache: Optional[SemanticCache] = None):
         """
         Initialize the FirecrawlTools toolkit.
         
         Args:
             api_key (str, optional): FireCrawl API key. If None, uses FIRECRAWL_API_KEY environment variable.
+            research_cache (ResearchCache, optional): Cache for deep research results. If None, every call runs a new job.
+            client (optional): Object with the FirecrawlApp methods to use instead of a new FirecrawlApp, e.g. a local stand-in.
+            output_format (str, optional): "markdown" for Markdown text, or "records" for JSON records
+                (source, title, content chunk, score).
+            token_budget (int, optional): When set, results are chunked and ranked against the query and
+                only the most relevant chunks that fit this many tokens are returned.
+            site_index (SiteIndex, optional): Persistent URL index. Enables incremental maps and `scrape_site_updates`.
+            http_client (httpx.Client, optional): Client for the conditional change checks against the sites themselves.
+            semantic_cache (SemanticCache, optional): Serves deep research for rephrased versions of earlier queries.
         """
         super().__init__(name="firecrawl_tools")
         
@@ -32,33 +61,121 @@ class FirecrawlTools(Toolkit):
                     "No API key provided. Either pass api_key parameter or set FIRECRAWL_API_KEY environment variable."
                 )
         
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}, got {output_format!r}")
+        
         self.api_key = api_key
-        self.client = FirecrawlApp(api_key=self.api_key)
+        self.output_format = output_format
+        self.token_budget = token_budget
+        self.client = client if client is not None else FirecrawlApp(api_key=self.api_key)
+        self.research_cache = research_cache
+        self.site_index = site_index
+        self.http_client = http_client
+        self.semantic_cache = semantic_cache
+        
+        # Subscribers to deep research progress events (see add_listener)
+        self._listeners: List[Callable[[ResearchEvent], None]] = []
+        
+        # Background refreshes of stale research, one per key and at most two at a time
+        self._refresh_slots = threading.BoundedSemaphore(2)
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
         
         # Register the methods that can be called by the agent
         self.register(self.deep_research)
         self.register(self.scrape_webpage)
+        self.register(self.scrape_many)
         self.register(self.map_website)
+        if self.site_index is not None:
+            self.register(self.scrape_site_updates)
+    
+    def add_listener(self, listener: Callable[[ResearchEvent], None]) -> None:
+        """
+        Subscribe to the progress events of every deep research run by this toolkit.
+        
+        Args:
+            listener (Callable): Called with each ResearchEvent; must be thread-safe,
+                since research can run on several threads at once.
+        """
+        self._listeners.append(listener)
+    
+    def remove_listener(self, listener: Callable[[ResearchEvent], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+    
+    def _emit(self, event: ResearchEvent) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                logger.warning(f"Research listener failed: {e}")
     
-    def _create_activity_callback(self) -> Callable:
+    def _create_activity_callback(self, start: Optional[float] = None,
+                                  phases: Optional[PhaseBreakdown] = None) -> Callable:
         """
         Create a callback function for real-time updates that logs to Agno logger.
         
+        Args:
+            start (float, optional): `time.perf_counter()` when the job started, for event timestamps.
+            phases (PhaseBreakdown, optional): Receives every activity for the per-phase timing.
+        
         Returns:
-            Callable: A callback function that logs FireCrawl activities.
+            Callable: A callback function that logs FireCrawl activities and forwards them to listeners.
         """
+        start = time.perf_counter() if start is None else start
+        
         def on_activity(activity):
             activity_type = activity.get('type', 'UNKNOWN')
             message = activity.get('message', 'No message')
             logger.info(f"[FireCrawl {activity_type}] {message}")
+            event = activity_to_event(activity, start)
+            if phases is not None:
+                phases.add(event)
+            self._emit(event)
         
         return on_activity
     
+    def stream_deep_research(self, 
+                             query: str, 
+                             max_depth: int = 5, 
+                             time_limit: int = 180, 
+                             max_urls: int = 15, 
+                             min_sources: Optional[int] = None, 
+                             stop_when: Optional[Callable] = None, 
+                             poll_interval: float = 2.0) -> DeepResearchStream:
+        """
+        Start a deep research job whose progress can be consumed as events.
+        
+        Iterate the returned stream (or `async for` over it) to receive typed,
+        timestamped events while the job runs; `stream.result` holds the
+        research once the stream ends.
+        
+        Args:
+            query (str): The research query to investigate.
+            max_depth (int, optional): Number of research iterations (1-10).
+            time_limit (int, optional): Time limit in seconds (30-300).
+            max_urls (int, optional): Maximum URLs to analyze (1-1000).
+            min_sources (int, optional): Stop early once this many sources were found.
+            stop_when (Callable, optional): Stop early when it returns True for the ResearchResult so far.
+            poll_interval (float, optional): Seconds between status checks.
+            
+        Returns:
+            DeepResearchStream: The event stream; toolkit listeners receive its events too.
+        """
+        params = {
+            "maxDepth": max_depth,
+            "timeLimit": time_limit,
+            "maxUrls": max_urls
+        }
+        return DeepResearchStream(self.client, query, params, poll_interval=poll_interval,
+                                  min_sources=min_sources, stop_when=stop_when, listeners=[self._emit])
+    
     def deep_research(self, 
                       query: str, 
                       max_depth: int = 5, 
                       time_limit: int = 180, 
-                      max_urls: int = 15) -> str:
+                      max_urls: int = 15, 
+                      min_sources: Optional[int] = None) -> str:
         """
         Perform deep research on a topic using FireCrawl's capabilities.
         
@@ -67,6 +184,8 @@ class FirecrawlTools(Toolkit):
             max_depth (int, optional): Number of research iterations (1-10).
             time_limit (int, optional): Time limit in seconds (30-300).
             max_urls (int, optional): Maximum URLs to analyze (1-1000).
+            min_sources (int, optional): Stop as soon as this many sources were found and
+                return the findings so far, instead of waiting for the final analysis.
             
         Returns:
             str: Formatted research results as Markdown.
@@ -80,39 +199,225 @@ class FirecrawlTools(Toolkit):
             "maxUrls": max_urls
         }
         
+        # Serve equivalent research from the cache while it is fresh enough
+        key = None
+        if self.research_cache is not None:
+            key = self.research_cache.make_key(query, max_depth, max_urls)
+            entry, state = self.research_cache.lookup(key, query)
+            if entry is not None:
+                if state == STALE:
+                    self._refresh_in_background(key, query, params)
+                logger.info(f"Using {state} cached research ({entry.age / 60:.0f} min old) for: {query}")
+                note_cache_hit(f"research_cache_{state}")
+                return self._render_research(query, entry.final_analysis, entry.sources, cached_age=entry.age)
+        
+        # A rephrased version of an earlier query ("BTC price forecast" for "bitcoin price outlook")
+        hit = self._semantic_lookup(query, max_depth, max_urls)
+        if hit is not None:
+            logger.info(f"Using research for similar query ({hit.similarity:.2f}): {hit.query}")
+            note_cache_hit("semantic")
+            return self._render_research(query, hit.value["final_analysis"], hit.value["sources"],
+                                         cached_age=hit.age)
+        
         try:
+            final_analysis, sources = self._run_deep_research(query, params, key, min_sources)
+            return self._render_research(query, final_analysis, sources)
+            
+        except Exception as e:
+            logger.warning(f"Failed to perform deep research: {e}")
+            return f"Error performing research on '{query}': {e}"
+    
+    def _run_deep_research(self, query: str, params: Dict[str, Any],
+                           cache_key: Optional[str] = None,
+                           min_sources: Optional[int] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Run a deep research job and store the structured result in the cache.
+        
+        Args:
+            query (str): The research query.
+            params (dict): FireCrawl deep research parameters.
+            cache_key (str, optional): Key to store the result under.
+            min_sources (int, optional): Stop early once this many sources were found.
+            
+        Returns:
+            tuple: The final analysis and the list of sources (url, title, description).
+        """
+        if min_sources is not None:
+            # Poll the job so it can be cut short; partial findings are not cached
+            stream = self.stream_deep_research(query, params["maxDepth"], params["timeLimit"],
+                                               params["maxUrls"], min_sources=min_sources)
+            result = stream.run()
+            logger.info(f"Deep research {result.status} with {len(result.sources)} sources "
+                        f"in {result.elapsed:.0f}s\n{stream.phases.summary()}")
+            if result.status == "failed":
+                raise RuntimeError(result.error)
+            if result.terminated_early:
+                return result.final_analysis, result.sources
+            final_analysis, sources = result.final_analysis, result.sources
+        else:
             # Run deep research with activity callback
+            start = time.perf_counter()
+            phases = PhaseBreakdown()
+            self._emit(ResearchEvent(kind=STARTED, message=f"Deep research started: {query}",
+                                     timestamp=time.time()))
             results = self.client.deep_research(
                 query=query,
                 params=params,
-                on_activity=self._create_activity_callback()
+                on_activity=self._create_activity_callback(start, phases)
             )
             
             logger.info(f"Deep research completed with {len(results['data']['sources'])} sources")
             
-            # Format the results as Markdown string
-            sources = results['data']['sources']
-            
-            formatted_output = ["## Research Results on: " + query + "\n"]
-            formatted_output.append(results['data']['finalAnalysis'])
+            final_analysis = results['data']['finalAnalysis']
+            sources = [
+                {
+                    "url": source.get("url"),
+                    "title": source.get("title"),
+                    "description": source.get("description"),
+                }
+                for source in results['data']['sources']
+            ]
+            completed = ResearchEvent(kind=COMPLETED, timestamp=time.time(), elapsed=time.perf_counter() - start,
+                                      message=f"Research completed with {len(sources)} sources")
+            phases.add(completed)
+            completed.data = {"phases": dict(phases.seconds)}
+            self._emit(completed)
+        
+        if self.semantic_cache is not None:
+            self.semantic_cache.store(
+                "deep_research", query, {"final_analysis": final_analysis, "sources": sources},
+                scope=SemanticCache.make_scope(params["maxDepth"], params["maxUrls"])
+            )
+        if cache_key is not None:
+            self.research_cache.store(cache_key, ResearchEntry(
+                query=query,
+                max_depth=params["maxDepth"],
+                max_urls=params["maxUrls"],
+                final_analysis=final_analysis,
+                sources=sources,
+            ))
+        return final_analysis, sources
+    
+    def _semantic_lookup(self, query: str, max_depth: int, max_urls: int):
+        """
+        Find research done for a near-duplicate query with the same depth and URL limit.
+        
+        Args:
+            query (str): The research query.
+            max_depth (int): Research depth of the request.
+            max_urls (int): URL limit of the request.
             
-            if sources:
-                formatted_output.append("\n\n## Sources\n")
-                for i, source in enumerate(sources, 1):
-                    url = source.get("url", "No URL")
-                    title = source.get("title", "No title")
-                    formatted_output.append(f"{i}. [{title}]({url})")
+        Returns:
+            SemanticHit: The cached research, or None.
+        """
+        if self.semantic_cache is None:
+            return None
+        hit = self.semantic_cache.lookup("deep_research", query,
+                                         scope=SemanticCache.make_scope(max_depth, max_urls))
+        # the topic freshness rules of the research cache apply to rephrased queries too
+        if hit is not None and self.research_cache is not None and hit.age > self.research_cache.max_age_for(query):
+            return None
+        return hit
+    
+    def _refresh_in_background(self, cache_key: str, query: str, params: Dict[str, Any]) -> None:
+        """
+        Re-run a stale research job without blocking the caller.
+        
+        Args:
+            cache_key (str): Key of the stale entry.
+            query (str): The research query.
+            params (dict): FireCrawl deep research parameters.
+        """
+        with self._refresh_lock:
+            if cache_key in self._refreshing:
+                return
+            self._refreshing.add(cache_key)
+        
+        def refresh():
+            try:
+                with self._refresh_slots:
+                    self._run_deep_research(query, params, cache_key)
+                logger.info(f"Refreshed cached research for: {query}")
+            except Exception as e:
+                logger.warning(f"Background research refresh failed: {e}")
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(cache_key)
+        
+        # a daemon thread, so a refresh still running never keeps the CLI from exiting
+        threading.Thread(target=refresh, name="research-refresh", daemon=True).start()
+    
+    @property
+    def structured(self) -> bool:
+        """Whether results go through chunking, ranking and budgeting."""
+        return self.output_format == RECORDS or self.token_budget is not None
+    
+    def _render_research(self, query: str, final_analysis: str, sources: List[Dict[str, Any]],
+                         cached_age: Optional[float] = None) -> str:
+        """
+        Render research results in the configured output format.
+        
+        Args:
+            query (str): The research query.
+            final_analysis (str): The research summary.
+            sources (list): Sources with url, title and description.
+            cached_age (float, optional): Age in seconds when served from the cache.
             
-            return "\n".join(formatted_output)
+        Returns:
+            str: Markdown or JSON records.
+        """
+        if not self.structured:
+            return self._format_research(query, final_analysis, sources, cached_age)
+        
+        documents = [("firecrawl:deep_research", f"Research on {query}", final_analysis)]
+        documents += [(source.get("url") or "", source.get("title") or "", source.get("description") or "")
+                      for source in sources if source.get("description")]
+        chunks = rank_documents(documents, query, self.token_budget)
+        return render_chunks(
+            chunks,
+            self.output_format,
+            header=f"## Research Results on: {query}",
+            extra={
+                "query": query,
+                "sources": [{"url": s.get("url"), "title": s.get("title")} for s in sources],
+                "cached_age_seconds": round(cached_age) if cached_age is not None else None,
+            },
+        )
+    
+    @staticmethod
+    def _format_research(query: str, final_analysis: str, sources: List[Dict[str, Any]],
+                         cached_age: Optional[float] = None) -> str:
+        """
+        Format research results as Markdown.
+        
+        Args:
+            query (str): The research query.
+            final_analysis (str): The research summary.
+            sources (list): Sources with url and title.
+            cached_age (float, optional): Age in seconds when served from the cache.
             
-        except Exception as e:
-            logger.warning(f"Failed to perform deep research: {e}")
-            return f"Error performing research on '{query}': {e}"
+        Returns:
+            str: Formatted research results.
+        """
+        formatted_output = ["## Research Results on: " + query + "\n"]
+        if cached_age is not None:
+            formatted_output.append(f"_Cached research from {cached_age / 60:.0f} minutes ago._\n")
+        formatted_output.append(final_analysis)
+        
+        if sources:
+            formatted_output.append("\n\n## Sources\n")
+            for i, source in enumerate(sources, 1):
+                url = source.get("url") or "No URL"
+                title = source.get("title") or "No title"
+                formatted_output.append(f"{i}. [{title}]({url})")
+        
+        return "\n".join(formatted_output)
     
     def scrape_webpage(self, 
                        url: str, 
                        only_main_content: bool = True, 
-                       mobile: bool = False) -> str:
+                       mobile: bool = False, 
+                       query: Optional[str] = None) -> str:
         """
         Scrape content from a single webpage.
         
@@ -120,6 +425,7 @@ class FirecrawlTools(Toolkit):
             url (str): The URL to scrape.
             only_main_content (bool, optional): Extract only the main content, filtering out navigation, etc.
             mobile (bool, optional): Use mobile viewport for scraping.
+            query (str, optional): What you are looking for on the page; used to keep the most relevant parts.
             
         Returns:
             str: Scraped content in Markdown format.
@@ -127,38 +433,178 @@ class FirecrawlTools(Toolkit):
         logger.info(f"Scraping webpage: {url}")
         
         try:
-            # Set up scraping options
-            options = {
-                "formats": ["markdown"],
-                "onlyMainContent": only_main_content,
-                "mobile": mobile
-            }
-            
-            # Scrape the webpage
-            result = self.client.scrape(url=url, **options)
+            result = self._scrape(url, only_main_content, mobile)
             
             logger.info(f"Successfully scraped {url}")
             
-            # Format as Markdown
-            title = result.get("title", "Scraped Content")
-            content = result.get("markdown", "No content extracted")
-            
-            formatted_output = [
-                f"# {title}\n",
-                f"Source: {url}\n",
-                content
-            ]
-            
-            return "\n".join(formatted_output)
+            if self.structured:
+                chunks = rank_documents([self._document(url, result)], query, self.token_budget)
+                return render_chunks(chunks, self.output_format, extra={"url": url})
+            return self._format_page(url, result)
             
         except Exception as e:
             logger.warning(f"Failed to scrape webpage: {e}")
             return f"Error scraping webpage '{url}': {e}"
     
+    def _scrape(self, url: str, only_main_content: bool = True, mobile: bool = False) -> Dict[str, Any]:
+        """
+        Scrape one URL and return the raw FireCrawl result.
+        
+        Args:
+            url (str): The URL to scrape.
+            only_main_content (bool, optional): Extract only the main content.
+            mobile (bool, optional): Use mobile viewport for scraping.
+            
+        Returns:
+            dict: The scrape result with at least `title` and `markdown` when available.
+        """
+        # Set up scraping options
+        options = {
+            "formats": ["markdown"],
+            "onlyMainContent": only_main_content,
+            "mobile": mobile
+        }
+        
+        # Scrape the webpage
+        return self.client.scrape(url=url, **options)
+    
+    @staticmethod
+    def _document(url: str, result: Dict[str, Any]) -> Tuple[str, str, str]:
+        return url, result.get("title") or url, result.get("markdown") or ""
+    
+    @staticmethod
+    def _format_page(url: str, result: Dict[str, Any]) -> str:
+        """
+        Format a scrape result as Markdown.
+        
+        Args:
+            url (str): The scraped URL.
+            result (dict): The scrape result.
+            
+        Returns:
+            str: Title, source and page content.
+        """
+        title = result.get("title", "Scraped Content")
+        content = result.get("markdown", "No content extracted")
+        
+        formatted_output = [
+            f"# {title}\n",
+            f"Source: {url}\n",
+            content
+        ]
+        
+        return "\n".join(formatted_output)
+    
+    def iter_scrape(self, 
+                    urls: Union[str, List[str]], 
+                    max_concurrency: int = 8, 
+                    per_domain_limit: int = 2, 
+                    only_main_content: bool = True, 
+                    mobile: bool = False) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[Exception]]]:
+        """
+        Scrape many URLs concurrently and yield each result as soon as it completes.
+        
+        Args:
+            urls (str or List[str]): URLs, or text containing them such as `map_website` output.
+            max_concurrency (int, optional): Maximum scrapes in flight overall.
+            per_domain_limit (int, optional): Maximum scrapes in flight per domain.
+            only_main_content (bool, optional): Extract only the main content.
+            mobile (bool, optional): Use mobile viewport for scraping.
+            
+        Yields:
+            tuple: (url, result, error); exactly one of result and error is set.
+        """
+        unique = dedupe_urls(extract_urls(urls))
+        logger.info(f"Scraping {len(unique)} unique URLs (concurrency {max_concurrency}, {per_domain_limit} per domain)")
+        yield from iter_polite(
+            unique,
+            lambda url: self._scrape(url, only_main_content, mobile),
+            max_concurrency=max_concurrency,
+            per_domain_limit=per_domain_limit,
+        )
+    
+    def iter_scrape_chunks(self, 
+                           urls: Union[str, List[str]], 
+                           query: Optional[str] = None, 
+                           token_budget: int = 4000, 
+                           max_concurrency: int = 8, 
+                           per_domain_limit: int = 2, 
+                           only_main_content: bool = True) -> Iterator[Chunk]:
+        """
+        Scrape many URLs and stream the most relevant chunks as pages complete.
+        
+        Args:
+            urls (str or List[str]): URLs, or text containing them such as `map_website` output.
+            query (str, optional): What the chunks should be relevant to.
+            token_budget (int, optional): Maximum total tokens over the whole stream.
+            max_concurrency (int, optional): Maximum scrapes in flight overall.
+            per_domain_limit (int, optional): Maximum scrapes in flight per domain.
+            only_main_content (bool, optional): Extract only the main content.
+            
+        Yields:
+            Chunk: Selected chunks, best first within each page.
+        """
+        def documents():
+            for url, result, error in self.iter_scrape(urls, max_concurrency, per_domain_limit, only_main_content):
+                if error is not None:
+                    logger.warning(f"Failed to scrape webpage: {error}")
+                    continue
+                yield self._document(url, result)
+        
+        yield from stream_chunks(documents(), query, token_budget)
+    
+    def scrape_many(self, 
+                    urls: Union[str, List[str]], 
+                    max_concurrency: int = 8, 
+                    per_domain_limit: int = 2, 
+                    only_main_content: bool = True, 
+                    query: Optional[str] = None) -> str:
+        """
+        Scrape several webpages at once, e.g. the pages found by `map_website`.
+        
+        Duplicate URLs (same page with different tracking parameters, fragments,
+        trailing slashes, ...) are scraped once.
+        
+        Args:
+            urls (str or List[str]): List of URLs, or the text output of `map_website`.
+            max_concurrency (int, optional): Maximum scrapes in flight overall.
+            per_domain_limit (int, optional): Maximum scrapes in flight per website.
+            only_main_content (bool, optional): Extract only the main content, filtering out navigation, etc.
+            query (str, optional): What you are looking for; used to keep the most relevant parts of each page.
+            
+        Returns:
+            str: The scraped pages in Markdown, in the order they finished.
+        """
+        if self.structured:
+            if self.token_budget is not None:
+                chunks = list(self.iter_scrape_chunks(urls, query, self.token_budget, max_concurrency,
+                                                      per_domain_limit, only_main_content))
+            else:
+                pages = [self._document(url, result)
+                         for url, result, error in self.iter_scrape(urls, max_concurrency, per_domain_limit,
+                                                                    only_main_content)
+                         if error is None]
+                chunks = rank_documents(pages, query, None)
+            return render_chunks(chunks, self.output_format, extra={"query": query})
+        
+        formatted_output = []
+        failures = 0
+        for url, result, error in self.iter_scrape(urls, max_concurrency, per_domain_limit, only_main_content):
+            if error is not None:
+                failures += 1
+                logger.warning(f"Failed to scrape webpage: {error}")
+                formatted_output.append(f"Error scraping webpage '{url}': {error}")
+            else:
+                formatted_output.append(self._format_page(url, result))
+        
+        logger.info(f"Scraped {len(formatted_output) - failures} pages, {failures} failed")
+        return "\n\n---\n\n".join(formatted_output)
+    
     def map_website(self, 
                     url: str, 
                     limit: int = 100, 
-                    include_subdomains: bool = False) -> str:
+                    include_subdomains: bool = False, 
+                    refresh: bool = False) -> str:
         """
         Discover URLs from a starting point on a website.
         
@@ -166,6 +612,7 @@ class FirecrawlTools(Toolkit):
             url (str): Starting URL for URL discovery.
             limit (int, optional): Maximum number of URLs to return.
             include_subdomains (bool, optional): Include URLs from subdomains in results.
+            refresh (bool, optional): Map the site again even if a recent map is in the site index.
             
         Returns:
             str: Formatted list of discovered URLs as Markdown.
@@ -173,30 +620,194 @@ class FirecrawlTools(Toolkit):
         logger.info(f"Mapping website: {url}")
         
         try:
-            # Map the website
-            result = self.client.map(
-                url=url,
-                limit=limit,
-                includeSubdomains=include_subdomains
-            )
+            diff = self._map_site(url, limit, include_subdomains, refresh)
+            result = diff.urls
+            new = set(diff.new)
+            
+            # Keep the URL list within the token budget (about 20 tokens per URL)
+            urls = list(result)
+            if self.token_budget is not None:
+                urls = urls[:max(1, self.token_budget // 20)]
             
-            logger.info(f"Successfully mapped {url}, found {len(result)} URLs")
+            if self.output_format == RECORDS:
+                return json.dumps({
+                    "url": url,
+                    "total": len(result),
+                    "urls": urls,
+                    "new": [u for u in urls if u in new],
+                    "gone": diff.gone,
+                    "from_index": diff.from_index,
+                }, ensure_ascii=False)
             
             # Format as Markdown
             formatted_output = [
                 f"# Website Map: {url}\n",
                 f"Found {len(result)} URLs\n",
-                "## Discovered URLs:\n"
             ]
+            if self.site_index is not None:
+                source = "site index (recent map)" if diff.from_index else "fresh map"
+                formatted_output.append(
+                    f"From {source}: {len(diff.new)} new, {len(diff.gone)} no longer listed\n"
+                )
+            formatted_output.append("## Discovered URLs:\n")
             
-            for i, discovered_url in enumerate(result, 1):
-                formatted_output.append(f"{i}. {discovered_url}")
+            for i, discovered_url in enumerate(urls, 1):
+                marker = " (new)" if discovered_url in new and not diff.from_index else ""
+                formatted_output.append(f"{i}. {discovered_url}{marker}")
+            if len(urls) < len(result):
+                formatted_output.append(f"... and {len(result) - len(urls)} more")
             
             return "\n".join(formatted_output)
             
         except Exception as e:
             logger.warning(f"Failed to map website: {e}")
             return f"Error mapping website '{url}': {e}"
+    
+    def _map_site(self, url: str, limit: int = 100, include_subdomains: bool = False,
+                  refresh: bool = False) -> MapDiff:
+        """
+        Map a site, reusing a recent map from the site index when there is one.
+        
+        Args:
+            url (str): Starting URL for URL discovery.
+            limit (int, optional): Maximum number of URLs to return.
+            include_subdomains (bool, optional): Include URLs from subdomains in results.
+            refresh (bool, optional): Ignore a recent map in the index.
+            
+        Returns:
+            MapDiff: The URLs, split into new and already known ones.
+        """
+        site = site_of(url)
+        key = map_key(url, limit, include_subdomains)
+        if self.site_index is not None and not refresh and self.site_index.map_is_fresh(key):
+            known = self.site_index.known_urls(key)
+            logger.info(f"Using indexed map of {url} with {len(known)} URLs")
+            note_cache_hit("site_index")
+            return MapDiff(site=site, known=known, from_index=True)
+        
+        # Map the website
+        result = self.client.map(
+            url=url,
+            limit=limit,
+            includeSubdomains=include_subdomains
+        )
+        
+        logger.info(f"Successfully mapped {url}, found {len(result)} URLs")
+        
+        if self.site_index is None:
+            return MapDiff(site=site, new=list(result))
+        return self.site_index.record_map(key, site, result)
+    
+    def _get_http_client(self) -> httpx.Client:
+        if self.http_client is None:
+            self.http_client = httpx.Client(timeout=httpx.Timeout(15.0, connect=5.0))
+        return self.http_client
+    
+    def scrape_site_updates(self, 
+                            url: str, 
+                            limit: int = 100, 
+                            max_concurrency: int = 8, 
+                            per_domain_limit: int = 2, 
+                            query: Optional[str] = None) -> str:
+        """
+        Scrape only the pages of a website that are new or changed since the last visit.
+        
+        Known pages are checked with a cheap conditional request first, and are
+        only scraped when the site reports a change; pages whose scraped content
+        turns out identical are left out of the result.
+        
+        Args:
+            url (str): Starting URL of the website.
+            limit (int, optional): Maximum number of URLs to consider.
+            max_concurrency (int, optional): Maximum requests in flight overall.
+            per_domain_limit (int, optional): Maximum requests in flight per website.
+            query (str, optional): What you are looking for; used to keep the most relevant parts.
+            
+        Returns:
+            str: A summary of what changed, followed by the new and changed pages.
+        """
+        logger.info(f"Checking website for updates: {url}")
+        
+        try:
+            diff = self._map_site(url, limit)
+            
+            # Ask the site which known pages changed, without scraping them
+            candidates = list(diff.new)
+            unchanged = 0
+            validators = {}
+            known = []
+            for page_url in diff.known:
+                state = self.site_index.page(page_url)
+                if state is None or state.last_scraped is None:
+                    candidates.append(page_url)
+                else:
+                    known.append((page_url, state))
+            
+            http_client = self._get_http_client()
+            checks = iter_polite(
+                [page_url for page_url, _ in known],
+                lambda page_url: check_changed(http_client, page_url, *self.site_index.validators(page_url)),
+                max_concurrency=max_concurrency,
+                per_domain_limit=per_domain_limit,
+            )
+            for page_url, checked, error in checks:
+                changed, etag, last_modified = checked if error is None else (True, None, None)
+                if changed:
+                    candidates.append(page_url)
+                    validators[page_url] = (etag, last_modified)
+                else:
+                    unchanged += 1
+            
+            def scrape_with_validators(page_url):
+                # new pages and pages without validators need a HEAD for them; it runs on the
+                # same worker, so it shares the scrape's concurrency and per-domain limits
+                result = self._scrape(page_url)
+                etag, last_modified = validators.get(page_url) or (None, None)
+                if not etag and not last_modified:
+                    etag, last_modified = fetch_validators(http_client, page_url)
+                return result, etag, last_modified
+            
+            # Scrape the candidates and keep the pages whose content really changed
+            pages = []
+            same_content = 0
+            failures = 0
+            scrapes = iter_polite(
+                dedupe_urls(candidates),
+                scrape_with_validators,
+                max_concurrency=max_concurrency,
+                per_domain_limit=per_domain_limit,
+            )
+            for page_url, scraped, error in scrapes:
+                if error is not None:
+                    failures += 1
+                    logger.warning(f"Failed to scrape webpage: {error}")
+                    continue
+                result, etag, last_modified = scraped
+                if self.site_index.record_scrape(page_url, result.get("markdown") or "", etag, last_modified):
+                    pages.append((page_url, result))
+                else:
+                    same_content += 1
+            
+            new_pages = set(diff.new)
+            changed = sum(1 for page_url, _ in pages if page_url not in new_pages)
+            summary = (
+                f"{len(diff.new)} new pages, {changed} changed, "
+                f"{unchanged + same_content} unchanged (skipped {unchanged} without scraping), {failures} failed"
+            )
+            logger.info(f"Site updates for {url}: {summary}")
+            
+            if self.structured:
+                chunks = rank_documents([self._document(u, r) for u, r in pages], query, self.token_budget)
+                return render_chunks(chunks, self.output_format, header=f"# Updates on {url}\n\n{summary}",
+                                     extra={"url": url, "summary": summary})
+            
+            formatted_output = [f"# Updates on {url}\n", summary]
+            formatted_output.extend(self._format_page(u, r) for u, r in pages)
+            return "\n\n---\n\n".join(formatted_output)
+            
+        except Exception as e:
+            logger.warning(f"Failed to check website for updates: {e}")
+            return f"Error checking website '{url}' for updates: {e}"
 
 
 # Example usage with Agno Agent
@@ -0,0 +1,375 @@
+"""
+Per-tool-call instrumentation for the agent toolkits.
+
+`instrument_toolkit` wraps every function a toolkit registered, both the
+entrypoint the agent calls and the method on the instance, so direct calls
+are measured too. Each call becomes a `ToolCall` with its duration, output
+size (bytes and estimated tokens), error, cache hits and upstream token
+usage with an estimated cost. Code running inside a tool call reports cache
+hits and usage with `note_cache_hit` and `note_usage`. `ToolMetrics` collects
+the calls. It appends them to a JSONL file, renders Prometheus text (to a
+file or a small HTTP endpoint), and prints a flame-style breakdown of where
+an analysis spent its time.
+"""
+
+import contextvars
+import functools
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from tool_output import estimate_tokens
+
+# USD per million tokens (input, output); request fees not included
+MODEL_PRICES = {
+    "sonar": (1.0, 1.0),
+    "sonar-pro": (3.0, 15.0),
+    "sonar-reasoning": (1.0, 5.0),
+    "sonar-reasoning-pro": (2.0, 8.0),
+}
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_current_call: contextvars.ContextVar = contextvars.ContextVar("current_tool_call", default=None)
+_note_lock = threading.Lock()
+
+
+@dataclass
+class ToolCall:
+    """One measured tool call."""
+    toolkit: str
+    tool: str
+    started_at: float  # wall clock (time.time())
+    duration: float = 0.0
+    ok: bool = True
+    error: Optional[str] = None
+    output_bytes: int = 0
+    output_tokens: int = 0  # estimated from the returned text
+    cache_hits: Dict[str, int] = field(default_factory=dict)
+    usage: Dict[str, int] = field(default_factory=dict)  # upstream prompt/completion tokens
+    cost_usd: float = 0.0
+    args: str = ""
+
+    @property
+    def name(self) -> str:
+        return f"{self.toolkit}.{self.tool}"
+
+
+def note_cache_hit(kind: str) -> None:
+    """
+    Record that the running tool call was (partly) served from a cache.
+
+    Args:
+        kind (str): Which cache, e.g. "semantic" or "research_cache".
+    """
+    call = _current_call.get()
+    if call is not None:
+        with _note_lock:
+            call.cache_hits[kind] = call.cache_hits.get(kind, 0) + 1
+
+
+def note_usage(model: str, prompt_tokens: int, completion_tokens: int) -> None:
+    """
+    Record upstream token usage of the running tool call and its estimated cost.
+
+    Args:
+        model (str): Model that was called, used to look up `MODEL_PRICES`.
+        prompt_tokens (int): Input tokens.
+        completion_tokens (int): Output tokens.
+    """
+    call = _current_call.get()
+    if call is None:
+        return
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    with _note_lock:
+        call.usage["prompt_tokens"] = call.usage.get("prompt_tokens", 0) + (prompt_tokens or 0)
+        call.usage["completion_tokens"] = call.usage.get("completion_tokens", 0) + (completion_tokens or 0)
+        call.cost_usd += ((prompt_tokens or 0) * input_price + (completion_tokens or 0) * output_price) / 1e6
+
+
+def submit_in_context(pool, fn, *args):
+    """
+    Submit work to a thread pool so that it still counts towards the running tool call.
+
+    Args:
+        pool (ThreadPoolExecutor): The pool.
+        fn (Callable): Work to run.
+
+    Returns:
+        Future: The submitted work.
+    """
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _preview(args: tuple, kwargs: dict, limit: int = 200) -> str:
+    text = ", ".join([repr(a) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items()])
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _union_seconds(intervals: List[Tuple[float, float]]) -> float:
+    # concurrent calls overlap, so their time is merged instead of added up
+    total = 0.0
+    end = None
+    for start, stop in sorted(intervals):
+        if end is None or start > end:
+            total += stop - start
+            end = stop
+        elif stop > end:
+            total += stop - end
+            end = stop
+    return total
+
+
+class ToolMetrics:
+    """
+    Collects tool calls and exports them.
+
+    Args:
+        jsonl_path (str, optional): Append every finished call to this JSONL file.
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None):
+        self.jsonl_path = jsonl_path
+        self.calls: List[ToolCall] = []
+        self._lock = threading.Lock()
+
+    def record(self, call: ToolCall) -> None:
+        with self._lock:
+            self.calls.append(call)
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(asdict(call), ensure_ascii=False) + "\n")
+
+    def mark(self) -> int:
+        """Position to pass to `flame_summary` to only summarize calls made after it."""
+        with self._lock:
+            return len(self.calls)
+
+    def prometheus(self) -> str:
+        """
+        Render all calls so far in the Prometheus text exposition format.
+
+        Returns:
+            str: Counters and a duration histogram per toolkit and tool.
+        """
+        with self._lock:
+            calls = list(self.calls)
+        groups: Dict[Tuple[str, str], List[ToolCall]] = {}
+        for call in calls:
+            groups.setdefault((call.toolkit, call.tool), []).append(call)
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        def labels(toolkit, tool, **extra):
+            pairs = [("toolkit", toolkit), ("tool", tool)] + list(extra.items())
+            return "{" + ",".join(f'{k}="{_label(str(v))}"' for k, v in pairs) + "}"
+
+        samples = []
+        for (toolkit, tool), group in groups.items():
+            for status in ("ok", "error"):
+                count = sum(1 for c in group if c.ok == (status == "ok"))
+                samples.append(f"agent_tool_calls_total{labels(toolkit, tool, status=status)} {count}")
+        metric("agent_tool_calls_total", "counter", "Tool calls by outcome.", samples)
+
+        samples = []
+        for (toolkit, tool), group in groups.items():
+            for bucket in DURATION_BUCKETS:
+                count = sum(1 for c in group if c.duration <= bucket)
+                samples.append(f"agent_tool_call_duration_seconds_bucket{labels(toolkit, tool, le=bucket)} {count}")
+            samples.append(f"agent_tool_call_duration_seconds_bucket{labels(toolkit, tool, le='+Inf')} {len(group)}")
+            samples.append(f"agent_tool_call_duration_seconds_sum{labels(toolkit, tool)} "
+                           f"{sum(c.duration for c in group):.6f}")
+            samples.append(f"agent_tool_call_duration_seconds_count{labels(toolkit, tool)} {len(group)}")
+        metric("agent_tool_call_duration_seconds", "histogram", "Tool call duration.", samples)
+
+        metric("agent_tool_output_bytes_total", "counter", "Bytes returned to the model.",
+               [f"agent_tool_output_bytes_total{labels(*key)} {sum(c.output_bytes for c in group)}"
+                for key, group in groups.items()])
+        metric("agent_tool_output_tokens_total", "counter", "Estimated tokens returned to the model.",
+               [f"agent_tool_output_tokens_total{labels(*key)} {sum(c.output_tokens for c in group)}"
+                for key, group in groups.items()])
+
+        samples = []
+        for key, group in groups.items():
+            kinds = sorted({kind for c in group for kind in c.cache_hits})
+            for kind in kinds:
+                samples.append(f"agent_tool_cache_hits_total{labels(*key, cache=kind)} "
+                               f"{sum(c.cache_hits.get(kind, 0) for c in group)}")
+        metric("agent_tool_cache_hits_total", "counter", "Results served from a cache.", samples)
+
+        samples = []
+        for key, group in groups.items():
+            for kind in ("prompt_tokens", "completion_tokens"):
+                total = sum(c.usage.get(kind, 0) for c in group)
+                if total:
+                    samples.append(f"agent_tool_upstream_tokens_total{labels(*key, type=kind)} {total}")
+        metric("agent_tool_upstream_tokens_total", "counter", "Tokens billed by the upstream API.", samples)
+        metric("agent_tool_cost_usd_total", "counter", "Estimated upstream cost in USD.",
+               [f"agent_tool_cost_usd_total{labels(*key)} {sum(c.cost_usd for c in group):.6f}"
+                for key, group in groups.items()])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Write the Prometheus text to a file, e.g. for node_exporter's textfile collector.
+
+        Args:
+            path (str): Output file.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+
+    def serve_prometheus(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        Serve the Prometheus text at http://host:port/metrics from a background thread.
+
+        Args:
+            port (int): Port to listen on.
+            host (str, optional): Interface to bind.
+
+        Returns:
+            ThreadingHTTPServer: The running server; call `shutdown()` to stop it.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                data = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def flame_summary(self, since: int = 0, wall: Optional[float] = None, width: int = 40) -> str:
+        """
+        Show where the time of a run went, as indented bars.
+
+        Tool calls are grouped by tool. Whatever part of the wall time no tool
+        call covered is model time and orchestration.
+
+        Args:
+            since (int, optional): Only include calls after this `mark()`.
+            wall (float, optional): Wall time of the run; defaults to first call start to last call end.
+            width (int, optional): Width of a full bar.
+
+        Returns:
+            str: The summary, one line per tool.
+        """
+        with self._lock:
+            calls = self.calls[since:]
+        if not calls:
+            return "No tool calls recorded."
+        intervals = [(c.started_at, c.started_at + c.duration) for c in calls]
+        if wall is None:
+            wall = max(end for _, end in intervals) - min(start for start, _ in intervals)
+        wall = max(wall, 1e-9)
+        in_tools = _union_seconds(intervals)
+
+        def bar(seconds):
+            return "█" * round(width * min(seconds, wall) / wall) or ("▏" if seconds > 0 else "")
+
+        groups: Dict[str, List[ToolCall]] = {}
+        for call in calls:
+            groups.setdefault(call.name, []).append(call)
+        rows = [("run (wall)", wall, "", 0)]
+        rows.append(("tool calls (overlap merged)", in_tools, "", 1))
+        for name, group in sorted(groups.items(), key=lambda item: -sum(c.duration for c in item[1])):
+            hits = sum(sum(c.cache_hits.values()) for c in group)
+            errors = sum(1 for c in group if not c.ok)
+            tokens = sum(c.output_tokens for c in group)
+            cost = sum(c.cost_usd for c in group)
+            detail = f"{len(group)} calls, ~{tokens} tok out"
+            if hits:
+                detail += f", {hits} cache hits"
+            if errors:
+                detail += f", {errors} errors"
+            if cost:
+                detail += f", ${cost:.4f}"
+            rows.append((name, sum(c.duration for c in group), detail, 2))
+        rows.append(("model + orchestration", max(0.0, wall - in_tools), "", 1))
+
+        label_width = max(len("  " * depth + label) for label, _, _, depth in rows)
+        lines = []
+        for label, seconds, detail, depth in rows:
+            label = "  " * depth + label
+            lines.append(f"{label:<{label_width}} {seconds:7.1f}s {seconds / wall:5.0%} {bar(seconds):<{width}} {detail}".rstrip())
+        return "\n".join(lines)
+
+
+def instrument_toolkit(toolkit, metrics: ToolMetrics):
+    """
+    Measure every registered function of a toolkit.
+
+    A tool that calls another instrumented tool (`search_with_citations`
+    calls `query_perplexity`) is counted once, as the outer call.
+    Instrumenting a toolkit twice is a no-op.
+
+    Args:
+        toolkit (Toolkit): The toolkit, after its functions were registered.
+        metrics (ToolMetrics): Receives the calls.
+
+    Returns:
+        Toolkit: The same toolkit.
+    """
+    if getattr(toolkit, "_instrumented", False):
+        return toolkit
+
+    def wrap(tool: str, fn):
+        @functools.wraps(fn)
+        def instrumented(*args, **kwargs):
+            if _current_call.get() is not None:
+                return fn(*args, **kwargs)
+            call = ToolCall(toolkit=toolkit.name, tool=tool, started_at=time.time(), args=_preview(args, kwargs))
+            token = _current_call.set(call)
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                call.ok, call.error = False, f"{e.__class__.__name__}: {e}"
+                raise
+            else:
+                text = result if isinstance(result, str) else str(result)
+                # the toolkits report failures as "Error..." strings instead of raising
+                if text.startswith("Error"):
+                    call.ok, call.error = False, text[:200]
+                call.output_bytes = len(text.encode("utf-8"))
+                call.output_tokens = estimate_tokens(text)
+                return result
+            finally:
+                call.duration = time.perf_counter() - start
+                _current_call.reset(token)
+                metrics.record(call)
+        return instrumented
+
+    for tool, function in toolkit.functions.items():
+        method = getattr(toolkit, tool, None)
+        if method is None:
+            continue
+        wrapped = wrap(tool, method)
+        setattr(toolkit, tool, wrapped)
+        function.entrypoint = wrapped
+    toolkit._instrumented = True
+    return toolkit
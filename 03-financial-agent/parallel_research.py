@@ -0,0 +1,153 @@
+"""
+Parallel fan-out of the research stage.
+
+In `coordinate` mode the team leader calls the researcher, waits, then lets
+the analyst look things up one query at a time. The research calls do not
+depend on each other, so here they are dispatched together on a thread pool:
+one Firecrawl deep research on the coin plus a Perplexity query per
+sub-question. The merged findings are handed to the analyst for the decision.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from agno.utils.log import logger
+
+DEFAULT_SUB_QUESTIONS = [
+    "What is the latest news and market sentiment around {crypto}?",
+    "What are the current price trend, trading volume and key technical levels of {crypto}?",
+    "What regulatory, security or macroeconomic risks could affect {crypto} in the coming weeks?",
+]
+
+
+class StageTimer:
+    """
+    Records how long each stage of an analysis takes.
+
+    Stages may run concurrently on several threads, so updates and reads of
+    the stage table go through a lock.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time the enclosed block as one stage.
+
+        Args:
+            name (str): Stage name shown in the summary.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages[name] = elapsed
+
+    def summary(self) -> str:
+        """
+        Format the stage timings as a Markdown table.
+
+        Returns:
+            str: One row per stage plus the wall time since the timer was created.
+        """
+        lines = ["| Stage | Seconds |", "| --- | ---: |"]
+        with self._lock:
+            stages = list(self.stages.items())
+        for name, seconds in stages:
+            lines.append(f"| {name} | {seconds:.1f} |")
+        lines.append(f"| **Total (wall)** | {time.perf_counter() - self._start:.1f} |")
+        return "\n".join(lines)
+
+
+@dataclass
+class ResearchBundle:
+    """The results of one fan-out, keyed by task."""
+    crypto_name: str
+    deep_research: Optional[str] = None
+    answers: Dict[str, str] = field(default_factory=dict)
+
+    def to_markdown(self) -> str:
+        """
+        Merge the research into a single report for the analyst.
+
+        Returns:
+            str: The deep research followed by every sub-question answer.
+        """
+        parts = [f"# Research on {self.crypto_name}\n"]
+        if self.deep_research:
+            parts.append(self.deep_research)
+        for question, answer in self.answers.items():
+            parts.append(f"\n## {question}\n\n{answer}")
+        return "\n".join(parts)
+
+
+def run_parallel_research(crypto_name: str,
+                          firecrawl_tools,
+                          perplexity_tools,
+                          sub_questions: Optional[List[str]] = None,
+                          max_workers: int = 4,
+                          timer: Optional[StageTimer] = None,
+                          deep_research_kwargs: Optional[dict] = None) -> ResearchBundle:
+    """
+    Run the Firecrawl deep research and the Perplexity sub-questions concurrently.
+
+    The toolkit methods already turn API failures into error strings, so one
+    failed lookup does not cancel the others.
+
+    Args:
+        crypto_name (str): Cryptocurrency to research.
+        firecrawl_tools (FirecrawlTools): Toolkit used for the deep research.
+        perplexity_tools (PerplexityTools): Toolkit used for the sub-questions.
+        sub_questions (List[str], optional): Question templates; `{crypto}` is replaced by the coin name.
+        max_workers (int, optional): Maximum concurrent requests.
+        timer (StageTimer, optional): Receives one stage per task.
+        deep_research_kwargs (dict, optional): Extra arguments for `deep_research`.
+
+    Returns:
+        ResearchBundle: The deep research and the answer to each sub-question.
+    """
+    if sub_questions is None:
+        sub_questions = DEFAULT_SUB_QUESTIONS
+    questions = [q.format(crypto=crypto_name) for q in sub_questions]
+    timer = timer or StageTimer()
+    bundle = ResearchBundle(crypto_name=crypto_name)
+
+    def timed(name, fn, *args, **kwargs):
+        with timer.stage(name):
+            return fn(*args, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="research") as pool:
+        futures = {
+            pool.submit(timed, "Firecrawl deep research", firecrawl_tools.deep_research,
+                        f"{crypto_name} cryptocurrency: fundamentals, recent news, price action and outlook",
+                        **(deep_research_kwargs or {})): None
+        }
+        for i, question in enumerate(questions, 1):
+            futures[pool.submit(timed, f"Perplexity sub-question {i}",
+                                perplexity_tools.query_perplexity, question)] = question
+
+        for future in as_completed(futures):
+            question = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.warning(f"Research task failed: {e}")
+                result = f"Error: {e}"
+            if question is None:
+                bundle.deep_research = result
+            else:
+                bundle.answers[question] = result
+
+    # keep the sub-questions in the order they were asked
+    bundle.answers = {q: bundle.answers[q] for q in questions if q in bundle.answers}
+    return bundle
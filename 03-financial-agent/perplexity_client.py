@@ -0,0 +1,216 @@
+"""
+Pooled, retrying Perplexity client that coalesces identical in-flight requests.
+
+Team members often send the same lookup at almost the same moment, and a
+burst of queries runs into 429s, which the toolkit used to report as a failed
+answer. `PerplexityClient` sits between the toolkit and the OpenAI-compatible
+API, on the keep-alive connection pool it is given (the registry passes its
+shared pool, see `client_registry.get_http_client`). It retries rate limits,
+5xx responses and connection errors with jittered exponential backoff
+(honoring Retry-After), under a per-attempt timeout and an overall deadline.
+Identical requests that are in flight at the same time wait for a single
+upstream call and share its response.
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import httpx
+import openai
+from openai import OpenAI
+
+from agno.utils.log import logger
+
+from instrumentation import note_cache_hit, note_usage
+
+PERPLEXITY_BASE_URL = "https://api.perplexity.ai"
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+@dataclass
+class RetryPolicy:
+    """
+    When and how long to wait before retrying a failed request.
+
+    Args:
+        max_retries (int): Retries after the first attempt.
+        base_delay (float): Backoff before the first retry, in seconds; doubles per retry.
+        max_delay (float): Cap on a single backoff.
+        total_timeout (float): Give up once this many seconds passed since the first attempt.
+    """
+    max_retries: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    total_timeout: float = 120.0
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Seconds to wait before retry number `attempt` (starting at 1).
+
+        Uses "full jitter" (a random delay up to the exponential cap), so
+        clients that failed together do not all retry together.
+
+        Args:
+            attempt (int): The retry about to be made.
+            retry_after (float, optional): Delay the server asked for.
+
+        Returns:
+            float: Seconds to sleep.
+        """
+        cap = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        delay = random.uniform(0, cap)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Whether a failed request is worth retrying: timeouts, connection errors, 429 and 5xx.
+
+    Args:
+        error (Exception): The error raised by the OpenAI SDK.
+
+    Returns:
+        bool: True for transient failures.
+    """
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRY_STATUS_CODES
+    return False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None  # HTTP-date form, fall back to our own backoff
+
+
+class PerplexityClient:
+    """
+    Chat completions against Perplexity with retries, timeouts and request coalescing.
+
+    Args:
+        api_key (str): Perplexity API key.
+        http_client (httpx.Client, optional): Connection pool, e.g. `client_registry.get_http_client()`;
+            defaults to a pool of this client's own.
+        base_url (str, optional): API base URL, e.g. a local mock server.
+        timeout (float, optional): Seconds allowed per attempt.
+        retry (RetryPolicy, optional): Retry settings.
+    """
+
+    def __init__(self,
+                 api_key: str,
+                 http_client: Optional[httpx.Client] = None,
+                 base_url: str = PERPLEXITY_BASE_URL,
+                 timeout: float = 60.0,
+                 retry: Optional[RetryPolicy] = None):
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        # retries are handled here, so the SDK's own retry loop is switched off
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0, http_client=http_client)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failures = 0
+
+    @staticmethod
+    def request_key(model: str, messages: List[Dict[str, Any]], **kwargs) -> str:
+        payload = json.dumps({"model": model, "messages": messages, "kwargs": kwargs},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def create(self, model: str, messages: List[Dict[str, Any]], **kwargs):
+        """
+        Run a chat completion, sharing the upstream call with identical requests in flight.
+
+        Args:
+            model (str): Perplexity model.
+            messages (list): Chat messages.
+            **kwargs: Further `chat.completions.create` arguments.
+
+        Returns:
+            ChatCompletion: The response (the same object for coalesced callers).
+
+        Raises:
+            openai.OpenAIError: When the request failed after all retries.
+        """
+        key = self.request_key(model, messages, **kwargs)
+        with self._lock:
+            self.calls += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+        if not leader:
+            note_cache_hit("coalesced")
+
+        if leader:
+            try:
+                future.set_result(self._create_with_retries(model, messages, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        return future.result()
+
+    def _create_with_retries(self, model: str, messages: List[Dict[str, Any]], **kwargs):
+        deadline = time.monotonic() + self.retry.total_timeout
+        attempt = 0
+        while True:
+            # an attempt never runs past the overall deadline
+            timeout = min(self.timeout, deadline - time.monotonic())
+            with self._lock:
+                self.upstream_calls += 1
+            try:
+                response = self.client.chat.completions.create(
+                    model=model, messages=messages, timeout=timeout, **kwargs
+                )
+            except Exception as e:
+                attempt += 1
+                if not is_retryable(e) or attempt > self.retry.max_retries:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                delay = self.retry.backoff(attempt, retry_after_seconds(e))
+                if time.monotonic() + delay >= deadline:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+                with self._lock:
+                    self.retries += 1
+                logger.info(f"Perplexity request failed ({e.__class__.__name__}), "
+                            f"retry {attempt}/{self.retry.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            # billed once, by the caller that made the upstream call
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                note_usage(model, getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0))
+            return response
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "upstream_calls": self.upstream_calls,
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "failures": self.failures,
+            }
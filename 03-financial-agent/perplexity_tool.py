@@ -1,11 +1,20 @@
-from openai import OpenAI
+import httpx
 import os
-from typing import Optional, List, Dict, Any
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Tuple
 
 from agno.agent import Agent
 from agno.tools import Toolkit
 from agno.utils.log import logger
 
+from concurrent_scrape import canonical_url
+from instrumentation import note_cache_hit, submit_in_context
+from perplexity_client import PerplexityClient
+from semantic_cache import SemanticCache
+
+CITATION_MARKER = re.compile(r" ?\[(\d+)\]")
+
 
 class PerplexityTools(Toolkit):
     """
@@ -19,13 +28,23 @@ class PerplexityTools(Toolkit):
         "engage in a helpful, detailed, polite conversation with a user."
     )
     
-    def __init__(self, api_key: Optional[str] = None, model: str = "sonar-pro"):
+    def __init__(self, 
+                 api_key: Optional[str] = None, 
+                 model: str = "sonar-pro", 
+                 http_client: Optional[httpx.Client] = None, 
+                 client: Optional[PerplexityClient] = None, 
+                 max_parallel: int = 4, 
+                 semantic_cache: Optional[SemanticCache] = None):
         """
         Initialize the PerplexityTools toolkit.
         
         Args:
             api_key (str, optional): Perplexity API key. If None, uses PERPLEXITY_API_KEY environment variable.
             model (str, optional): Perplexity model to use.
+            http_client (httpx.Client, optional): Shared keep-alive connection pool, e.g. `client_registry.get_http_client()`. If None, the client uses a pool of its own.
+            client (PerplexityClient, optional): Retrying, coalescing client to share between toolkits. If None, one is created.
+            max_parallel (int, optional): Questions `query_many` sends at the same time.
+            semantic_cache (SemanticCache, optional): Reuses answers to the same or rephrased questions.
         """
         super().__init__(name="perplexity_tools")  
         
@@ -39,45 +58,62 @@ class PerplexityTools(Toolkit):
         
         self.api_key = api_key
         self.model = model
-        self.client = OpenAI(api_key=self.api_key, base_url="https://api.perplexity.ai")
+        self.max_parallel = max_parallel
+        self.semantic_cache = semantic_cache
+        self.client = client or PerplexityClient(api_key=self.api_key, http_client=http_client)
         
         # Register the methods that can be called by the agent
         self.register(self.query_perplexity)
         self.register(self.search_with_citations)
+        self.register(self.query_many)
     
-    def query_perplexity(self, query: str, system_prompt: Optional[str] = None) -> str:
+    def _ask(self, query: str, system_prompt: Optional[str] = None) -> Tuple[str, List[str]]:
         """
-        Query Perplexity AI with a specific question and return the response content as a formatted string.
+        Send one question to Perplexity.
         
         Args:
-            query (str): The user's question to ask Perplexity.
+            query (str): The question.
             system_prompt (str, optional): The system prompt to guide the AI's behavior.
             
         Returns:
-            str: Formatted response from Perplexity AI.
+            tuple: The answer text and its citation URLs.
         """
-        logger.info(f"Querying Perplexity AI: {query}")
-        
-        # Use default system prompt if not provided
-        if system_prompt is None:
-            system_prompt = self.DEFAULT_SYSTEM_PROMPT
+        system_prompt = system_prompt or self.DEFAULT_SYSTEM_PROMPT
+        scope = SemanticCache.make_scope(self.model, system_prompt)
+        if self.semantic_cache is not None:
+            hit = self.semantic_cache.lookup("perplexity", query, scope=scope)
+            if hit is not None:
+                note_cache_hit("semantic")
+                logger.info(f"Using cached answer ({hit.similarity:.2f} similar, {hit.age / 60:.0f} min old): {hit.query}")
+                return hit.value["content"], hit.value["citations"]
         
-        # Set up messages
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": query},
         ]
+        # Retried on 429/5xx, shared with identical queries in flight
+        response = self.client.create(model=self.model, messages=messages)
+        content = response.choices[0].message.content
+        citations = list(getattr(response, 'citations', None) or [])
+        if self.semantic_cache is not None:
+            self.semantic_cache.store("perplexity", query, {"content": content, "citations": citations}, scope=scope)
+        return content, citations
+    
+    def query_perplexity(self, query: str, system_prompt: Optional[str] = None) -> str:
+        """
+        Query Perplexity AI with a specific question and return the response content as a formatted string.
         
-        try:
-            # Make API call
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-            )
+        Args:
+            query (str): The user's question to ask Perplexity.
+            system_prompt (str, optional): The system prompt to guide the AI's behavior.
             
-            # Extract content and citations
-            content = response.choices[0].message.content
-            citations = response.citations if hasattr(response, 'citations') else []
+        Returns:
+            str: Formatted response from Perplexity AI.
+        """
+        logger.info(f"Querying Perplexity AI: {query}")
+        
+        try:
+            content, citations = self._ask(query, system_prompt)
             
             logger.info(f"Received response with {len(citations)} citations")
             
@@ -96,6 +132,88 @@ class PerplexityTools(Toolkit):
             logger.warning(f"Failed to query Perplexity AI: {e}")
             return f"Error: Failed to query Perplexity AI: {e}"
     
+    def query_many(self, 
+                   questions: List[str], 
+                   system_prompt: Optional[str] = None, 
+                   max_parallel: Optional[int] = None) -> str:
+        """
+        Ask Perplexity several questions at once and return one combined answer.
+        
+        Use this instead of calling `query_perplexity` repeatedly when there are
+        several follow-up questions: they are sent concurrently, and the citations
+        of all answers are merged into one numbered list without duplicates.
+        
+        Args:
+            questions (List[str]): The questions to ask; duplicates are asked once.
+            system_prompt (str, optional): The system prompt to guide the AI's behavior.
+            max_parallel (int, optional): Questions in flight at the same time. Defaults to the toolkit setting.
+            
+        Returns:
+            str: Each question with its answer, followed by the merged citations.
+        """
+        if isinstance(questions, str):
+            questions = questions.splitlines()
+        unique = list(dict.fromkeys(q.strip() for q in questions if q and q.strip()))
+        if not unique:
+            return "Error: No questions given."
+        logger.info(f"Querying Perplexity AI with {len(unique)} questions")
+        
+        def ask(question):
+            try:
+                return self._ask(question, system_prompt), None
+            except Exception as e:
+                logger.warning(f"Failed to query Perplexity AI: {e}")
+                return None, e
+        
+        workers = max(1, min(max_parallel or self.max_parallel, len(unique)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="perplexity") as pool:
+            # submitted in context, so cache hits and usage count towards this call
+            results = [f.result() for f in [submit_in_context(pool, ask, q) for q in unique]]
+        
+        # One citation list for all answers; each answer's [n] markers point into it
+        merged: List[str] = []
+        positions: Dict[str, int] = {}
+        answers = []
+        for question, (answer, error) in zip(unique, results):
+            if error is not None:
+                answers.append((question, None, None, error))
+                continue
+            content, citations = answer
+            renumber = {}
+            for n, url in enumerate(citations, 1):
+                try:
+                    key = canonical_url(url)
+                except ValueError:
+                    key = url  # e.g. a bad port; still merged, by its exact spelling
+                if key not in positions:
+                    merged.append(url)
+                    positions[key] = len(merged)
+                renumber[n] = positions[key]
+            answers.append((question, content, renumber, None))
+        
+        def remap(match, renumber):
+            n = int(match.group(1))
+            if n in renumber:
+                return match.group(0).replace(f"[{n}]", f"[{renumber[n]}]")
+            # a marker past the answer's own list would point at another answer's source;
+            # other bracketed numbers ("[2024]") are not citations
+            return "" if 1 <= n <= len(merged) else match.group(0)
+        
+        sections = []
+        for i, (question, content, renumber, error) in enumerate(answers, 1):
+            if error is not None:
+                sections.append(f"### {i}. {question}\nError: {error}")
+                continue
+            content = CITATION_MARKER.sub(lambda match: remap(match, renumber), content)
+            sections.append(f"### {i}. {question}\n{content.strip()}")
+        
+        formatted_response = "\n\n".join(sections)
+        if merged:
+            formatted_response += "\n\n**Citations:**\n"
+            formatted_response += "".join(f"{n}. {url}\n" for n, url in enumerate(merged, 1))
+        logger.info(f"Answered {len(unique)} questions with {len(merged)} distinct citations")
+        return formatted_response
+    
     def search_with_citations(self, 
                               query: str, 
                               system_prompt: Optional[str] = None,
@@ -0,0 +1,361 @@
+"""
+Record and replay of Gemini, FireCrawl and Perplexity exchanges.
+
+The pipeline could only run against the live APIs, so every measurement
+cost money and depended on the network. A `Cassette` sits in front of the
+three clients. In record mode it passes each call through and stores the
+request and response with the time it took. In replay mode it answers from
+the fixture without any network access, after an injected delay (the
+recorded latency times a scale factor, or a fixed value per service).
+
+Requests are matched by a hash of their content. A call with no matching
+recording (e.g. a prompt changed) raises `ReplayMissError`, so a stale
+fixture fails loudly instead of answering with another call's response.
+Repeated polls of the same request (deep research status) replay their
+recorded sequence and then keep returning the last response. With
+`order_fallback=True`, an unmatched call takes the next unused recording of
+the same method instead; which call gets which recording then depends on
+thread timing, so it is only meant for a quick look at a half-stale
+fixture. `client_registry.use_cassette` installs a cassette so every shared
+client goes through it.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+RECORD = "record"
+REPLAY = "replay"
+
+GEMINI = "gemini"
+FIRECRAWL = "firecrawl"
+PERPLEXITY = "perplexity"
+
+_ADDRESS = re.compile(r" at 0x[0-9a-f]+")
+
+
+class ReplayMissError(LookupError):
+    """Raised when a replayed call has no recording to answer it."""
+
+
+def to_jsonable(obj: Any) -> Any:
+    """
+    Convert SDK requests and responses (pydantic models, dicts, lists) to plain JSON values.
+
+    Args:
+        obj (Any): The object to convert.
+
+    Returns:
+        Any: JSON-serializable data.
+    """
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude_none=True)
+    if isinstance(obj, dict):
+        return {str(key): to_jsonable(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_jsonable(value) for value in obj]
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if callable(obj):
+        return f"<callable {getattr(obj, '__name__', type(obj).__name__)}>"
+    # memory addresses differ between runs and would break matching
+    return _ADDRESS.sub("", str(obj))
+
+
+def request_key(request: Any) -> str:
+    payload = json.dumps(to_jsonable(request), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Interaction:
+    """One recorded call."""
+    service: str
+    method: str
+    key: str
+    response: Any
+    latency: float
+    events: List[Any] = field(default_factory=list)  # callbacks or stream chunks, in order
+
+
+class Cassette:
+    """
+    A fixture file of recorded API calls.
+
+    Args:
+        path (str): JSON fixture file.
+        mode (str, optional): "record" to call the live APIs and store the calls, "replay" to answer from the file.
+        latency_scale (float, optional): Replay delay as a multiple of the recorded latency; 0 answers instantly.
+        latency (dict, optional): Fixed replay delay in seconds per service, overriding the scale.
+        order_fallback (bool, optional): Answer unmatched calls with the next unused recording of the
+            same method instead of raising `ReplayMissError`. Not deterministic when calls run in threads.
+    """
+
+    def __init__(self, path: str, mode: str = REPLAY, latency_scale: float = 1.0,
+                 latency: Optional[Dict[str, float]] = None, order_fallback: bool = False):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"mode must be {RECORD!r} or {REPLAY!r}, got {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.latency = latency or {}
+        self.order_fallback = order_fallback
+        self.interactions: List[Interaction] = []
+        self._lock = threading.Lock()
+        self._by_key: Dict[tuple, deque] = defaultdict(deque)
+        self._by_method: Dict[tuple, deque] = defaultdict(deque)
+        self._last: Dict[tuple, Interaction] = {}
+        self._used = set()
+        self.misses = 0
+        if mode == REPLAY:
+            with open(path, "r", encoding="utf-8") as f:
+                self.interactions = [Interaction(**item) for item in json.load(f)["interactions"]]
+            for i, interaction in enumerate(self.interactions):
+                self._by_key[(interaction.service, interaction.method, interaction.key)].append(i)
+                self._by_method[(interaction.service, interaction.method)].append(i)
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == RECORD
+
+    def record(self, service: str, method: str, request: Any, response: Any,
+               latency: float, events: Optional[List[Any]] = None) -> None:
+        with self._lock:
+            self.interactions.append(Interaction(
+                service=service, method=method, key=request_key(request),
+                response=to_jsonable(response), latency=latency, events=to_jsonable(events or []),
+            ))
+
+    def replay(self, service: str, method: str, request: Any) -> Interaction:
+        """
+        Find the recording that answers a call.
+
+        Args:
+            service (str): "gemini", "firecrawl" or "perplexity".
+            method (str): Client method name.
+            request (Any): The call's arguments.
+
+        Returns:
+            Interaction: The matching recording.
+
+        Raises:
+            ReplayMissError: When no recording matches the call (or, with `order_fallback`, when the
+                fixture has no recording for this method left).
+        """
+        key = (service, method, request_key(request))
+        with self._lock:
+            index = self._next_unused(self._by_key[key])
+            if index is None and key in self._last:
+                return self._last[key]
+            if index is None and self.order_fallback:
+                index = self._next_unused(self._by_method[(service, method)])
+                if index is not None:
+                    self.misses += 1  # answered by order, not by content
+            if index is None:
+                self.misses += 1
+                raise ReplayMissError(f"No recording of this {service}.{method} call in {self.path}; "
+                                      f"the pipeline changed since it was recorded, record it again")
+            self._used.add(index)
+            interaction = self.interactions[index]
+            self._last[key] = interaction
+            return interaction
+
+    def _next_unused(self, queue: deque) -> Optional[int]:
+        while queue and queue[0] in self._used:
+            queue.popleft()
+        return queue.popleft() if queue else None
+
+    def delay(self, interaction: Interaction) -> float:
+        if interaction.service in self.latency:
+            return self.latency[interaction.service]
+        return interaction.latency * self.latency_scale
+
+    def save(self) -> None:
+        """Write the recorded calls to the fixture file (atomically)."""
+        if not self.recording:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"interactions": [asdict(i) for i in self.interactions]}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.save()
+
+    def genai_client(self, client=None):
+        return ReplayGenaiClient(self, client)
+
+    def firecrawl_client(self, client=None):
+        return ReplayFirecrawlClient(self, client)
+
+    def openai_client(self, client=None):
+        return ReplayOpenAIClient(self, client)
+
+
+def _require_live(client: Any, service: str) -> Any:
+    if client is None:
+        raise ValueError(f"Recording {service} calls needs the live client")
+    return client
+
+
+class _GenaiModels:
+    def __init__(self, cassette: Cassette, models=None):
+        self.cassette = cassette
+        self.live = models
+
+    def generate_content(self, *, model: str, contents: Any, config: Any = None, **kwargs):
+        from google.genai import types
+
+        request = {"model": model, "contents": contents, "config": config}
+        if self.cassette.recording:
+            live = _require_live(self.live, GEMINI)
+            start = time.perf_counter()
+            response = live.generate_content(model=model, contents=contents, config=config, **kwargs)
+            self.cassette.record(GEMINI, "generate_content", request, response, time.perf_counter() - start)
+            return response
+        interaction = self.cassette.replay(GEMINI, "generate_content", request)
+        time.sleep(self.cassette.delay(interaction))
+        return types.GenerateContentResponse.model_validate(interaction.response)
+
+    def generate_content_stream(self, *, model: str, contents: Any, config: Any = None, **kwargs) -> Iterator:
+        from google.genai import types
+
+        request = {"model": model, "contents": contents, "config": config}
+        if self.cassette.recording:
+            live = _require_live(self.live, GEMINI)
+            start = time.perf_counter()
+            chunks = []
+            for chunk in live.generate_content_stream(model=model, contents=contents, config=config, **kwargs):
+                chunks.append(chunk)
+                yield chunk
+            self.cassette.record(GEMINI, "generate_content_stream", request, None,
+                                 time.perf_counter() - start, events=chunks)
+            return
+        interaction = self.cassette.replay(GEMINI, "generate_content_stream", request)
+        pause = self.cassette.delay(interaction) / max(1, len(interaction.events))
+        for chunk in interaction.events:
+            time.sleep(pause)
+            yield types.GenerateContentResponse.model_validate(chunk)
+
+
+class ReplayGenaiClient:
+    """
+    Stands in for `google.genai.Client`; model calls are recorded or replayed.
+
+    Args:
+        cassette (Cassette): Where the calls go.
+        client (genai.Client, optional): The live client, required for recording.
+    """
+
+    def __init__(self, cassette: Cassette, client=None):
+        self.cassette = cassette
+        self.live = client
+        self.models = _GenaiModels(cassette, client.models if client is not None else None)
+
+    def __getattr__(self, name):
+        # anything besides model calls (files, caches, ...) goes to the live client unrecorded
+        if self.live is None:
+            raise AttributeError(f"{name} is not available in replay mode")
+        return getattr(self.live, name)
+
+
+class ReplayFirecrawlClient:
+    """
+    Stands in for `FirecrawlApp`; every method call is recorded or replayed.
+
+    Callback arguments such as `on_activity` are left out of the request and
+    receive the recorded callbacks again on replay.
+
+    Args:
+        cassette (Cassette): Where the calls go.
+        client (FirecrawlApp, optional): The live client, required for recording.
+    """
+
+    def __init__(self, cassette: Cassette, client=None):
+        self.cassette = cassette
+        self.live = client
+
+    def __getattr__(self, method: str) -> Callable:
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            callbacks = {name: value for name, value in kwargs.items() if callable(value)}
+            request = {"args": args, "kwargs": {k: v for k, v in kwargs.items() if k not in callbacks}}
+            if self.cassette.recording:
+                live = _require_live(self.live, FIRECRAWL)
+                events = []
+                for name, callback in callbacks.items():
+                    kwargs[name] = self._capture(name, callback, events)
+                start = time.perf_counter()
+                response = getattr(live, method)(*args, **kwargs)
+                self.cassette.record(FIRECRAWL, method, request, response, time.perf_counter() - start, events)
+                return response
+            interaction = self.cassette.replay(FIRECRAWL, method, request)
+            delay = self.cassette.delay(interaction)
+            # spread the delay over the recorded callbacks, as the live job would
+            pause = delay / (len(interaction.events) + 1)
+            for name, payload in interaction.events:
+                time.sleep(pause)
+                if name in callbacks:
+                    callbacks[name](payload)
+            time.sleep(pause)
+            return interaction.response
+
+        return call
+
+    @staticmethod
+    def _capture(name: str, callback: Callable, events: List) -> Callable:
+        def capture(payload):
+            events.append([name, payload])
+            return callback(payload)
+        return capture
+
+
+class _ChatCompletions:
+    def __init__(self, cassette: Cassette, completions=None):
+        self.cassette = cassette
+        self.live = completions
+
+    def create(self, **kwargs):
+        from openai.types.chat import ChatCompletion
+
+        # the timeout does not change the answer
+        request = {k: v for k, v in kwargs.items() if k != "timeout"}
+        if self.cassette.recording:
+            live = _require_live(self.live, PERPLEXITY)
+            start = time.perf_counter()
+            response = live.create(**kwargs)
+            self.cassette.record(PERPLEXITY, "chat.completions.create", request, response,
+                                 time.perf_counter() - start)
+            return response
+        interaction = self.cassette.replay(PERPLEXITY, "chat.completions.create", request)
+        time.sleep(self.cassette.delay(interaction))
+        return ChatCompletion.model_validate(interaction.response)
+
+
+class ReplayOpenAIClient:
+    """
+    Stands in for the OpenAI client used for Perplexity; chat completions are recorded or replayed.
+
+    Args:
+        cassette (Cassette): Where the calls go.
+        client (OpenAI, optional): The live client, required for recording.
+    """
+
+    def __init__(self, cassette: Cassette, client=None):
+        completions = client.chat.completions if client is not None else None
+        self.chat = SimpleNamespace(completions=_ChatCompletions(cassette, completions))
@@ -0,0 +1,190 @@
+"""
+Persistent cache for FireCrawl deep research results.
+
+A deep research job can run for minutes, and agents often ask for the same
+research again within one session or across the morning's runs. Results are
+stored as JSON files keyed by the normalized query plus `max_depth` and
+`max_urls`, together with the structured sources, so they can be re-rendered
+without calling FireCrawl again.
+
+Freshness depends on the topic: price and news queries go stale within
+minutes, while fundamentals stay valid for days. A stale entry can still be
+served for a while (stale-while-revalidate) while a refresh runs in the
+background.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from text_normalize import STOPWORDS, order_words
+
+FRESH = "fresh"
+STALE = "stale"
+MISS = "miss"
+
+# first matching pattern wins: (regex on the normalized query, max age in seconds)
+DEFAULT_TOPIC_MAX_AGE = [
+    (r"\b(price|today|now|latest|news|breaking|sentiment|24h|hourly)\b", 15 * 60),
+    (r"\b(technical|volume|trend|week|weekly|outlook)\b", 2 * 3600),
+    (r"\b(whitepaper|fundamentals|history|team|founder|tokenomics|technology|consensus)\b", 7 * 24 * 3600),
+]
+
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a research query so equivalent phrasings share a cache entry.
+
+    Lowercases, drops punctuation and filler words, and sorts the remaining
+    words, so "Bitcoin price outlook" and "outlook of the bitcoin price" match.
+    Coins, numbers and directions keep their order, so "BTC vs ETH" and
+    "ETH vs BTC" are different queries.
+
+    Args:
+        query (str): The research query.
+
+    Returns:
+        str: The normalized query.
+    """
+    words = re.findall(r"\w+", query.lower())
+    return order_words([w for w in words if w not in STOPWORDS])
+
+
+@dataclass
+class ResearchEntry:
+    """A cached deep research result."""
+    query: str
+    max_depth: int
+    max_urls: int
+    final_analysis: str
+    sources: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: float = 0.0
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+
+class ResearchCache:
+    """
+    File-backed deep research cache with per-topic freshness.
+
+    Args:
+        cache_dir (str, optional): Directory for the JSON entries.
+        default_max_age (float, optional): Seconds an entry is fresh when no topic rule matches.
+        stale_factor (float, optional): A stale entry may still be served, while it is refreshed
+            in the background, for this multiple of its topic's max age past that age.
+        topic_max_age (list, optional): (regex, seconds) rules checked against the normalized query.
+        max_entries (int, optional): Oldest entries are removed beyond this count.
+    """
+
+    def __init__(self,
+                 cache_dir: Optional[str] = None,
+                 default_max_age: float = 6 * 3600,
+                 stale_factor: float = 1.0,
+                 topic_max_age: Optional[List[Tuple[str, float]]] = None,
+                 max_entries: int = 500):
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "firecrawl_research_cache")
+        self.default_max_age = default_max_age
+        self.stale_factor = stale_factor
+        self.topic_max_age = [(re.compile(pattern), seconds)
+                              for pattern, seconds in (topic_max_age or DEFAULT_TOPIC_MAX_AGE)]
+        self.max_entries = max_entries
+        self.stats = {FRESH: 0, STALE: 0, MISS: 0}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, query: str, max_depth: int, max_urls: int) -> str:
+        payload = json.dumps([normalize_query(query), max_depth, max_urls])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def max_age_for(self, query: str) -> float:
+        """
+        Return how long research on this query stays fresh.
+
+        Args:
+            query (str): The research query.
+
+        Returns:
+            float: Max age in seconds.
+        """
+        normalized = normalize_query(query)
+        for pattern, seconds in self.topic_max_age:
+            if pattern.search(normalized):
+                return seconds
+        return self.default_max_age
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def lookup(self, key: str, query: str) -> Tuple[Optional[ResearchEntry], str]:
+        """
+        Look up an entry and classify its freshness.
+
+        Args:
+            key (str): Cache key from `make_key`.
+            query (str): The research query, used to pick the max age.
+
+        Returns:
+            tuple: The entry (None on a miss) and FRESH, STALE or MISS.
+        """
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = ResearchEntry(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            entry = None
+
+        if entry is None:
+            state = MISS
+        elif entry.age <= self.max_age_for(query):
+            state = FRESH
+        elif entry.age <= self.max_age_for(query) * (1 + self.stale_factor):
+            state = STALE
+        else:
+            entry, state = None, MISS
+
+        with self._lock:
+            self.stats[state] += 1
+        return entry, state
+
+    def store(self, key: str, entry: ResearchEntry) -> None:
+        """
+        Save an entry atomically and evict the oldest ones beyond `max_entries`.
+
+        Args:
+            key (str): Cache key from `make_key`.
+            entry (ResearchEntry): The research result.
+        """
+        entry.created_at = entry.created_at or time.time()
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(asdict(entry), f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(key))
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            paths = [os.path.join(self.cache_dir, name)
+                     for name in os.listdir(self.cache_dir) if name.endswith(".json")]
+            if len(paths) <= self.max_entries:
+                return
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:len(paths) - self.max_entries]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.cache_dir, name))
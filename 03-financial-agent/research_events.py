@@ -0,0 +1,281 @@
+"""
+Live event stream for FireCrawl deep research jobs.
+
+A deep research job runs for minutes, and until now its activity only went to
+the log. `DeepResearchStream` starts the job asynchronously and polls its
+status. Every new activity and every newly found source becomes a typed,
+timestamped `ResearchEvent`, delivered through a plain iterator or an async
+iterator. The stream can stop early once enough sources are in, or when a
+custom condition holds, and return the partial findings instead of waiting
+for the full time limit. It uses the firecrawl-py 1.x API, the same one as
+the blocking `deep_research` call. `PhaseBreakdown` adds up how long each research phase
+(search, extract, analyze, ...) took.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# event kinds
+STARTED = "started"
+ACTIVITY = "activity"
+SOURCE = "source"
+COMPLETED = "completed"
+STOPPED_EARLY = "stopped_early"
+FAILED = "failed"
+
+
+def _get(obj: Any, key: str, default: Any = None) -> Any:
+    # the SDK returns dicts in some versions and response objects in others
+    if isinstance(obj, dict):
+        return obj.get(key, default)
+    return getattr(obj, key, default)
+
+
+@dataclass
+class ResearchEvent:
+    """One thing that happened during a research job."""
+    kind: str
+    message: str = ""
+    timestamp: float = 0.0  # wall clock (time.time())
+    elapsed: float = 0.0  # seconds since the job started
+    phase: Optional[str] = None  # activity type, e.g. "search", "extract", "analyze"
+    depth: Optional[int] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    def format(self) -> str:
+        label = self.phase or self.kind
+        return f"[{self.elapsed:6.1f}s] {label}: {self.message}"
+
+
+class PhaseBreakdown:
+    """
+    Aggregates time per research phase from a sequence of events.
+
+    The time between two activities is attributed to the phase of the
+    earlier one, so each phase's total is how long the job spent in it.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._current: Optional[str] = None
+        self._since: Optional[float] = None
+
+    def add(self, event: ResearchEvent) -> None:
+        if self._current is not None and self._since is not None:
+            self.seconds[self._current] = self.seconds.get(self._current, 0.0) + event.elapsed - self._since
+        if event.kind == ACTIVITY and event.phase:
+            self.counts[event.phase] = self.counts.get(event.phase, 0) + 1
+            self._current, self._since = event.phase, event.elapsed
+        elif event.kind in (COMPLETED, STOPPED_EARLY, FAILED):
+            self._current = self._since = None
+
+    def summary(self) -> str:
+        """
+        Format the phase totals as a Markdown table.
+
+        Returns:
+            str: One row per phase with its event count and seconds.
+        """
+        lines = ["| Phase | Events | Seconds |", "| --- | ---: | ---: |"]
+        for phase, seconds in sorted(self.seconds.items(), key=lambda item: -item[1]):
+            lines.append(f"| {phase} | {self.counts.get(phase, 0)} | {seconds:.1f} |")
+        return "\n".join(lines)
+
+
+@dataclass
+class ResearchResult:
+    """The outcome of a streamed research job, complete or cut short."""
+    query: str
+    status: str = "processing"
+    final_analysis: str = ""
+    sources: List[Dict[str, Any]] = field(default_factory=list)
+    activities: List[ResearchEvent] = field(default_factory=list)
+    terminated_early: bool = False
+    elapsed: float = 0.0
+    error: str = ""
+
+    def partial_analysis(self) -> str:
+        """
+        Summarize the findings so far when the job was stopped before its final analysis.
+
+        Returns:
+            str: The job's own activity messages, in order.
+        """
+        lines = [f"Research was stopped early after {self.elapsed:.0f}s with {len(self.sources)} sources. "
+                 "Findings so far:"]
+        lines.extend(f"- {event.message}" for event in self.activities if event.message)
+        return "\n".join(lines)
+
+
+class DeepResearchStream:
+    """
+    Runs a FireCrawl deep research job and streams its progress as events.
+
+    Args:
+        client: FireCrawl client with `async_deep_research` and `check_deep_research_status`.
+        query (str): The research query.
+        params (dict): Research parameters (maxDepth, timeLimit, maxUrls).
+        poll_interval (float, optional): Seconds between status checks.
+        min_sources (int, optional): Stop early once this many sources were found.
+        stop_when (Callable, optional): Stop early when it returns True for the result so far.
+        listeners (list, optional): Callables that receive every event as it is emitted.
+        deadline_margin (float, optional): Seconds past the job's timeLimit after which
+            polling gives up and the findings so far are returned.
+
+    Stopping early (or at the deadline) only stops polling. The SDK has no way
+    to cancel a deep research job, so the job keeps running on FireCrawl's side
+    until its own timeLimit and its result is discarded.
+    """
+
+    def __init__(self, client, query: str, params: Dict[str, Any],
+                 poll_interval: float = 2.0,
+                 min_sources: Optional[int] = None,
+                 stop_when: Optional[Callable[[ResearchResult], bool]] = None,
+                 listeners: Optional[List[Callable[[ResearchEvent], None]]] = None,
+                 deadline_margin: float = 60.0):
+        self.client = client
+        self.query = query
+        self.params = params
+        self.poll_interval = poll_interval
+        self.min_sources = min_sources
+        self.stop_when = stop_when
+        self.listeners = list(listeners or [])
+        self.deadline_margin = deadline_margin
+        self.phases = PhaseBreakdown()
+        self.result = ResearchResult(query=query)
+        self._job_id = None
+        self._start = None
+        self._activity_count = 0
+        self._source_urls = set()
+        self._done = False
+
+    def _event(self, kind: str, message: str = "", **kwargs) -> ResearchEvent:
+        event = ResearchEvent(kind=kind, message=message, timestamp=time.time(),
+                              elapsed=time.perf_counter() - self._start, **kwargs)
+        self.phases.add(event)
+        if kind in (COMPLETED, STOPPED_EARLY, FAILED):
+            event.data["phases"] = dict(self.phases.seconds)
+        if kind == ACTIVITY:
+            self.result.activities.append(event)
+        for listener in self.listeners:
+            listener(event)
+        return event
+
+    def _start_job(self) -> ResearchEvent:
+        self._start = time.perf_counter()
+        response = self.client.async_deep_research(self.query, params=self.params)
+        self._job_id = _get(response, "id")
+        if not self._job_id:
+            raise RuntimeError(f"Failed to start deep research: {_get(response, 'error', response)}")
+        return self._event(STARTED, f"Deep research started: {self.query}", data={"id": self._job_id})
+
+    def _poll(self) -> List[ResearchEvent]:
+        """Check the job once and return the events for everything new since the last check."""
+        status = self.client.check_deep_research_status(self._job_id)
+        data = _get(status, "data") or status
+        events = []
+
+        activities = _get(data, "activities") or []
+        for activity in activities[self._activity_count:]:
+            events.append(self._event(
+                ACTIVITY,
+                _get(activity, "message", ""),
+                phase=_get(activity, "type"),
+                depth=_get(activity, "depth"),
+                data={"status": _get(activity, "status")},
+            ))
+        self._activity_count = len(activities)
+
+        for source in _get(data, "sources") or []:
+            url = _get(source, "url")
+            if url and url not in self._source_urls:
+                self._source_urls.add(url)
+                record = {"url": url, "title": _get(source, "title"), "description": _get(source, "description")}
+                self.result.sources.append(record)
+                events.append(self._event(SOURCE, _get(source, "title") or url, data=record))
+
+        self.result.elapsed = time.perf_counter() - self._start
+        job_status = _get(status, "status") or _get(data, "status")
+        if job_status == "completed":
+            self.result.status = "completed"
+            self.result.final_analysis = _get(data, "finalAnalysis") or ""
+            events.append(self._event(COMPLETED, f"Research completed with {len(self.result.sources)} sources"))
+            self._done = True
+        elif job_status == "failed":
+            self.result.status = "failed"
+            self.result.error = str(_get(status, "error") or "Deep research failed")
+            events.append(self._event(FAILED, self.result.error))
+            self._done = True
+        elif self._should_stop():
+            self._stop_early("stopped", f"Stopped with {len(self.result.sources)} sources", events)
+        elif self._past_deadline():
+            self._stop_early("timed_out", f"Gave up after {self.result.elapsed:.0f}s with "
+                                          f"{len(self.result.sources)} sources", events)
+        return events
+
+    def _stop_early(self, status: str, message: str, events: List[ResearchEvent]) -> None:
+        self.result.status = status
+        self.result.terminated_early = True
+        self.result.final_analysis = self.result.partial_analysis()
+        events.append(self._event(STOPPED_EARLY, message))
+        self._done = True
+
+    def _past_deadline(self) -> bool:
+        # the job should finish by its own timeLimit; this guards against a job stuck in "processing"
+        time_limit = self.params.get("timeLimit")
+        return time_limit is not None and self.result.elapsed > time_limit + self.deadline_margin
+
+    def _should_stop(self) -> bool:
+        if self.min_sources is not None and len(self.result.sources) >= self.min_sources:
+            return True
+        return bool(self.stop_when and self.stop_when(self.result))
+
+    def __iter__(self) -> Iterator[ResearchEvent]:
+        yield self._start_job()
+        while not self._done:
+            time.sleep(self.poll_interval)
+            yield from self._poll()
+
+    async def __aiter__(self):
+        # the SDK is synchronous, so its calls run in worker threads
+        yield await asyncio.to_thread(self._start_job)
+        while not self._done:
+            await asyncio.sleep(self.poll_interval)
+            for event in await asyncio.to_thread(self._poll):
+                yield event
+
+    def run(self) -> ResearchResult:
+        """
+        Consume the whole stream and return the result.
+
+        Returns:
+            ResearchResult: The final (or partial) research.
+        """
+        for _ in self:
+            pass
+        return self.result
+
+
+def activity_to_event(activity: Dict[str, Any], start: float) -> ResearchEvent:
+    """
+    Convert an `on_activity` callback payload into a ResearchEvent.
+
+    Args:
+        activity (dict): Activity from FireCrawl's blocking `deep_research` callback.
+        start (float): `time.perf_counter()` when the job started.
+
+    Returns:
+        ResearchEvent: The activity as an event.
+    """
+    return ResearchEvent(
+        kind=ACTIVITY,
+        message=activity.get("message", ""),
+        timestamp=time.time(),
+        elapsed=time.perf_counter() - start,
+        phase=activity.get("type"),
+        depth=activity.get("depth"),
+        data={"status": activity.get("status")},
+    )
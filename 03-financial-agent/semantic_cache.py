@@ -0,0 +1,527 @@
+"""
+Semantic near-duplicate cache for tool queries.
+
+Agents rephrase the same question all the time ("bitcoin price outlook",
+"BTC price forecast"), and an exact-match cache misses those repeats. Queries
+are normalized first (tickers to coin names, common synonyms, filler words
+dropped, word order ignored except for coins, numbers and directions), and an
+identical normalized query is an exact hit. Otherwise the query is embedded
+locally as a hashed vector of words and character trigrams, and a NumPy
+cosine search over the cached queries of the same tool ranks the candidates.
+Similar vectors alone do not make a hit: "risks of holding bitcoin" and
+"benefits of holding bitcoin" are close, and so are "this week" and "last
+week". A candidate is only served when both queries have the same content
+words, up to inflections ("etf"/"etfs"), and name the same coins, numbers and
+directions (buy/sell, inflow/outflow, ...) in the same order. Entries
+expire after a per-tool TTL. Hit rates are kept on disk and shown by
+
+    python semantic_cache.py stats
+
+and `python semantic_cache.py check` verifies known rephrasings hit and
+known look-alike questions miss.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from text_normalize import STOPWORDS as QUERY_STOPWORDS, TICKER_ALIASES, is_anchor, order_words
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "semantic_tool_cache.sqlite3")
+
+# per-tool freshness in seconds; answers about prices age faster than research reports
+DEFAULT_TTLS = {
+    "perplexity": 30 * 60,
+    "deep_research": 6 * 3600,
+}
+
+SYNONYMS = {
+    "forecast": "outlook", "forecasts": "outlook", "prediction": "outlook", "predictions": "outlook",
+    "projection": "outlook", "prospects": "outlook", "future": "outlook",
+    "cost": "price", "prices": "price", "valuation": "price", "worth": "price",
+    "headlines": "news", "updates": "news", "developments": "news",
+    "crypto": "cryptocurrency", "cryptocurrencies": "cryptocurrency", "coins": "coin",
+    "newest": "latest", "recent": "latest", "current": "latest", "currently": "latest", "today": "latest",
+}
+# no negations or time frames here ("not", "this", "next", "last"): they change the question
+STOPWORDS = QUERY_STOPWORDS | {
+    "i", "you", "should", "will", "would", "can", "could", "do", "does", "be", "it", "its",
+    "that", "how", "by", "at", "from", "as", "or", "right", "now", "some", "any",
+}
+# endings that make a word form of the same word ("etf"/"etfs", "predict"/"prediction")
+INFLECTIONS = ("s", "es", "ed", "ing", "ion", "ions")
+WORD_PATTERN = re.compile(r"\w+")
+
+# (cached query, new query, should hit)
+CHECK_PAIRS = [
+    ("bitcoin price outlook", "BTC price forecast", True),
+    ("ethereum ETF flows", "ETH ETF flow", True),
+    ("bitcoin halving", "bitcoin halvings", True),
+    ("spot bitcoin ETF approval", "spot bitcoin ETFs approval", True),
+    ("is bitcoin not a good investment", "is bitcoin a good investment", False),
+    ("main benefits of holding bitcoin", "main risks of holding bitcoin", False),
+    ("ETF net flows last week", "ETF net flows this week", False),
+    ("bitcoin outlook next week", "bitcoin outlook this week", False),
+    ("latest bitcoin mining news", "latest bitcoin news", False),
+    ("should I sell bitcoin", "should I buy bitcoin", False),
+    ("bitcoin ETF inflows", "bitcoin ETF outflows", False),
+    ("bitcoin price", "ethereum price", False),
+    ("is ETH stronger than BTC", "is BTC stronger than ETH", False),
+    ("sell bitcoin buy ethereum", "buy bitcoin sell ethereum", False),
+]
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize a query so different phrasings of the same request compare equal.
+
+    Args:
+        text (str): The query.
+
+    Returns:
+        str: Sorted canonical words without filler words, then coins, numbers
+        and directions in query order (see `order_words`).
+    """
+    words = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        word = TICKER_ALIASES.get(word, word)
+        word = SYNONYMS.get(word, word)
+        if len(word) > 4 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            word = word[:-1]  # plural folding: "halvings" -> "halving"
+        if word not in STOPWORDS:
+            words.append(word)
+    return order_words(words)
+
+
+def _bucket(feature: str, dim: int) -> Tuple[int, float]:
+    # a stable hash (Python's hash() changes per process) with a sign to spread collisions
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % dim, 1.0 if value >> 63 else -1.0
+
+
+def embed(normalized: str, dim: int = 1024) -> np.ndarray:
+    """
+    Embed a normalized query as a unit-length hashed n-gram vector.
+
+    Whole words carry most of the weight; character trigrams let spelling
+    variants and word forms ("halving", "halvings") overlap.
+
+    Args:
+        normalized (str): Output of `normalize_text`.
+        dim (int, optional): Vector size.
+
+    Returns:
+        np.ndarray: float32 vector of length `dim`.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in normalized.split():
+        index, sign = _bucket(f"w:{word}", dim)
+        vector[index] += sign
+        padded = f"#{word}#"
+        trigrams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        for trigram in trigrams:
+            index, sign = _bucket(f"c:{trigram}", dim)
+            vector[index] += sign * 0.5 / len(trigrams) ** 0.5
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _anchors(normalized: str) -> Tuple[str, ...]:
+    # coins, numbers and directions must match exactly and in order; "bitcoin price" is not
+    # "ethereum price", and "buy bitcoin sell ethereum" is not "sell bitcoin buy ethereum"
+    return tuple(w for w in normalized.split() if is_anchor(w))
+
+
+def _word_forms(a: str, b: str) -> bool:
+    # "etf"/"etfs", "predict"/"prediction"; never "mine"/"mining" or "inflow"/"outflow"
+    short, long = sorted((a, b), key=len)
+    return len(short) >= 3 and long.startswith(short) and long[len(short):] in INFLECTIONS
+
+
+def same_question(a: str, b: str) -> bool:
+    """
+    Whether two normalized queries ask the same thing.
+
+    Every content word of one query must appear in the other, either as is or
+    as another form of the same word, and coins, numbers and directions must
+    match exactly, in the same order. An extra "not", "mining" or "last" makes it another question.
+
+    Args:
+        a (str): Output of `normalize_text`.
+        b (str): Output of `normalize_text`.
+
+    Returns:
+        bool: True when the queries are interchangeable.
+    """
+    if _anchors(a) != _anchors(b):
+        return False
+    words_a, words_b = set(a.split()), set(b.split())
+    only_a, only_b = words_a - words_b, words_b - words_a
+    return (all(any(_word_forms(w, v) for v in words_b) for w in only_a)
+            and all(any(_word_forms(w, v) for v in words_a) for w in only_b))
+
+
+@dataclass
+class SemanticHit:
+    """A cached value served for a query."""
+    value: Any
+    query: str  # the cached query that matched
+    similarity: float
+    created_at: float
+    exact: bool = False
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created_at
+
+
+class _Index:
+    """The in-memory vectors of one (tool, scope) pair."""
+
+    def __init__(self, dim: int):
+        self.ids: List[int] = []
+        self.normalized: List[str] = []
+        self.created_at: List[float] = []
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+
+    def add(self, row_id: int, normalized: str, created_at: float, vector: np.ndarray) -> None:
+        self.ids.append(row_id)
+        self.normalized.append(normalized)
+        self.created_at.append(created_at)
+        self.vectors = np.vstack([self.vectors, vector[None, :]])
+
+
+class SemanticCache:
+    """
+    SQLite-backed cache of tool results, matched by query similarity.
+
+    Args:
+        path (str, optional): SQLite database file.
+        threshold (float, optional): Minimum cosine similarity for a near-duplicate hit. It is only
+            a floor: a candidate must also pass `same_question`.
+        ttls (dict, optional): Seconds an entry stays valid, per tool name.
+        default_ttl (float, optional): TTL for tools without their own.
+        dim (int, optional): Embedding size.
+        max_entries (int, optional): Oldest entries are removed beyond this count.
+    """
+
+    def __init__(self,
+                 path: str = DEFAULT_CACHE_PATH,
+                 threshold: float = 0.6,
+                 ttls: Optional[Dict[str, float]] = None,
+                 default_ttl: float = 3600,
+                 dim: int = 1024,
+                 max_entries: int = 5000):
+        self.path = path
+        self.threshold = threshold
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.dim = dim
+        self.max_entries = max_entries
+        self._indexes: Dict[Tuple[str, str], _Index] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " tool TEXT NOT NULL,"
+                " scope TEXT NOT NULL,"
+                " query TEXT NOT NULL,"
+                " normalized TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_tool ON entries (tool, scope)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                " tool TEXT PRIMARY KEY,"
+                " exact_hits INTEGER NOT NULL DEFAULT 0,"
+                " semantic_hits INTEGER NOT NULL DEFAULT 0,"
+                " misses INTEGER NOT NULL DEFAULT 0)"
+            )
+
+    @staticmethod
+    def make_scope(*parts: Any) -> str:
+        """
+        Build the scope of a query: parameters that must match exactly (model, prompt, depth).
+
+        Returns:
+            str: A short hash of the parts.
+        """
+        return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()[:16]
+
+    def ttl_for(self, tool: str) -> float:
+        return self.ttls.get(tool, self.default_ttl)
+
+    def _index(self, tool: str, scope: str) -> _Index:
+        # called with the lock held; loads the pair's vectors from disk on first use
+        key = (tool, scope)
+        if key not in self._indexes:
+            index = _Index(self.dim)
+            rows = self._conn.execute(
+                "SELECT id, normalized, created_at, vector FROM entries"
+                " WHERE tool = ? AND scope = ? AND created_at >= ? ORDER BY id",
+                (tool, scope, time.time() - self.ttl_for(tool))
+            ).fetchall()
+            if rows:
+                index.ids = [row[0] for row in rows]
+                index.normalized = [row[1] for row in rows]
+                index.created_at = [row[2] for row in rows]
+                index.vectors = np.vstack([np.frombuffer(row[3], dtype=np.float32) for row in rows])
+            self._indexes[key] = index
+        return self._indexes[key]
+
+    def _count(self, tool: str, column: str) -> None:
+        with self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO stats (tool) VALUES (?)", (tool,))
+            self._conn.execute(f"UPDATE stats SET {column} = {column} + 1 WHERE tool = ?", (tool,))
+
+    def nearest(self, tool: str, query: str, scope: str = "") -> Optional[Tuple[int, float, bool]]:
+        """
+        Find the most similar live entry that asks the same question, without the threshold and
+        without counting.
+
+        Args:
+            tool (str): Tool name, e.g. "perplexity".
+            query (str): The query.
+            scope (str, optional): Scope from `make_scope`.
+
+        Returns:
+            tuple: (row id, similarity, exact) of the best candidate, or None.
+        """
+        normalized = normalize_text(query)
+        with self._lock:
+            index = self._index(tool, scope)
+            if not index.ids:
+                return None
+            live = np.asarray(index.created_at) >= time.time() - self.ttl_for(tool)
+            # newest first, so a refreshed answer wins over an older one
+            for i in reversed(range(len(index.ids))):
+                if live[i] and index.normalized[i] == normalized:
+                    return index.ids[i], 1.0, True
+            # the vectors only rank the candidates; same_question decides
+            similarities = np.where(live, index.vectors @ embed(normalized, self.dim), -1.0)
+            for i in np.argsort(-similarities, kind="stable")[:5]:
+                if similarities[i] < 0:
+                    break
+                if same_question(index.normalized[i], normalized):
+                    return index.ids[i], float(similarities[i]), False
+        return None
+
+    def nearest_queries(self, tool: str, query: str) -> List[Tuple[str, str, float, bool]]:
+        """
+        Find the closest live entry that asks the same question in every scope of a tool.
+
+        Args:
+            tool (str): Tool name, e.g. "perplexity".
+            query (str): The query.
+
+        Returns:
+            list: (scope, cached query, similarity, exact) per scope with a match, most similar first.
+        """
+        with self._lock:
+            scopes = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT scope FROM entries WHERE tool = ?", (tool,))]
+        matches = []
+        for scope in scopes:
+            match = self.nearest(tool, query, scope)
+            if match is None:
+                continue
+            row_id, similarity, exact = match
+            with self._lock:
+                row = self._conn.execute("SELECT query FROM entries WHERE id = ?", (row_id,)).fetchone()
+            if row is not None:
+                matches.append((scope, row[0], similarity, exact))
+        return sorted(matches, key=lambda match: -match[2])
+
+    def lookup(self, tool: str, query: str, scope: str = "") -> Optional[SemanticHit]:
+        """
+        Return the cached value of the same or a near-duplicate query.
+
+        Args:
+            tool (str): Tool name, e.g. "perplexity".
+            query (str): The query.
+            scope (str, optional): Scope from `make_scope`; only entries with the same scope match.
+
+        Returns:
+            SemanticHit: The hit, or None on a miss.
+        """
+        match = self.nearest(tool, query, scope)
+        with self._lock:
+            if match is None or match[1] < self.threshold:
+                self._count(tool, "misses")
+                return None
+            row_id, similarity, exact = match
+            row = self._conn.execute(
+                "SELECT query, value, created_at FROM entries WHERE id = ?", (row_id,)
+            ).fetchone()
+            if row is None:  # evicted since the index was loaded
+                self._count(tool, "misses")
+                return None
+            self._count(tool, "exact_hits" if exact else "semantic_hits")
+        return SemanticHit(value=json.loads(row[1]), query=row[0], similarity=similarity,
+                           created_at=row[2], exact=exact)
+
+    def store(self, tool: str, query: str, value: Any, scope: str = "") -> None:
+        """
+        Cache a tool result under its query.
+
+        Args:
+            tool (str): Tool name.
+            query (str): The query that produced the value.
+            value (Any): JSON-serializable result.
+            scope (str, optional): Scope from `make_scope`.
+        """
+        normalized = normalize_text(query)
+        vector = embed(normalized, self.dim)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT INTO entries (tool, scope, query, normalized, vector, value, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (tool, scope, query, normalized, vector.tobytes(), json.dumps(value, ensure_ascii=False), now)
+                )
+            self._index(tool, scope).add(cursor.lastrowid, normalized, now, vector)
+            self._evict()
+
+    def _evict(self) -> None:
+        # called with the lock held
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        if count <= self.max_entries:
+            return
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM entries WHERE id IN (SELECT id FROM entries ORDER BY created_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+        self._indexes.clear()  # reloaded from disk on next use
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Hit counts and entry counts per tool, accumulated across runs.
+
+        Returns:
+            dict: Per tool: exact_hits, semantic_hits, misses, hit_rate, entries, live_entries.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT tool, exact_hits, semantic_hits, misses FROM stats").fetchall()
+            entries = dict(self._conn.execute("SELECT tool, COUNT(*) FROM entries GROUP BY tool").fetchall())
+            result = {}
+            for tool in sorted({row[0] for row in rows} | set(entries)):
+                exact, semantic, misses = next((row[1:] for row in rows if row[0] == tool), (0, 0, 0))
+                (live,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM entries WHERE tool = ? AND created_at >= ?",
+                    (tool, time.time() - self.ttl_for(tool))
+                ).fetchone()
+                lookups = exact + semantic + misses
+                result[tool] = {
+                    "exact_hits": exact,
+                    "semantic_hits": semantic,
+                    "misses": misses,
+                    "hit_rate": (exact + semantic) / lookups if lookups else 0.0,
+                    "entries": entries.get(tool, 0),
+                    "live_entries": live,
+                }
+        return result
+
+    def report(self) -> str:
+        """
+        Format `stats()` as a Markdown table.
+
+        Returns:
+            str: One row per tool.
+        """
+        lines = ["| Tool | TTL | Exact hits | Semantic hits | Misses | Hit rate | Live / stored |",
+                 "| --- | ---: | ---: | ---: | ---: | ---: | ---: |"]
+        for tool, s in self.stats().items():
+            lines.append(f"| {tool} | {self.ttl_for(tool) / 60:.0f} min | {s['exact_hits']} | {s['semantic_hits']} "
+                         f"| {s['misses']} | {s['hit_rate']:.0%} | {s['live_entries']} / {s['entries']} |")
+        return "\n".join(lines)
+
+    def clear(self, tool: Optional[str] = None) -> None:
+        """
+        Remove cached entries and hit counts, for one tool or all of them.
+
+        Args:
+            tool (str, optional): Only clear this tool.
+        """
+        where, args = ("WHERE tool = ?", (tool,)) if tool else ("", ())
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM entries {where}", args)
+            self._conn.execute(f"DELETE FROM stats {where}", args)
+            self._indexes.clear()
+
+    def close(self):
+        self._conn.close()
+
+
+def check() -> int:
+    """
+    Run `CHECK_PAIRS` through a throwaway cache and print the outcome of each.
+
+    Returns:
+        int: The number of pairs that did not behave as expected (the exit code).
+    """
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for cached, query, should_hit in CHECK_PAIRS:
+            cache = SemanticCache(path=os.path.join(directory, f"check{failures}_{len(cached)}.sqlite3"))
+            cache.store("check", cached, cached)
+            hit = cache.lookup("check", query)
+            cache.close()
+            ok = (hit is not None) == should_hit
+            failures += not ok
+            similarity = float(embed(normalize_text(cached)) @ embed(normalize_text(query)))
+            print(f"{'ok  ' if ok else 'FAIL'} {'hit ' if hit else 'miss'} {similarity:.3f}  {query!r} -> {cached!r}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the semantic tool cache")
+    parser.add_argument("--path", default=DEFAULT_CACHE_PATH, help="SQLite cache file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show hit rates and entry counts per tool")
+    nearest = commands.add_parser("nearest", help="Show the closest cached query for a query (scope ignored)")
+    nearest.add_argument("tool", help="Tool name, e.g. perplexity or deep_research")
+    nearest.add_argument("query", help="The query to match")
+    commands.add_parser("check", help="Verify that known rephrasings hit and look-alike questions miss")
+    clear = commands.add_parser("clear", help="Remove cached entries")
+    clear.add_argument("--tool", help="Only clear this tool")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        raise SystemExit(check())
+
+    cache = SemanticCache(path=args.path)
+    if args.command == "stats":
+        print(cache.report())
+    elif args.command == "nearest":
+        normalized = normalize_text(args.query)
+        print(f"normalized: {normalized}")
+        matches = cache.nearest_queries(args.tool, args.query)
+        if not matches:
+            print("no live entry asks the same question")
+        for scope, query, similarity, exact in matches:
+            verdict = "hit" if similarity >= cache.threshold else "miss"
+            print(f"{similarity:.3f} ({verdict}{', exact' if exact else ''}) scope {scope}: {query}")
+    else:
+        cache.clear(args.tool)
+        print("cleared")
+
+
+if __name__ == "__main__":
+    main()
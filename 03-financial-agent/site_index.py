@@ -0,0 +1,316 @@
+"""
+Persistent per-site URL index with change detection.
+
+We track the same exchange and project sites every day, and mapping and
+scraping them from scratch each time wastes time and FireCrawl quota. The
+index remembers every URL discovered on a site (first seen, last seen) and
+what was scraped from it (content hash, ETag, Last-Modified). A follow-up run
+reuses a recent map instead of calling FireCrawl again. Before scraping a
+known page it asks the site itself with a cheap conditional request, so only
+new or changed pages are scraped.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from concurrent_scrape import canonical_url
+
+DEFAULT_INDEX_PATH = os.path.join(tempfile.gettempdir(), "firecrawl_site_index.sqlite3")
+
+
+def site_of(url: str) -> str:
+    """
+    Return the site key (lowercase host) for a URL.
+
+    Args:
+        url (str): Any URL on the site.
+
+    Returns:
+        str: The host name.
+    """
+    return (urlsplit(url).hostname or url).lower()
+
+
+def map_key(url: str, limit: int, include_subdomains: bool) -> str:
+    """
+    Return the key of a map request.
+
+    A map only answers requests with the same start URL, subdomain setting
+    and limit; a map of /blog says nothing about /support, and a map capped at
+    20 URLs does not cover a request for 500.
+
+    Args:
+        url (str): Starting URL of the map.
+        limit (int): Maximum number of URLs requested.
+        include_subdomains (bool): Whether subdomains were included.
+
+    Returns:
+        str: The key.
+    """
+    return json.dumps([canonical_url(url), bool(include_subdomains), limit])
+
+
+def content_hash(text: str) -> str:
+    # whitespace-insensitive, so re-rendered but identical pages do not count as changed
+    return hashlib.sha256(" ".join((text or "").split()).encode("utf-8")).hexdigest()
+
+
+@dataclass
+class MapDiff:
+    """What changed in a site's URL list since the previous map with the same key."""
+    site: str
+    new: List[str] = field(default_factory=list)
+    known: List[str] = field(default_factory=list)
+    gone: List[str] = field(default_factory=list)
+    from_index: bool = False
+
+    @property
+    def urls(self) -> List[str]:
+        return self.new + self.known
+
+
+@dataclass
+class PageState:
+    """What the index knows about one page."""
+    url: str
+    first_seen: float
+    last_seen: float
+    last_scraped: Optional[float] = None
+    content_hash: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class SiteIndex:
+    """
+    SQLite index of discovered URLs and their last scraped content.
+
+    Args:
+        path (str, optional): SQLite database file.
+        map_max_age (float, optional): Seconds a site map is reused before FireCrawl is asked again.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, map_max_age: float = 24 * 3600):
+        self.path = path
+        self.map_max_age = map_max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " url TEXT PRIMARY KEY,"
+                " site TEXT NOT NULL,"
+                " first_seen REAL NOT NULL,"
+                " last_seen REAL NOT NULL,"
+                " last_scraped REAL,"
+                " content_hash TEXT,"
+                " etag TEXT,"
+                " last_modified TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pages_site ON pages (site)")
+            # the latest map per request (see `map_key`) and its URLs in map order
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS site_maps ("
+                " key TEXT PRIMARY KEY,"
+                " site TEXT NOT NULL,"
+                " mapped_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS site_map_urls ("
+                " key TEXT NOT NULL,"
+                " position INTEGER NOT NULL,"
+                " url TEXT NOT NULL,"
+                " PRIMARY KEY (key, position))"
+            )
+
+    def last_mapped(self, key: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT mapped_at FROM site_maps WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def map_is_fresh(self, key: str) -> bool:
+        mapped_at = self.last_mapped(key)
+        return mapped_at is not None and time.time() - mapped_at <= self.map_max_age
+
+    def known_urls(self, key: str) -> List[str]:
+        """
+        Return the URLs of the most recent map for a request.
+
+        Args:
+            key (str): Map key from `map_key`.
+
+        Returns:
+            List[str]: Canonical URLs, in map order.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url FROM site_map_urls WHERE key = ? ORDER BY position", (key,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def record_map(self, key: str, site: str, urls: Iterable[str]) -> MapDiff:
+        """
+        Store a fresh map and report what is new and what disappeared.
+
+        URLs are new when the index has never seen them on the site, and gone
+        when the previous map with the same key listed them but this one does not.
+
+        Args:
+            key (str): Map key from `map_key`.
+            site (str): Site key from `site_of`.
+            urls (Iterable[str]): URLs returned by the map.
+
+        Returns:
+            MapDiff: New, already known and no longer listed URLs.
+        """
+        now = time.time()
+        diff = MapDiff(site=site)
+        seen = {}  # insertion-ordered, for the map order
+        with self._lock, self._conn:
+            known = {row[0] for row in self._conn.execute("SELECT url FROM pages WHERE site = ?", (site,))}
+            previous = [row[0] for row in self._conn.execute(
+                "SELECT url FROM site_map_urls WHERE key = ? ORDER BY position", (key,)
+            )]
+            for url in urls:
+                url = canonical_url(url)
+                if url in seen:
+                    continue
+                seen[url] = None
+                if url in known:
+                    diff.known.append(url)
+                    self._conn.execute("UPDATE pages SET last_seen = ? WHERE url = ?", (now, url))
+                else:
+                    diff.new.append(url)
+                    self._conn.execute(
+                        "INSERT INTO pages (url, site, first_seen, last_seen) VALUES (?, ?, ?, ?)",
+                        (url, site, now, now)
+                    )
+            diff.gone = [url for url in previous if url not in seen]
+            self._conn.execute("DELETE FROM site_map_urls WHERE key = ?", (key,))
+            self._conn.executemany(
+                "INSERT INTO site_map_urls (key, position, url) VALUES (?, ?, ?)",
+                [(key, position, url) for position, url in enumerate(seen)]
+            )
+            self._conn.execute("INSERT OR REPLACE INTO site_maps (key, site, mapped_at) VALUES (?, ?, ?)",
+                               (key, site, now))
+        return diff
+
+    def page(self, url: str) -> Optional[PageState]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, first_seen, last_seen, last_scraped, content_hash, etag, last_modified"
+                " FROM pages WHERE url = ?", (canonical_url(url),)
+            ).fetchone()
+        return PageState(*row) if row else None
+
+    def record_scrape(self, url: str, text: str,
+                      etag: Optional[str] = None, last_modified: Optional[str] = None) -> bool:
+        """
+        Store the content hash of a scraped page.
+
+        Args:
+            url (str): The scraped URL.
+            text (str): The scraped content.
+            etag (str, optional): ETag header from the site.
+            last_modified (str, optional): Last-Modified header from the site.
+
+        Returns:
+            bool: True if the page is new or its content changed since the last scrape.
+        """
+        now = time.time()
+        url = canonical_url(url)
+        new_hash = content_hash(text)
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO pages (url, site, first_seen, last_seen) VALUES (?, ?, ?, ?)",
+                    (url, site_of(url), now, now)
+                )
+            self._conn.execute(
+                "UPDATE pages SET last_scraped = ?, content_hash = ?,"
+                " etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                (now, new_hash, etag, last_modified, url)
+            )
+        return row is None or row[0] != new_hash
+
+    def validators(self, url: str) -> Tuple[Optional[str], Optional[str]]:
+        state = self.page(url)
+        return (state.etag, state.last_modified) if state else (None, None)
+
+    def stats(self, site: Optional[str] = None) -> Dict[str, int]:
+        where, args = ("WHERE site = ?", (site,)) if site else ("", ())
+        with self._lock:
+            total, scraped = self._conn.execute(
+                f"SELECT COUNT(*), COUNT(last_scraped) FROM pages {where}", args
+            ).fetchone()
+        return {"urls": total, "scraped": scraped}
+
+    def close(self):
+        self._conn.close()
+
+
+def fetch_validators(http_client: httpx.Client, url: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Read a page's ETag and Last-Modified headers with a HEAD request.
+
+    Args:
+        http_client (httpx.Client): Client used for the request.
+        url (str): Page URL.
+
+    Returns:
+        tuple: (etag, last_modified); None where the site sends no such header or the request fails.
+    """
+    try:
+        response = http_client.head(url, follow_redirects=True)
+    except httpx.HTTPError:
+        return None, None
+    return response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+
+def check_changed(http_client: httpx.Client, url: str,
+                  etag: Optional[str], last_modified: Optional[str]) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Ask the site whether a page changed, using a conditional HEAD request.
+
+    Args:
+        http_client (httpx.Client): Client used for the request.
+        url (str): Page URL.
+        etag (str, optional): ETag from the previous scrape.
+        last_modified (str, optional): Last-Modified from the previous scrape.
+
+    Returns:
+        tuple: (changed, etag, last_modified). Pages without validators, and
+        any request failure, count as changed so they get scraped.
+    """
+    if not etag and not last_modified:
+        return True, None, None
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        response = http_client.head(url, headers=headers, follow_redirects=True)
+    except httpx.HTTPError:
+        return True, None, None
+    new_etag = response.headers.get("ETag")
+    new_last_modified = response.headers.get("Last-Modified")
+    if response.status_code == 304:
+        return False, etag, last_modified
+    if response.status_code == 200:
+        if etag and new_etag == etag:
+            return False, etag, new_last_modified or last_modified
+        if not etag and last_modified and new_last_modified == last_modified:
+            return False, None, last_modified
+    return True, new_etag, new_last_modified
@@ -0,0 +1,22 @@
+from research_cache import ResearchCache, ResearchEntry, normalize_query
+
+
+def test_rephrased_queries_share_a_key(tmp_path):
+    cache = ResearchCache(cache_dir=str(tmp_path))
+    assert cache.make_key("Bitcoin price outlook", 5, 15) == cache.make_key("outlook of the bitcoin price", 5, 15)
+
+
+def test_swapped_assets_are_separate_keys(tmp_path):
+    cache = ResearchCache(cache_dir=str(tmp_path))
+    assert normalize_query("BTC vs ETH") != normalize_query("ETH vs BTC")
+    assert cache.make_key("BTC vs ETH", 5, 15) != cache.make_key("ETH vs BTC", 5, 15)
+
+
+def test_swapped_directions_do_not_hit(tmp_path):
+    cache = ResearchCache(cache_dir=str(tmp_path))
+    query = "sell bitcoin buy ethereum"
+    cache.store(cache.make_key(query, 5, 15), ResearchEntry(query=query, max_depth=5, max_urls=15,
+                                                             final_analysis="rotate into ethereum", sources=[]))
+    swapped = "buy bitcoin sell ethereum"
+    entry, _ = cache.lookup(cache.make_key(swapped, 5, 15), swapped)
+    assert entry is None
@@ -0,0 +1,74 @@
+"""
+Word tables shared by the query caches and the watchlist helpers.
+
+Both caches normalize queries before matching them, and the watchlist
+dedupes assets typed as tickers or names. They use the same tables, kept
+here so the cache modules do not depend on each other or on the report
+layer.
+"""
+
+from typing import List
+
+# common tickers, so "BTC" and "bitcoin" mean the same asset
+TICKER_ALIASES = {
+    "btc": "bitcoin",
+    "eth": "ethereum",
+    "sol": "solana",
+    "ada": "cardano",
+    "doge": "dogecoin",
+    "dot": "polkadot",
+    "avax": "avalanche",
+    "link": "chainlink",
+    "ltc": "litecoin",
+    "matic": "polygon",
+    "trx": "tron",
+    "ton": "toncoin",
+}
+
+# filler words that do not change what a research query asks for
+STOPWORDS = {
+    "a", "an", "and", "the", "of", "on", "for", "in", "to", "about", "is", "are", "what",
+    "please", "research", "tell", "me", "give", "detailed", "report", "with",
+}
+
+# opposite questions look alike ("buy" vs "sell"), so these must match exactly too
+DIRECTION_WORDS = {
+    "buy", "sell", "long", "short", "bullish", "bearish", "inflow", "outflow",
+    "rise", "fall", "up", "down", "gain", "loss", "high", "low",
+}
+ASSET_WORDS = set(TICKER_ALIASES) | set(TICKER_ALIASES.values())
+
+
+def is_anchor(word: str) -> bool:
+    """
+    Whether a word carries a role in the question: a coin, a number or a direction.
+
+    Args:
+        word (str): A lowercase word.
+
+    Returns:
+        bool: True for words whose order matters.
+    """
+    return word in ASSET_WORDS or word in DIRECTION_WORDS or word.isdigit()
+
+
+def order_words(words: List[str]) -> str:
+    """
+    Join the words of a query so rephrasings compare equal but swapped roles do not.
+
+    The other words are sorted, so "bitcoin price outlook" and "outlook of the
+    bitcoin price" agree. The anchor words follow in their original order, so
+    "is ETH stronger than BTC" and "is BTC stronger than ETH", or "sell bitcoin
+    buy ethereum" and "buy bitcoin sell ethereum", stay apart.
+
+    Args:
+        words (List[str]): Normalized words of the query, in query order.
+
+    Returns:
+        str: The sorted other words followed by the anchors in order.
+    """
+    anchors = []
+    for word in words:
+        if is_anchor(word) and (not anchors or anchors[-1] != word):
+            anchors.append(word)
+    return " ".join(sorted({word for word in words if not is_anchor(word)}) + anchors)
@@ -0,0 +1,255 @@
+"""
+Structured, token-budgeted tool output.
+
+Whole page dumps make the model slow and expensive, and most of a page is
+irrelevant to the question. Tool results are split into chunks, scored
+against the query, and only the best chunks that fit the token budget are
+passed on. They can be rendered as compact Markdown or as JSON records
+(source, title, chunk text, score), and `stream_chunks` emits them page by
+page as scrapes complete.
+"""
+
+import json
+import math
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+MARKDOWN = "markdown"
+RECORDS = "records"
+OUTPUT_FORMATS = (MARKDOWN, RECORDS)
+
+WORD_PATTERN = re.compile(r"\w+")
+STOPWORDS = {
+    "a", "an", "and", "the", "of", "on", "for", "in", "to", "is", "are", "was", "it", "this",
+    "that", "with", "as", "by", "at", "be", "or", "from", "what", "how", "about",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the token count of a text (about four characters per token).
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: Estimated tokens.
+    """
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+
+@dataclass
+class Chunk:
+    """A piece of a tool result, with where it came from and how relevant it is."""
+    source: str
+    title: str
+    text: str
+    index: int = 0
+    score: float = 0.0
+    tokens: int = 0
+
+
+def chunk_text(text: str, max_tokens: int = 300) -> List[str]:
+    """
+    Split text into chunks of up to `max_tokens`, on paragraph boundaries where possible.
+
+    Args:
+        text (str): Markdown or plain text.
+        max_tokens (int, optional): Maximum estimated tokens per chunk.
+
+    Returns:
+        List[str]: The chunks in document order.
+    """
+    max_chars = max_tokens * 4
+    chunks = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", text or ""):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        # a paragraph longer than a chunk is cut on sentence, then on hard boundaries
+        pieces = [paragraph] if len(paragraph) <= max_chars else re.split(r"(?<=[.!?])\s+", paragraph)
+        for i, piece in enumerate(pieces):
+            while len(piece) > max_chars:
+                if current:
+                    chunks.append(current)
+                    current = ""
+                chunks.append(piece[:max_chars])
+                piece = piece[max_chars:]
+            # sentences of one paragraph stay on one line
+            separator = "\n\n" if i == 0 else " "
+            if current and len(current) + len(separator) + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}{separator}{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def query_terms(query: Optional[str]) -> Counter:
+    return Counter(w for w in WORD_PATTERN.findall((query or "").lower()) if w not in STOPWORDS)
+
+
+def score_chunks(chunks: List[Chunk], query: Optional[str]) -> List[Chunk]:
+    """
+    Score chunks by query-term overlap (BM25-style saturation, rarer terms weigh more).
+
+    Without a query, earlier chunks of each source score higher, since pages
+    and reports put their summary first.
+
+    Args:
+        chunks (List[Chunk]): Chunks to score in place.
+        query (str, optional): The question the chunks should answer.
+
+    Returns:
+        List[Chunk]: The same chunks, with `score` and `tokens` set.
+    """
+    terms = query_terms(query)
+    counts = [Counter(WORD_PATTERN.findall(chunk.text.lower())) for chunk in chunks]
+    n = len(chunks)
+    # document frequencies once per term, not once per chunk and term
+    idf = {}
+    for term in terms:
+        df = sum(1 for words in counts if term in words)
+        idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    for chunk, words in zip(chunks, counts):
+        chunk.tokens = estimate_tokens(chunk.text)
+        if not terms:
+            chunk.score = 1.0 / (1 + chunk.index)
+            continue
+        length = max(1, sum(words.values()))
+        score = 0.0
+        for term in terms:
+            tf = words.get(term, 0)
+            if not tf:
+                continue
+            score += idf[term] * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * length / 120))
+        # a small bonus for the opening chunks, which tend to summarize
+        chunk.score = round(score + 0.1 / (1 + chunk.index), 4)
+    return chunks
+
+
+def select_chunks(chunks: List[Chunk], token_budget: Optional[int]) -> List[Chunk]:
+    """
+    Keep the highest-scoring chunks that fit in the token budget.
+
+    Args:
+        chunks (List[Chunk]): Scored chunks.
+        token_budget (int, optional): Maximum total tokens; None keeps everything.
+
+    Returns:
+        List[Chunk]: The selected chunks, best first.
+    """
+    ranked = sorted(chunks, key=lambda c: c.score, reverse=True)
+    if token_budget is None:
+        return ranked
+    selected = []
+    used = 0
+    for chunk in ranked:
+        if used + chunk.tokens > token_budget:
+            continue  # a smaller, lower-ranked chunk may still fit
+        selected.append(chunk)
+        used += chunk.tokens
+    return selected
+
+
+def fit_chunk_size(max_chunk_tokens: int, token_budget: Optional[int]) -> int:
+    # small budgets need small chunks, or not even one chunk would fit
+    if token_budget is None:
+        return max_chunk_tokens
+    return max(50, min(max_chunk_tokens, token_budget // 4))
+
+
+def make_chunks(source: str, title: str, text: str, max_chunk_tokens: int = 300) -> List[Chunk]:
+    return [Chunk(source=source, title=title, text=piece, index=i)
+            for i, piece in enumerate(chunk_text(text, max_chunk_tokens))]
+
+
+def rank_documents(documents: Iterable[Tuple[str, str, str]],
+                   query: Optional[str],
+                   token_budget: Optional[int],
+                   max_chunk_tokens: int = 300) -> List[Chunk]:
+    """
+    Chunk, score and budget a set of documents in one pass.
+
+    Args:
+        documents (Iterable[tuple]): (source, title, text) per document.
+        query (str, optional): The question the output should answer.
+        token_budget (int, optional): Maximum total tokens of the selected chunks.
+        max_chunk_tokens (int, optional): Maximum tokens per chunk.
+
+    Returns:
+        List[Chunk]: The selected chunks, best first.
+    """
+    max_chunk_tokens = fit_chunk_size(max_chunk_tokens, token_budget)
+    chunks = [chunk for source, title, text in documents
+              for chunk in make_chunks(source, title, text, max_chunk_tokens)]
+    return select_chunks(score_chunks(chunks, query), token_budget)
+
+
+def stream_chunks(documents: Iterable[Tuple[str, str, str]],
+                  query: Optional[str],
+                  token_budget: int,
+                  per_source_tokens: Optional[int] = None,
+                  max_chunk_tokens: int = 300) -> Iterator[Chunk]:
+    """
+    Yield the best chunks of each document as soon as the document arrives.
+
+    The documents are not all known up front, so each one is ranked on its
+    own and may use at most `per_source_tokens` of the remaining budget.
+    The stream stops once the budget is spent.
+
+    Args:
+        documents (Iterable[tuple]): (source, title, text) per document, e.g. from `iter_scrape`.
+        query (str, optional): The question the output should answer.
+        token_budget (int): Maximum total tokens over the whole stream.
+        per_source_tokens (int, optional): Cap per document; defaults to a quarter of the budget.
+        max_chunk_tokens (int, optional): Maximum tokens per chunk.
+
+    Yields:
+        Chunk: Selected chunks, best first within each document.
+    """
+    max_chunk_tokens = fit_chunk_size(max_chunk_tokens, token_budget)
+    per_source_tokens = per_source_tokens or max(max_chunk_tokens, token_budget // 4)
+    remaining = token_budget
+    for source, title, text in documents:
+        if remaining <= 0:
+            return
+        chunks = score_chunks(make_chunks(source, title, text, max_chunk_tokens), query)
+        for chunk in select_chunks(chunks, min(per_source_tokens, remaining)):
+            remaining -= chunk.tokens
+            yield chunk
+
+
+def render_chunks(chunks: List[Chunk], output_format: str = MARKDOWN,
+                  header: Optional[str] = None, extra: Optional[Dict] = None) -> str:
+    """
+    Render selected chunks for the model.
+
+    Args:
+        chunks (List[Chunk]): The chunks to render, in the order to show them.
+        output_format (str, optional): "markdown" or "records".
+        header (str, optional): Heading for the Markdown output.
+        extra (dict, optional): Additional top-level fields for the records output.
+
+    Returns:
+        str: Markdown grouped by source, or a JSON object with a `records` list.
+    """
+    if output_format == RECORDS:
+        payload = dict(extra or {})
+        payload["records"] = [asdict(chunk) for chunk in chunks]
+        return json.dumps(payload, ensure_ascii=False)
+
+    # group by source (best source first) and restore document order inside each source
+    by_source: Dict[str, List[Chunk]] = {}
+    for chunk in chunks:
+        by_source.setdefault(chunk.source, []).append(chunk)
+
+    lines = [header] if header else []
+    for source, source_chunks in by_source.items():
+        lines.append(f"### [{source_chunks[0].title or source}]({source})")
+        lines.extend(chunk.text for chunk in sorted(source_chunks, key=lambda c: c.index))
+    return "\n\n".join(lines)